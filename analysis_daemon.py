@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Resident Speech Analysis Daemon
+Keeps the Whisper and Wav2Vec2 models warm in a long-lived process and serves
+analysis requests over a Unix socket, so CLI pipeline runs don't pay the torch
+import and model load on every invocation.
+
+Protocol: one JSON object per line in each direction.
+    -> {"op": "analyze", "audio_path": "audio_files/text_audio.wav"}
+    <- {"ok": true, "result": {...wav2vec2.analyze_audio() fields..., "log": "..."}}
+    -> {"op": "ping"}
+    <- {"ok": true, "result": "pong"}
+Errors come back as {"ok": false, "error": "..."}.
+
+Usage:
+    python analysis_daemon.py [--socket /tmp/beyondwords_analysis.sock]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+SOCKET_PATH = os.environ.get("ANALYSIS_SOCKET", "/tmp/beyondwords_analysis.sock")
+CONNECT_TIMEOUT = 1.0  # Seconds to wait when probing for a running daemon
+REQUEST_TIMEOUT = 300.0  # Seconds to wait for a single analysis
+# =============================================================================
+
+_model_lock = threading.Lock()
+
+
+class AnalysisRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                response = {"ok": True, "result": self.dispatch(request)}
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+    def dispatch(self, request):
+        op = request.get("op")
+        if op == "ping":
+            return "pong"
+        if op == "analyze":
+            audio_path = request.get("audio_path")
+            if not audio_path or not os.path.exists(audio_path):
+                raise FileNotFoundError(f"Audio file not found: {audio_path}")
+            return analyze_in_process(audio_path)
+        raise ValueError(f"Unknown op: {op}")
+
+
+class AnalysisServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def analyze_in_process(audio_path):
+    """Analyze one file with the models in this process, capturing the console log"""
+    import wav2vec2
+    # One inference at a time: the models are shared, and stdout capture is process-wide
+    with _model_lock:
+        log = io.StringIO()
+        with contextlib.redirect_stdout(log):
+            result = wav2vec2.analyze_audio(audio_path)
+    result["log"] = log.getvalue()
+    return result
+
+
+def request_analysis(audio_path, socket_path=SOCKET_PATH, timeout=REQUEST_TIMEOUT):
+    """Submit an audio path to the daemon. Raises ConnectionError if no daemon is listening"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError, socket.timeout) as e:
+            raise ConnectionError(f"Analysis daemon not running at {socket_path}: {e}")
+        sock.settimeout(timeout)
+        request = {"op": "analyze", "audio_path": os.path.abspath(audio_path)}
+        sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    finally:
+        sock.close()
+    if not line:
+        raise ConnectionError("Analysis daemon closed the connection")
+    response = json.loads(line)
+    if not response.get("ok"):
+        raise RuntimeError(response.get("error", "Unknown daemon error"))
+    return response["result"]
+
+
+def serve(socket_path=SOCKET_PATH):
+    import wav2vec2
+    wav2vec2.load_models()
+
+    if os.path.exists(socket_path):
+        # Refuse to steal the socket from a live daemon, but clean up a stale one
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+            print(f"Error: a daemon is already listening on {socket_path}")
+            sys.exit(1)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(socket_path)
+        finally:
+            probe.close()
+
+    server = AnalysisServer(socket_path, AnalysisRequestHandler)
+    os.chmod(socket_path, 0o600)
+
+    def shutdown(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    print(f"Analysis daemon ready on {socket_path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        print("Analysis daemon stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep speech models warm and serve analyses over a Unix socket")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Unix socket path")
+    args = parser.parse_args()
+    serve(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Memory-Mapped CMU Pronouncing Dictionary
+Converts CMUdict once into a compact binary file: a sorted key index plus packed
+phone-ID arrays. Opening it maps the file instead of parsing 130k+ entries into
+Python lists, so load time is near zero and worker processes share the same pages.
+
+Build (from a cmudict text file, or from nltk's copy when no source is given):
+    python cmu_lexicon.py build [cmudict.dict | cmudict-0.7b] [-o cmudict.lex]
+Look up:
+    python cmu_lexicon.py lookup <word> [...]
+
+File layout (little-endian, every section 8-byte aligned):
+    header   magic, then word / pronunciation / phone / key-byte / symbol-byte counts
+    symbols  phone symbols separated by newlines; a phone ID is its position
+    key_offsets    uint32[n_words + 1]  word i is key_bytes[key_offsets[i]:key_offsets[i + 1]]
+    pron_index     uint32[n_words + 1]  pronunciations of word i
+    pron_offsets   uint32[n_prons + 1]  phones of pronunciation j
+    phones         uint8[n_phones]
+    key_bytes      sorted UTF-8 words
+"""
+
+import argparse
+import mmap
+import os
+import re
+import struct
+import sys
+
+import numpy as np
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+LEXICON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cmudict.lex")
+MAGIC = b"CMULEX01"
+HEADER = struct.Struct("<8sIIIII")  # magic, n_words, n_prons, n_phones, n_key_bytes, n_symbol_bytes
+# =============================================================================
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def read_cmudict_text(path):
+    """{word: [pronunciations]} from nltk's "word 1 PH PH" or cmudict-0.7b's "WORD(1)  PH PH" format"""
+    entries = {}
+    with open(path, "r", encoding="latin-1") as f:
+        for line in f:
+            if not line.strip() or line.startswith(";;;"):
+                continue
+            parts = line.split()
+            word = re.sub(r"\(\d+\)$", "", parts[0]).lower()
+            phones = parts[2:] if len(parts) > 2 and parts[1].isdigit() else parts[1:]
+            entries.setdefault(word, []).append(phones)
+    return entries
+
+
+def read_nltk_cmudict():
+    try:
+        import nltk
+    except ImportError:
+        raise ImportError("Building the CMU lexicon without a source file needs nltk (pip install nltk); "
+                          "or pass a cmudict text file: python cmu_lexicon.py build cmudict.dict") from None
+    try:
+        nltk.data.find('corpora/cmudict')
+    except LookupError:
+        nltk.download('cmudict')
+    from nltk.corpus import cmudict
+    return cmudict.dict()
+
+
+def build_lexicon(entries, output_path=LEXICON_PATH):
+    """Write {word: [pronunciations]} as a binary lexicon"""
+    words = sorted(entries, key=lambda w: w.encode("utf-8"))
+    symbols = sorted({p for prons in entries.values() for pron in prons for p in pron})
+    if len(symbols) > 255:
+        raise ValueError(f"{len(symbols)} phone symbols do not fit in uint8 IDs")
+    symbol_ids = {s: i for i, s in enumerate(symbols)}
+
+    key_bytes = bytearray()
+    key_offsets = [0]
+    pron_index = [0]
+    pron_offsets = [0]
+    phones = bytearray()
+    for word in words:
+        key_bytes += word.encode("utf-8")
+        key_offsets.append(len(key_bytes))
+        for pron in entries[word]:
+            phones += bytes(symbol_ids[p] for p in pron)
+            pron_offsets.append(len(phones))
+        pron_index.append(len(pron_offsets) - 1)
+
+    symbol_bytes = "\n".join(symbols).encode("ascii")
+    sections = [
+        symbol_bytes,
+        np.asarray(key_offsets, dtype="<u4").tobytes(),
+        np.asarray(pron_index, dtype="<u4").tobytes(),
+        np.asarray(pron_offsets, dtype="<u4").tobytes(),
+        bytes(phones),
+        bytes(key_bytes),
+    ]
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(words), len(pron_offsets) - 1, len(phones),
+                            len(key_bytes), len(symbol_bytes)))
+        f.write(b"\0" * (_align(HEADER.size) - HEADER.size))
+        for section in sections:
+            f.write(section)
+            f.write(b"\0" * (_align(len(section)) - len(section)))
+    os.replace(tmp_path, output_path)
+    print(f"Wrote {len(words)} words, {len(pron_offsets) - 1} pronunciations to {output_path} "
+          f"({os.path.getsize(output_path) / 1e6:.1f} MB)")
+
+
+class CMULexicon:
+    """Read-only, memory-mapped lexicon. get(word) returns a list of pronunciations
+    (lists of phone strings) like cmudict.dict().get(word)."""
+
+    def __init__(self, path=LEXICON_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n_words, n_prons, n_phones, n_key_bytes, n_symbol_bytes = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a CMU lexicon file")
+
+        offset = _align(HEADER.size)
+
+        def section(dtype, count, size):
+            nonlocal offset
+            view = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset)
+            offset += _align(size)
+            return view
+
+        self.symbols = bytes(self._mmap[offset:offset + n_symbol_bytes]).decode("ascii").split("\n")
+        offset += _align(n_symbol_bytes)
+        self.key_offsets = section("<u4", self.n_words + 1, 4 * (self.n_words + 1))
+        self.pron_index = section("<u4", self.n_words + 1, 4 * (self.n_words + 1))
+        self.pron_offsets = section("<u4", n_prons + 1, 4 * (n_prons + 1))
+        self.phones = section(np.uint8, n_phones, n_phones)
+        self._keys_start = offset
+
+    def _key(self, i):
+        start = self._keys_start
+        return self._mmap[start + int(self.key_offsets[i]):start + int(self.key_offsets[i + 1])]
+
+    def find(self, word):
+        """Index of word in the sorted key index (binary search), or -1"""
+        target = word.lower().encode("utf-8")
+        lo, hi = 0, self.n_words
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n_words and self._key(lo) == target:
+            return lo
+        return -1
+
+    def phone_ids(self, word):
+        """Pronunciations of word as uint8 phone-ID arrays (views into the mapped file)"""
+        i = self.find(word)
+        if i < 0:
+            return []
+        return [self.phones[self.pron_offsets[j]:self.pron_offsets[j + 1]]
+                for j in range(self.pron_index[i], self.pron_index[i + 1])]
+
+    def get(self, word, default=None):
+        prons = self.phone_ids(word)
+        if not prons:
+            return default
+        return [[self.symbols[p] for p in pron] for pron in prons]
+
+    def __contains__(self, word):
+        return self.find(word) >= 0
+
+    def __getitem__(self, word):
+        prons = self.get(word)
+        if prons is None:
+            raise KeyError(word)
+        return prons
+
+    def __len__(self):
+        return self.n_words
+
+
+def open_lexicon(path=LEXICON_PATH):
+    """Open the lexicon, building it from nltk's CMUdict the first time"""
+    if not os.path.exists(path):
+        print(f"{path} not found; building it from nltk's CMUdict (one-time)...")
+        build_lexicon(read_nltk_cmudict(), path)
+    return CMULexicon(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the memory-mapped CMU lexicon")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Convert CMUdict to the binary lexicon")
+    build.add_argument("source", nargs="?", help="cmudict text file (default: nltk's CMUdict)")
+    build.add_argument("-o", "--output", default=LEXICON_PATH)
+    lookup = sub.add_parser("lookup", help="Print the pronunciations of words")
+    lookup.add_argument("words", nargs="+")
+    lookup.add_argument("-l", "--lexicon", default=LEXICON_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if args.source and not os.path.exists(args.source):
+            print(f"Error: {args.source} not found!")
+            sys.exit(1)
+        try:
+            entries = read_cmudict_text(args.source) if args.source else read_nltk_cmudict()
+        except ImportError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        build_lexicon(entries, args.output)
+    else:
+        lexicon = open_lexicon(args.lexicon)
+        for word in args.words:
+            prons = lexicon.get(word)
+            print(f"{word}: " + (" | ".join(" ".join(p) for p in prons) if prons else "(not found)"))
+
+
+if __name__ == "__main__":
+    main()
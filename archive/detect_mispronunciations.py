@@ -1,22 +1,16 @@
 #!/usr/bin/env python3
 """
 Detect Mispronunciations by comparing expected phoneme sequences (from CMUdict)
-to the MFA alignment for each word in segments_words.csv and segments_phones.csv.
+to the MFA alignment for each word in the segments table (segments.npz, see textgrid_segments.py).
 Outputs a report and a JSON file with detected mispronunciations.
 Uses Levenshtein distance to allow for natural variation.
 """
-import pandas as pd
 import json
 import os
 from collections import defaultdict
 
-try:
-    import nltk
-    nltk.data.find('corpora/cmudict')
-except LookupError:
-    import nltk
-    nltk.download('cmudict')
-from nltk.corpus import cmudict
+from cmu_lexicon import open_lexicon
+from textgrid_segments import read_segments
 
 def levenshtein(seq1, seq2):
     """Compute Levenshtein distance between two sequences."""
@@ -40,12 +34,12 @@ def levenshtein(seq1, seq2):
             )
     return d[n][m]
 
-# Load CMU Pronouncing Dictionary
-cmu = cmudict.dict()
+# Load CMU Pronouncing Dictionary (memory-mapped; built from nltk's copy on first run)
+cmu = open_lexicon()
 
 # Load word and phone segments
-words_df = pd.read_csv("segments_words.csv")
-phones_df = pd.read_csv("segments_phones.csv")
+words_df = read_segments("segments.npz", "word")
+phones_df = read_segments("segments.npz", "phone")
 
 mispronunciations = []
 report_lines = []
@@ -1,27 +1,75 @@
+#!/usr/bin/env python3
+"""
+Incremental Temporal Feature Aggregation
+Keeps the per-word eGeMAPS feature matrix and running moments (count, mean, M2,
+min, max, first, last) for every column in temporal_features_state/. Each run
+parses only the word segments in opensmile_features/ that are new since the last
+run, folds them into the moments with vectorized updates, appends their values
+to temporal_phrase_segments.jsonl (one line per word) and rewrites the small
+summary in temporal_phrase_analysis.json.
+
+Usage:
+    python feature_aggregator.py [--rebuild]
+"""
+
+import argparse
 import glob
-import pandas as pd
-import numpy as np
 import json
+import os
+import re
+import shutil
+
+import numpy as np
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+FEATURES_DIR = "opensmile_features"
+OUTPUT_PATH = "temporal_phrase_analysis.json"  # Summary, rewritten every run
+SEGMENTS_PATH = "temporal_phrase_segments.jsonl"  # Per-word features, appended
+STATE_DIR = "temporal_features_state"
+NON_NUMERIC = ("name", "class")
+KEY_FEATURES = ['F0semitoneFrom27.5Hz_sma3nz_amean', 'loudness_sma3_amean',
+                'mfcc1_sma3_amean', 'jitterLocal_sma3nz_amean', 'shimmerLocaldB_sma3nz_amean']
+# =============================================================================
+
 
 def parse_opensmile_arff_csv(csv_path):
+    """(attribute names, data values) of the first data row of an openSMILE ARFF file"""
+    attributes, values = [], []
     with open(csv_path, 'r') as f:
-        lines = f.readlines()
-    attributes = [line.split()[1] for line in lines if line.startswith('@attribute')]
-    data_idx = next((i for i, line in enumerate(lines) if line.strip() == '@data'), None)
-    value_line = None
-    if data_idx is not None:
-        for i in range(data_idx + 1, len(lines)):
-            if lines[i].strip() and not lines[i].startswith('%'):
-                value_line = lines[i].strip()
+        in_data = False
+        for line in f:
+            line = line.strip()
+            if not in_data:
+                if line.startswith('@attribute'):
+                    attributes.append(line.split()[1])
+                elif line == '@data':
+                    in_data = True
+            elif line and not line.startswith('%'):
+                values = [v.strip() for v in line.split(',')]
                 break
-    if value_line:
-        values = value_line.split(',')
-        attributes = [a.strip() for a in attributes]
-        values = [v.strip() for v in values]
-        features = dict(zip(attributes, values))
-        return features
-    else:
-        return {}
+    return attributes, values
+
+
+def to_floats(values):
+    """Convert value strings to float64 in one call, falling back to NaN per bad value"""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except ValueError:
+        out = np.full(len(values), np.nan)
+        for i, v in enumerate(values):
+            try:
+                out[i] = float(v)
+            except ValueError:
+                pass
+        return out
+
+
+def natural_key(path):
+    """Sort chunk_0_word_10 after chunk_0_word_9"""
+    return [int(t) if t.isdigit() else t for t in re.split(r"(\d+)", os.path.basename(path))]
+
 
 def get_speaking_rate_from_whisper():
     try:
@@ -40,68 +88,224 @@ def get_speaking_rate_from_whisper():
         print(f"Warning: Could not calculate speaking rate from whisper_words.json: {e}")
         return 0.0
 
-# Collect features from all word segments in temporal order
-temporal_features = []
-word_sequence = []
-
-for file in sorted(glob.glob("opensmile_features/*.csv")):
-    features = parse_opensmile_arff_csv(file)
-    # Remove non-numeric fields
-    core_features = {k: v for k, v in features.items() if k not in ['name', 'class']}
-    
-    # Convert to float
-    feature_vector = {}
-    for k in core_features:
-        try:
-            feature_vector[k] = float(core_features[k])
-        except ValueError:
-            feature_vector[k] = None
-    
-    temporal_features.append(feature_vector)
-    word_sequence.append(file.split('/')[-1].replace('.csv', ''))
-
-# Create temporal DataFrame
-df_temporal = pd.DataFrame(temporal_features, index=word_sequence)
-
-# Analyze temporal patterns
-temporal_analysis = {
-    'word_sequence': word_sequence,
-    'temporal_features': df_temporal.to_dict('index'),
-    'feature_trajectories': {}
-}
-
-# Calculate temporal patterns for key features
-key_features = ['F0semitoneFrom27.5Hz_sma3nz_amean', 'loudness_sma3_amean', 
-                'mfcc1_sma3_amean', 'jitterLocal_sma3nz_amean', 'shimmerLocaldB_sma3nz_amean']
 
-for feature in key_features:
-    if feature in df_temporal.columns:
-        values = df_temporal[feature].dropna()
-        if len(values) > 0:
-            temporal_analysis['feature_trajectories'][feature] = {
-                'values': values.tolist(),
-                'word_positions': values.index.tolist(),
-                'trend': 'increasing' if values.iloc[-1] > values.iloc[0] else 'decreasing',
-                'variability': values.std(),
-                'range': values.max() - values.min()
+class TemporalFeatureState:
+    """Append-only feature matrix (one float64 row per word segment) plus per-column moments.
+    words.txt, matrix.f8 and the segments JSONL are appended; moments.npz records how much
+    of each is committed."""
+
+    def __init__(self, state_dir=STATE_DIR, segments_path=SEGMENTS_PATH):
+        self.state_dir = state_dir
+        self.segments_path = segments_path
+        self.columns = None
+        self.words = []
+        self.n_rows = 0
+        self.words_bytes = 0
+        self.segments_bytes = 0
+        moments_path = os.path.join(state_dir, "moments.npz")
+        if not os.path.exists(moments_path):
+            return
+        state = np.load(moments_path, allow_pickle=False)
+        self.columns = [str(c) for c in state["columns"]]
+        self.n_rows = int(state["n_rows"])
+        self.words_bytes = int(state["words_bytes"])
+        # State from before the segments file existed: it is written from the matrix on the next append
+        self.segments_bytes = int(state["segments_bytes"]) if "segments_bytes" in state.files else None
+        for name in ("count", "mean", "m2", "min", "max", "first", "last"):
+            setattr(self, name, state[name])
+        with open(os.path.join(state_dir, "words.txt"), "rb") as f:
+            self.words = f.read(self.words_bytes).decode("utf-8").split("\n") if self.n_rows else []
+
+    def _init_columns(self, columns):
+        k = len(columns)
+        self.columns = list(columns)
+        self.count = np.zeros(k)
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros(k)
+        self.min = np.full(k, np.inf)
+        self.max = np.full(k, -np.inf)
+        self.first = np.full(k, np.nan)
+        self.last = np.full(k, np.nan)
+
+    def _segment_lines(self, words, rows):
+        return "".join(json.dumps({'word': word, 'features': {c: (None if np.isnan(v) else v)
+                                                             for c, v in zip(self.columns, row)}}) + "\n"
+                       for word, row in zip(words, rows.tolist())).encode("utf-8")
+
+    def append(self, words, rows):
+        """Fold a batch of new rows (m x k, NaN for missing values) into the state"""
+        if self.segments_bytes is None:
+            text = self._segment_lines(self.words, np.asarray(self.matrix()))
+            with open(self.segments_path, "wb") as f:
+                f.write(text)
+            self.segments_bytes = len(text)
+            if not len(words):
+                self._save_moments()
+        if not len(words):
+            return
+        valid = ~np.isnan(rows)
+        n_b = valid.sum(axis=0).astype(np.float64)
+        has = n_b > 0
+        filled = np.where(valid, rows, 0.0)
+        mean_b = np.divide(filled.sum(axis=0), n_b, out=np.zeros_like(n_b), where=has)
+        m2_b = np.where(valid, (rows - mean_b) ** 2, 0.0).sum(axis=0)
+
+        # Chan et al. pairwise combination of the old and batch moments
+        n = self.count + n_b
+        delta = mean_b - self.mean
+        safe_n = np.where(n > 0, n, 1.0)
+        self.mean = np.where(has, self.mean + delta * n_b / safe_n, self.mean)
+        self.m2 = np.where(has, self.m2 + m2_b + delta ** 2 * self.count * n_b / safe_n, self.m2)
+        self.count = n
+        self.min = np.minimum(self.min, np.where(valid, rows, np.inf).min(axis=0))
+        self.max = np.maximum(self.max, np.where(valid, rows, -np.inf).max(axis=0))
+
+        cols = np.arange(rows.shape[1])
+        first_b = rows[valid.argmax(axis=0), cols]
+        last_b = rows[len(rows) - 1 - valid[::-1].argmax(axis=0), cols]
+        self.first = np.where(np.isnan(self.first) & has, first_b, self.first)
+        self.last = np.where(has, last_b, self.last)
+
+        # Bytes past the committed sizes are leftovers of an interrupted run: drop them before appending
+        os.makedirs(self.state_dir, exist_ok=True)
+        with open(os.path.join(self.state_dir, "matrix.f8"), "ab") as f:
+            f.truncate(self.n_rows * len(self.columns) * 8)
+            f.write(np.ascontiguousarray(rows, dtype="<f8").tobytes())
+        text = (("\n" if self.n_rows else "") + "\n".join(words)).encode("utf-8")
+        with open(os.path.join(self.state_dir, "words.txt"), "ab") as f:
+            f.truncate(self.words_bytes)
+            f.write(text)
+        lines = self._segment_lines(words, rows)
+        with open(self.segments_path, "ab") as f:
+            f.truncate(self.segments_bytes)
+            f.write(lines)
+        self.words.extend(words)
+        self.n_rows += len(words)
+        self.words_bytes += len(text)
+        self.segments_bytes += len(lines)
+        self._save_moments()
+
+    def _save_moments(self):
+        tmp_path = os.path.join(self.state_dir, "moments.tmp.npz")
+        np.savez(tmp_path, columns=np.asarray(self.columns), n_rows=self.n_rows,
+                 words_bytes=self.words_bytes, segments_bytes=self.segments_bytes, count=self.count,
+                 mean=self.mean, m2=self.m2, min=self.min, max=self.max, first=self.first, last=self.last)
+        os.replace(tmp_path, os.path.join(self.state_dir, "moments.npz"))
+
+    def matrix(self):
+        """Memory-mapped view of the committed rows"""
+        if not self.n_rows:
+            return np.zeros((0, len(self.columns or [])))
+        return np.memmap(os.path.join(self.state_dir, "matrix.f8"), dtype="<f8", mode="r",
+                         shape=(self.n_rows, len(self.columns)))
+
+    def column_stats(self):
+        """Per-column summary from the running moments"""
+        stats = {}
+        for i, column in enumerate(self.columns or []):
+            n = int(self.count[i])
+            if not n:
+                continue
+            stats[column] = {
+                'count': n,
+                'mean': float(self.mean[i]),
+                'std': float(np.sqrt(self.m2[i] / (n - 1))) if n > 1 else None,
+                'min': float(self.min[i]),
+                'max': float(self.max[i]),
+                'first': float(self.first[i]),
+                'last': float(self.last[i]),
             }
+        return stats
+
+
+def read_new_segments(state, features_dir=FEATURES_DIR):
+    """(words, rows) for segment files not yet in the state"""
+    known = set(state.words)
+    paths = [p for p in glob.glob(os.path.join(features_dir, "*.csv"))
+             if os.path.basename(p).replace('.csv', '') not in known]
+    parsed = [(path, parse_opensmile_arff_csv(path)) for path in sorted(paths, key=natural_key)]
+    if state.columns is None:
+        header = next((attributes for _, (attributes, values) in parsed if values), None)
+        if header is None:
+            return [], np.zeros((0, 0))
+        state._init_columns([a for a in header if a not in NON_NUMERIC])
+
+    words, rows = [], []
+    for path, (attributes, values) in parsed:
+        numeric = [i for i, a in enumerate(attributes) if a not in NON_NUMERIC and i < len(values)]
+        columns = [attributes[i] for i in numeric]
+        vector = to_floats([values[i] for i in numeric])
+        if columns != state.columns:
+            # Different (or no) feature values: align by name, missing columns become NaN
+            index = {c: j for j, c in enumerate(columns)}
+            vector = np.array([vector[index[c]] if c in index else np.nan for c in state.columns])
+        words.append(os.path.basename(path).replace('.csv', ''))
+        rows.append(vector)
+    return words, (np.vstack(rows) if rows else np.zeros((0, len(state.columns))))
+
+
+def build_temporal_analysis(state):
+    """temporal_phrase_analysis.json contents: the summary from the running moments only.
+    Per-word values are in the segments JSONL, so this stays the same size as words are added."""
+    temporal_analysis = {
+        'word_count': state.n_rows,
+        'last_word': state.words[-1] if state.words else None,
+        'segments_path': state.segments_path,
+        'feature_trajectories': {},
+        'feature_stats': state.column_stats(),
+    }
+
+    stats = temporal_analysis['feature_stats']
+    for feature in KEY_FEATURES:
+        if feature not in stats:
+            continue
+        temporal_analysis['feature_trajectories'][feature] = {
+            'count': stats[feature]['count'],
+            'first': stats[feature]['first'],
+            'last': stats[feature]['last'],
+            'trend': 'increasing' if stats[feature]['last'] > stats[feature]['first'] else 'decreasing',
+            'variability': stats[feature]['std'],
+            'range': stats[feature]['max'] - stats[feature]['min'],
+        }
+
+    # Calculate speaking rate using global word times from whisper_words.json
+    temporal_analysis['speaking_rate'] = get_speaking_rate_from_whisper()
+    return temporal_analysis
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate per-word openSMILE features over time")
+    parser.add_argument("--rebuild", action="store_true", help="Discard the saved state and reprocess every segment")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        if os.path.isdir(STATE_DIR):
+            shutil.rmtree(STATE_DIR)
+        if os.path.exists(SEGMENTS_PATH):
+            os.remove(SEGMENTS_PATH)
+    state = TemporalFeatureState()
+    words, rows = read_new_segments(state)
+    state.append(words, rows)
+    print(f"Added {len(words)} new word segments ({state.n_rows} total)")
+
+    temporal_analysis = build_temporal_analysis(state)
+    with open(OUTPUT_PATH, "w") as f:
+        json.dump(temporal_analysis, f, indent=2)
+
+    print(f"Temporal analysis saved to {OUTPUT_PATH} (per-word features in {SEGMENTS_PATH})")
+    print(f"Analyzed {state.n_rows} words in sequence")
+    print(f"Features with running statistics: {len(temporal_analysis['feature_stats'])}")
+    print(f"Key features tracked: {list(temporal_analysis['feature_trajectories'].keys())}")
+
+    # Print temporal patterns
+    for feature, data in temporal_analysis['feature_trajectories'].items():
+        print(f"\n{feature}:")
+        print(f"  Trend: {data['trend']}")
+        if data['variability'] is not None:
+            print(f"  Variability: {data['variability']:.4f}")
+        print(f"  Range: {data['range']:.4f}")
+        print(f"  First -> last: {data['first']:.2f} -> {data['last']:.2f}")
+
 
-# Calculate speaking rate using global word times from whisper_words.json
-speaking_rate = get_speaking_rate_from_whisper()
-temporal_analysis['speaking_rate'] = speaking_rate
-
-# Save temporal analysis
-with open("temporal_phrase_analysis.json", "w") as f:
-    json.dump(temporal_analysis, f, indent=2)
-
-print("Temporal analysis saved to temporal_phrase_analysis.json")
-print(f"Analyzed {len(word_sequence)} words in sequence")
-print(f"Key features tracked: {list(temporal_analysis['feature_trajectories'].keys())}")
-
-# Print temporal patterns
-for feature, data in temporal_analysis['feature_trajectories'].items():
-    print(f"\n{feature}:")
-    print(f"  Trend: {data['trend']}")
-    print(f"  Variability: {data['variability']:.4f}")
-    print(f"  Range: {data['range']:.4f}")
-    print(f"  Values over time: {[f'{v:.2f}' for v in data['values']]}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
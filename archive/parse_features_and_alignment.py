@@ -1,6 +1,7 @@
+import numpy as np
 import pandas as pd
-import textgrid
 import os
+from textgrid_segments import parse_textgrid as read_tiers, tier_segment_type
 
 # === 1. Parse openSMILE CSV (e.g., from IS13_ComParE.conf or emobase.conf) ===
 def parse_opensmile_csv(csv_path):
@@ -15,23 +16,19 @@ def parse_opensmile_csv(csv_path):
 
 # === 2. Parse MFA TextGrid and extract alignment stats ===
 def parse_textgrid(textgrid_path):
-    tg = textgrid.TextGrid.fromFile(textgrid_path)
-    alignment_info = []
+    alignment_frames = []
+    for name, (starts, ends, labels) in read_tiers(textgrid_path).items():
+        if tier_segment_type(name) == "word":
+            labels = np.char.strip(labels)
+            keep = labels != ""  # skip silence
+            alignment_frames.append(pd.DataFrame({
+                'word': labels[keep],
+                'start': starts[keep],
+                'end': ends[keep],
+                'duration': ends[keep] - starts[keep]
+            }))
 
-    for tier in tg.tiers:
-        if "word" in tier.name.lower():
-            for interval in tier.intervals:
-                word = interval.mark.strip()
-                duration = interval.maxTime - interval.minTime
-                if word:  # skip silence
-                    alignment_info.append({
-                        'word': word,
-                        'start': interval.minTime,
-                        'end': interval.maxTime,
-                        'duration': duration
-                    })
-
-    df_align = pd.DataFrame(alignment_info)
+    df_align = pd.concat(alignment_frames, ignore_index=True) if alignment_frames else pd.DataFrame()
     return df_align
 
 # === 3. Example usage ===
@@ -7,8 +7,13 @@ Always creates a single chunk for the entire audio for MFA processing
 import librosa
 import soundfile as sf
 import os
+import sys
 import json
 
+# audio_cache lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_cache import load_audio
+
 AUDIO_DIR = "audio_files"
 AUDIO_FILENAME = "text_audio.mp3"
 AUDIO_PATH = os.path.join(AUDIO_DIR, AUDIO_FILENAME)
@@ -18,7 +23,7 @@ def create_single_chunk():
     """Create a single chunk for the entire audio file"""
     print(f"Creating single chunk from {AUDIO_PATH}...")
     # Load audio
-    y, sr = librosa.load(AUDIO_PATH, sr=None)
+    y, sr = load_audio(AUDIO_PATH, sr=None)
     duration = librosa.get_duration(y=y, sr=sr)
 
     # Create output directory
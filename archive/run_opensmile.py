@@ -1,14 +1,15 @@
-import pandas as pd
 import subprocess
 import os
+from textgrid_segments import read_segments
 
 # Paths
-csv_path = "segments_words.csv"  # or segments_phones.csv
+segments_path = "segments.npz"  # Built by textgrid_segments.py
+segment_type = "word"  # or "phone"
 opensmile_config = "/Users/aishanibal/opensmile-3.0.2-macos-armv8/config/egemaps/v01a/eGeMAPSv01a.conf"
 output_dir = "opensmile_features"
 os.makedirs(output_dir, exist_ok=True)
 
-df = pd.read_csv(csv_path)
+df = read_segments(segments_path, segment_type)
 
 for i, row in df.iterrows():
     wav_path = row["wav_path"]
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+TextGrid Segments Table
+A streaming Praat TextGrid parser that turns interval tiers straight into
+columnar arrays, and a process-pool driver that ingests a whole MFA output
+directory into one segments table (NPZ, or Parquet when pyarrow is installed).
+The wav_path, type and unit columns are dictionary-encoded: integer codes plus
+one array of distinct values each.
+
+Usage:
+    python textgrid_segments.py [mfa_output] [-o segments.npz] [--wav-dir mfa_chunks] [-j WORKERS]
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+TEXTGRID_DIR = "mfa_output"
+WAV_DIR = "mfa_chunks"
+OUTPUT_PATH = "segments.npz"
+TIER_TYPES = {"words": "word", "phones": "phone"}  # MFA tier name -> segment type
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+MIN_FILES_PER_WORKER = 500  # Below this, starting a worker costs more than it parses
+# =============================================================================
+
+# Long text format (what MFA writes): every interval tier and interval is matched in one
+# regex pass over the file, so there is no per-line Python work.
+TIER_RE = re.compile(r'class = "([^"]*)"\s*name = "((?:[^"]|"")*)"')
+INTERVAL_RE = re.compile(r'xmin = (\S+)\s*xmax = (\S+)\s*text = "((?:[^"]|"")*)"')
+# Short text format: the same values as a bare token stream of quoted strings ("" escapes
+# a quote) and numbers.
+TOKEN_RE = re.compile(r'"((?:[^"]|"")*)"|(?<![\w\[.])([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)(?![\w\].])')
+
+
+def read_textgrid_text(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    # Praat writes UTF-16 when labels need it, UTF-8 (or ASCII) otherwise
+    if data[:2] in (b"\xff\xfe", b"\xfe\xff"):
+        return data.decode("utf-16")
+    return data.decode("utf-8-sig")
+
+
+def _tier_arrays(starts, ends, labels):
+    labels = np.asarray(labels, dtype=str)
+    if len(labels) and np.char.find(labels, '""').max() >= 0:
+        labels = np.char.replace(labels, '""', '"')
+    return np.asarray(starts, dtype=np.float64), np.asarray(ends, dtype=np.float64), labels
+
+
+def _parse_short(text, path):
+    tokens = (s.replace('""', '"') if s else (float(n) if n else s)
+              for s, n in TOKEN_RE.findall(text))
+    header = [next(tokens) for _ in range(5)]  # "ooTextFile", "TextGrid", xmin, xmax, tier count
+    if header[:2] != ["ooTextFile", "TextGrid"]:
+        raise ValueError(f"{path} is not a text TextGrid")
+    tiers = {}
+    for _ in range(int(header[4])):
+        tier_class, name, _, _, size = (next(tokens) for _ in range(5))
+        size = int(size)
+        if tier_class == "IntervalTier":
+            flat = [next(tokens) for _ in range(3 * size)]
+            tiers[name] = _tier_arrays(flat[0::3], flat[1::3], flat[2::3])
+        else:
+            for _ in range(2 * size):  # Point tier: (time, mark) pairs
+                next(tokens)
+    return tiers
+
+
+def parse_textgrid(path):
+    """{tier name: (starts, ends, labels)} for every interval tier, as numpy arrays"""
+    text = read_textgrid_text(path)
+    headers = list(TIER_RE.finditer(text))
+    if not headers:
+        return _parse_short(text, path)
+    tiers = {}
+    for header, following in zip(headers, headers[1:] + [None]):
+        if header.group(1) != "IntervalTier":
+            continue
+        body = text[header.end():following.start() if following is not None else len(text)]
+        rows = INTERVAL_RE.findall(body)
+        tiers[header.group(2).replace('""', '"')] = _tier_arrays(*zip(*rows)) if rows else _tier_arrays([], [], [])
+    return tiers
+
+
+def tier_segment_type(name, tier_types=TIER_TYPES):
+    """Segment type of an MFA tier name: "words"/"phones", or "<speaker> - words" when MFA
+    aligns several speakers; None for other tiers"""
+    return tier_types.get(name.rsplit(" - ", 1)[-1].strip().lower())
+
+
+def textgrid_segments(path, wav_dir=WAV_DIR, tier_types=TIER_TYPES):
+    """Non-silent intervals of the word and phone tiers of one TextGrid as columns"""
+    wav_path = os.path.join(wav_dir, os.path.splitext(os.path.basename(path))[0] + ".wav")
+    columns = {"type": [], "unit": [], "start": [], "end": []}
+    for name, (starts, ends, labels) in parse_textgrid(path).items():
+        segment_type = tier_segment_type(name, tier_types)
+        if segment_type is None:
+            continue
+        labels = np.char.strip(labels)
+        keep = labels != ""  # Skip silences
+        columns["type"].append(np.full(int(keep.sum()), segment_type))
+        columns["unit"].append(labels[keep])
+        columns["start"].append(starts[keep])
+        columns["end"].append(ends[keep])
+    columns = {key: np.concatenate(parts) if parts else np.zeros(0) for key, parts in columns.items()}
+    columns["wav_path"] = np.full(len(columns["start"]), wav_path)
+    return columns
+
+
+def _parse_one(args):
+    path, wav_dir = args
+    try:
+        return path, textgrid_segments(path, wav_dir), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def dictionary_encode(values):
+    """(codes, distinct values) so values == distinct[codes]"""
+    distinct, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return codes.astype(np.int32), distinct
+
+
+def build_segments(textgrid_dir=TEXTGRID_DIR, wav_dir=WAV_DIR, workers=DEFAULT_WORKERS):
+    """One segments table (dict of columns) for every TextGrid in textgrid_dir"""
+    paths = sorted(os.path.join(textgrid_dir, name) for name in os.listdir(textgrid_dir)
+                   if name.endswith(".TextGrid"))
+    jobs = [(path, wav_dir) for path in paths]
+    workers = min(workers, len(paths) // MIN_FILES_PER_WORKER)
+    if workers > 1:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            # Small files: hand them out in batches to keep the IPC per file low
+            results = list(pool.map(_parse_one, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        results = [_parse_one(job) for job in jobs]
+
+    parts = []
+    for path, columns, error in results:
+        if error is not None:
+            print(f"Skipping {path}: {error}")
+        else:
+            parts.append(columns)
+    table = {}
+    for key in ("wav_path", "type", "unit", "start", "end"):
+        column = np.concatenate([p[key] for p in parts]) if parts else np.zeros(0)
+        if key in ("start", "end"):
+            table[key] = column.astype(np.float64)
+        else:
+            table[key], table[key + "_values"] = dictionary_encode(column)
+    print(f"Parsed {len(parts)}/{len(paths)} TextGrids into {len(table['start'])} segments")
+    return table
+
+
+def save_segments(table, output_path=OUTPUT_PATH):
+    """Write the table as .npz, or .parquet (dictionary-encoded columns) with pyarrow"""
+    if output_path.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        arrays = {key: pa.DictionaryArray.from_arrays(pa.array(table[key]), pa.array(table[key + "_values"]))
+                  for key in ("wav_path", "type", "unit")}
+        arrays["start"] = pa.array(table["start"])
+        arrays["end"] = pa.array(table["end"])
+        pq.write_table(pa.table(arrays), output_path)
+    else:
+        np.savez(output_path, **table)
+
+
+def read_segments(path=OUTPUT_PATH, segment_type=None):
+    """The table as a DataFrame with the old CSV columns (wav_path, unit, start, end, type),
+    optionally only one segment type; dictionary-encoded columns become categoricals"""
+    import pandas as pd
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+    else:
+        with np.load(path, allow_pickle=False) as table:
+            df = pd.DataFrame({key: pd.Categorical.from_codes(table[key], table[key + "_values"])
+                               for key in ("wav_path", "unit", "type")})
+            df["start"] = table["start"]
+            df["end"] = table["end"]
+            df = df[["wav_path", "unit", "start", "end", "type"]]
+    if segment_type is not None:
+        df = df[df["type"] == segment_type].reset_index(drop=True)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest MFA TextGrids into one segments table")
+    parser.add_argument("textgrid_dir", nargs="?", default=TEXTGRID_DIR)
+    parser.add_argument("-o", "--output", default=OUTPUT_PATH, help=".npz or .parquet")
+    parser.add_argument("--wav-dir", default=WAV_DIR, help="Directory of the aligned audio")
+    parser.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args()
+    if not os.path.isdir(args.textgrid_dir):
+        print(f"Error: {args.textgrid_dir} not found!")
+        sys.exit(1)
+
+    table = build_segments(args.textgrid_dir, args.wav_dir, args.workers)
+    save_segments(table, args.output)
+    types = table["type_values"][table["type"]] if len(table["type"]) else np.zeros(0, dtype=str)
+    for segment_type in TIER_TYPES.values():
+        print(f"[✓] {int((types == segment_type).sum())} {segment_type} segments")
+    print(f"[✓] Saved segments table to {args.output} ({len(table['unit_values'])} distinct units)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Decoded-Audio Cache
+Decodes each source recording once and keeps it as mono float32 .npy files keyed
+by the hash of the file's contents: one at 16 kHz for the models and, when a
+stage needs it, one at the native rate. Every stage opens them with
+np.load(mmap_mode='r'), so repeat runs and sibling stages (and the analysis
+daemon in its own process) share the pages instead of decoding again. Once the
+directory grows past AUDIO_CACHE_MAX_MB the least recently used files are
+removed (hits refresh a file's mtime).
+
+Usage:
+    python audio_cache.py <audio> [<audio> ...] [--native]
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+AUDIO_CACHE_DIR = os.environ.get("AUDIO_CACHE_DIR", "audio_cache")
+SAMPLE_RATE = 16000
+HASH_CHUNK_BYTES = 1 << 20
+AUDIO_CACHE_MAX_MB = float(os.environ.get("AUDIO_CACHE_MAX_MB", 2048))  # 0 disables eviction
+# =============================================================================
+
+_stats_lock = threading.Lock()
+cache_stats = {"hits": 0, "misses": 0, "resampled": 0, "evicted": 0}
+
+
+def _count(key):
+    with _stats_lock:
+        cache_stats[key] += 1
+
+
+def file_digest(path):
+    """sha256 of the file contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _index_path(path, cache_dir):
+    key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, "paths", key + ".json")
+
+
+def _write_json_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def source_digest(path, cache_dir=AUDIO_CACHE_DIR):
+    """Content hash of path, remembered per (path, size, mtime) so unchanged files are not re-hashed"""
+    st = os.stat(path)
+    index_path = _index_path(path, cache_dir)
+    entry = _read_json(index_path)
+    if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        return entry["digest"]
+    digest = file_digest(path)
+    _write_json_atomic(index_path, {"path": os.path.abspath(path), "size": st.st_size,
+                                    "mtime_ns": st.st_mtime_ns, "digest": digest})
+    return digest
+
+
+def array_path(digest, sr=SAMPLE_RATE, cache_dir=AUDIO_CACHE_DIR):
+    return os.path.join(cache_dir, digest[:2], f"{digest}.{sr or 'native'}.npy")
+
+
+def _meta_path(digest, cache_dir):
+    return os.path.join(cache_dir, digest[:2], digest + ".json")
+
+
+def _save_atomic(path, audio):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+    np.save(tmp_path, np.ascontiguousarray(audio, dtype=np.float32))
+    os.replace(tmp_path, path)
+
+
+def is_cached(path, sr=SAMPLE_RATE, cache_dir=AUDIO_CACHE_DIR):
+    """Whether load_audio(path, sr) will be served from an existing array without decoding"""
+    try:
+        digest = source_digest(path, cache_dir)
+    except OSError:
+        return False
+    if sr is None and not (_read_json(_meta_path(digest, cache_dir)) or {}).get("native_sr"):
+        return False
+    return os.path.exists(array_path(digest, sr, cache_dir))
+
+
+def evict(cache_dir=AUDIO_CACHE_DIR, max_mb=AUDIO_CACHE_MAX_MB, keep=()):
+    """Remove the least recently used cache files (by mtime) until the directory fits in max_mb.
+    Open memory maps stay valid after their file is removed."""
+    if not max_mb:
+        return 0
+    entries = []
+    total = 0
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue  # Removed by another process meanwhile
+            total += st.st_size
+            if ".tmp" not in name and path not in keep:
+                entries.append((st.st_mtime, st.st_size, path))
+    limit = max_mb * 1024 * 1024
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        with _stats_lock:
+            cache_stats["evicted"] += removed
+    return removed
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def decode(path, sr=SAMPLE_RATE):
+    """Decode to mono float32 at sr (None keeps the native rate)"""
+    import librosa
+    audio, rate = librosa.load(path, sr=sr, mono=True)
+    return audio, rate
+
+
+def load_audio(path, sr=SAMPLE_RATE, cache_dir=AUDIO_CACHE_DIR, with_hit=False):
+    """(samples, rate) of path as a read-only memory-mapped mono float32 array, or
+    (samples, rate, hit) with with_hit=True. sr=None gives the native-rate copy. Decodes only
+    on the first request for a file's contents; a 16 kHz copy is resampled from an existing
+    native one instead of decoding."""
+    digest = source_digest(path, cache_dir)
+    target = array_path(digest, sr, cache_dir)
+    meta_path = _meta_path(digest, cache_dir)
+    # The native copy is only usable with its rate: without the metadata (a crash between the two
+    # writes of an older version) it counts as a miss and is decoded again
+    native_sr = (_read_json(meta_path) or {}).get("native_sr")
+    if os.path.exists(target) and (sr is not None or native_sr):
+        _count("hits")
+        _touch(target)
+        audio = np.load(target, mmap_mode="r")
+        return (audio, sr or native_sr, True) if with_hit else (audio, sr or native_sr)
+
+    native_path = array_path(digest, None, cache_dir)
+    if sr is not None and native_sr and os.path.exists(native_path):
+        import librosa
+        _count("resampled")
+        native = np.load(native_path, mmap_mode="r")
+        audio = librosa.resample(np.asarray(native), orig_sr=native_sr, target_sr=sr)
+        rate = sr
+    else:
+        _count("misses")
+        audio, rate = decode(path, sr)
+    if sr is None:
+        # Metadata first: a reader that sees the array can always find its rate
+        _write_json_atomic(meta_path, {"source": os.path.abspath(path), "native_sr": int(rate),
+                                       "duration_sec": round(len(audio) / rate, 3)})
+    _save_atomic(target, audio)
+    evict(cache_dir, keep=(target, native_path, meta_path))
+    audio = np.load(target, mmap_mode="r")
+    return (audio, rate, False) if with_hit else (audio, rate)
+
+
+def write_wav(source_path, wav_path, cache_dir=AUDIO_CACHE_DIR):
+    """Write a WAV of source_path from its cached native-rate copy (no ffmpeg) and register
+    the WAV under the same content key, so stages reading the WAV hit the same cache entries"""
+    import soundfile as sf
+    audio, rate = load_audio(source_path, None, cache_dir)
+    sf.write(wav_path, audio, rate)
+    digest = source_digest(source_path, cache_dir)
+    st = os.stat(wav_path)
+    _write_json_atomic(_index_path(wav_path, cache_dir), {"path": os.path.abspath(wav_path), "size": st.st_size,
+                                                          "mtime_ns": st.st_mtime_ns, "digest": digest})
+    return wav_path
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Decode recordings into the shared audio cache")
+    parser.add_argument("audio", nargs="+", help="Audio files")
+    parser.add_argument("--native", action="store_true", help="Also keep a native-rate copy")
+    args = parser.parse_args()
+    for audio_path in args.audio:
+        if args.native:
+            load_audio(audio_path, None)
+        samples, rate = load_audio(audio_path)
+        print(f"{audio_path}: {len(samples) / rate:.2f}s -> {array_path(source_digest(audio_path))}")
+    print(f"Cache: {cache_stats}")
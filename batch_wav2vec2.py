@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Batch Wav2Vec2 Scoring
+Scores a directory (or manifest) of learner recordings with the models loaded once.
+Audio decoding runs in a process pool ahead of inference, results stream out as one
+JSONL line per file, and a rerun resumes after the last completed entry (files
+that failed are retried; their new record follows the old one).
+
+Usage:
+    python batch_wav2vec2.py <audio_dir | manifest.txt | manifest.jsonl> [-o results.jsonl]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg", ".m4a", ".webm")
+DEFAULT_OUTPUT = "batch_results.jsonl"
+DEFAULT_DECODE_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+DEFAULT_PREFETCH = 4  # Decoded files kept ready per decode worker
+# =============================================================================
+
+
+def list_audio_files(source):
+    """Return audio paths from a directory, a plain-text manifest or a JSONL manifest"""
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    paths.append(os.path.join(root, name))
+        return sorted(paths)
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                line = json.loads(line)["path"]
+            if not os.path.isabs(line):
+                line = os.path.join(base_dir, line)
+            paths.append(line)
+    return paths
+
+
+def path_key(path):
+    """Identity of a file for resuming, whatever relative form or symlink named it"""
+    return os.path.realpath(path)
+
+
+def load_completed(output_path):
+    """Path keys of files a previous run scored successfully, dropping a partially written
+    last line. Error records are not included, so those files are retried."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            print(f"Discarding partial line at end of {output_path}")
+            f.truncate(end)
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+                if record.get("status") == "ok":
+                    completed.add(path_key(record["path"]))
+            except (ValueError, KeyError, AttributeError):
+                continue
+    return completed
+
+
+def decode_audio(path):
+    """Decode one file to 16 kHz mono float32 through the shared decoded-audio cache
+    (runs in a worker process), so reruns and the other stages reuse the decoded copy"""
+    import numpy as np
+    from audio_cache import load_audio
+    try:
+        speech, _ = load_audio(path, sr=16000)
+        return path, np.array(speech), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def run_batch(paths, output_path, decode_workers=DEFAULT_DECODE_WORKERS, prefetch=DEFAULT_PREFETCH):
+    """Score every path, appending one JSON line per file to output_path"""
+    import wav2vec2
+
+    completed = load_completed(output_path)
+    pending = [p for p in paths if path_key(p) not in completed]
+    print(f"{len(paths)} files, {len(completed)} already done, {len(pending)} to score")
+    if not pending:
+        return
+
+    window = max(1, decode_workers * prefetch)
+    start = time.time()
+    done = 0
+
+    # Spawned decoders stay light (no torch state inherited from this process)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=decode_workers, mp_context=ctx) as pool, open(output_path, "a") as out:
+        queue = deque()
+        todo = iter(pending)
+
+        def refill():
+            while len(queue) < window:
+                path = next(todo, None)
+                if path is None:
+                    return
+                queue.append(pool.submit(decode_audio, path))
+
+        refill()
+        wav2vec2.load_models()  # Overlaps with the first decodes
+        while queue:
+            path, speech, error = queue.popleft().result()
+            refill()  # Keep decoders busy while this file runs through the models
+            t0 = time.time()
+            if error is not None:
+                record = {"path": path, "status": "error", "error": f"decode failed: {error}"}
+            else:
+                try:
+                    record = {"path": path, "status": "ok"}
+                    record.update(wav2vec2.analyze_audio(speech))
+                except Exception as e:
+                    record = {"path": path, "status": "error", "error": str(e)}
+            record["elapsed_sec"] = round(time.time() - t0, 3)
+
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+            done += 1
+            print(f"[{done}/{len(pending)}] {record['status']}: {path}")
+
+    elapsed = time.time() - start
+    print(f"✓ Scored {done} files in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.2f} files/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a directory or manifest of recordings with wav2vec2")
+    parser.add_argument("source", help="Audio directory, or manifest (.txt paths or .jsonl with a 'path' key)")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help="JSONL results file (appended/resumed)")
+    parser.add_argument("-j", "--decode-workers", type=int, default=DEFAULT_DECODE_WORKERS)
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"Error: {args.source} not found!")
+        sys.exit(1)
+    paths = list_audio_files(args.source)
+    run_batch(paths, args.output, decode_workers=args.decode_workers, prefetch=args.prefetch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Request Deadlines and Cancellation
+Each analysis request carries a CancelToken with an optional deadline. Long-running
+stages call token.check() between steps (and between long-audio windows), so work
+nobody will read stops as soon as the client gives up or the deadline passes.
+"""
+
+import threading
+import time
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"  # Relative budget in milliseconds
+REQUEST_ID_HEADER = "X-Request-Id"
+
+
+class Cancelled(Exception):
+    """The request was cancelled by the client"""
+    reason = "cancelled"
+
+
+class DeadlineExceeded(Cancelled):
+    """The request ran past its deadline"""
+    reason = "deadline_exceeded"
+
+
+class CancelToken:
+    def __init__(self, timeout_sec=None, request_id=None):
+        self.request_id = request_id
+        self.created = time.monotonic()
+        self.deadline = self.created + timeout_sec if timeout_sec else None
+        self._cancelled = threading.Event()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+        self.finished = False
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._callbacks_lock:
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback):
+        """Call callback() when the token is cancelled (e.g. to wake a thread waiting on a condition)"""
+        with self._callbacks_lock:
+            self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        with self._callbacks_lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def wait(self, timeout):
+        """Sleep up to timeout seconds, returning early (True) if the token is cancelled"""
+        return self._cancelled.wait(timeout)
+
+    def remaining(self):
+        """Seconds left before the deadline, or None when there is no deadline"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def check(self):
+        """Raise if the request was cancelled or its deadline has passed"""
+        if self._cancelled.is_set():
+            raise Cancelled("Request cancelled")
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded by {-remaining:.2f}s")
+
+
+class CancellationRegistry:
+    """Tokens of in-flight requests by request id, plus cancellation metrics"""
+
+    def __init__(self):
+        self._tokens = {}
+        self._lock = threading.Lock()
+        self.stats = {"started": 0, "finished": 0, "cancelled": 0, "deadline_exceeded": 0,
+                      "abandoned_sec_total": 0.0}
+
+    def start(self, request_id=None, timeout_sec=None):
+        token = CancelToken(timeout_sec=timeout_sec, request_id=request_id)
+        with self._lock:
+            self.stats["started"] += 1
+            if request_id:
+                self._tokens[request_id] = token
+        return token
+
+    def cancel(self, request_id):
+        """Cancel an in-flight request. Returns False if it is unknown or already finished"""
+        with self._lock:
+            token = self._tokens.get(request_id)
+        if token is None:
+            return False
+        token.cancel()
+        return True
+
+    def finish(self, token, error=None):
+        """Record how a request ended; error is the Cancelled exception if it was stopped.
+        Safe to call more than once: only the first call is counted."""
+        with self._lock:
+            if token.finished:
+                return
+            token.finished = True
+            if token.request_id and self._tokens.get(token.request_id) is token:
+                del self._tokens[token.request_id]
+            if isinstance(error, Cancelled):
+                self.stats[error.reason] += 1
+                self.stats["abandoned_sec_total"] += time.monotonic() - token.created
+            else:
+                self.stats["finished"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, in_flight=len(self._tokens),
+                        abandoned_sec_total=round(self.stats["abandoned_sec_total"], 3))
@@ -466,6 +466,7 @@ function Analyze() {
   const [isProcessing, setIsProcessing] = useState(false);
   const [feedback, setFeedback] = useState('');
   const [isLoadingFeedback, setIsLoadingFeedback] = useState(false);
+  const [sessionId, setSessionId] = useState(null);
   const mediaRecorderRef = useRef(null);
   const audioChunksRef = useRef([]);
   const [showSavePrompt, setShowSavePrompt] = useState(false);
@@ -531,11 +532,14 @@ function Analyze() {
       const formData = new FormData();
       formData.append('audio', audioBlob, 'recording.wav');
       formData.append('chatHistory', JSON.stringify(chatHistory));
+      if (sessionId) formData.append('sessionId', sessionId);
 
       const response = await API.post('/api/analyze', formData, {
         headers: { 'Content-Type': 'multipart/form-data' }
       });
 
+      if (response.data.sessionId) setSessionId(response.data.sessionId);
+
       // Update user message with transcription
       const transcription = response.data.transcription || 'Speech recorded';
       setChatHistory(prev => prev.map(msg => 
@@ -580,7 +584,8 @@ function Analyze() {
     setIsLoadingFeedback(true);
     try {
       const response = await API.post('/api/feedback', {
-        chatHistory: chatHistory
+        chatHistory: chatHistory,
+        sessionId: sessionId
       });
       setFeedback(response.data.feedback);
     } catch (error) {
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+CTC Frame Timestamps
+Per-character and per-word start/end times from the argmax frames of a CTC
+model's logits (wav2vec2 emits one frame per 20 ms). The timing comes from the
+same forward pass as the transcript, so no second decoding or forced alignment
+run is needed.
+"""
+
+import numpy as np
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+FRAME_SEC = 0.02  # wav2vec2 feature stride: 320 samples at 16 kHz
+MIN_PAUSE_SEC = 0.25  # Gaps between words at least this long count as pauses
+# =============================================================================
+
+
+def ctc_runs(ids):
+    """(token_id, first_frame, end_frame) for each run of identical frame ids"""
+    ids = np.asarray(ids)
+    if not len(ids):
+        return []
+    boundaries = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [len(ids)]])
+    return list(zip(ids[starts].tolist(), starts.tolist(), ends.tolist()))
+
+
+def ctc_word_timestamps(ids, id_to_token, blank_id, word_delimiter="|", skip_ids=(),
+                        frame_times=None, frame_sec=FRAME_SEC):
+    """Words with start/end seconds and their characters' times from per-frame argmax ids.
+
+    frame_times optionally gives the start time of every frame (e.g. when frames of
+    several windows were concatenated); otherwise frame i starts at i * frame_sec."""
+    if frame_times is None:
+        frame_times = np.arange(len(ids)) * frame_sec
+
+    words = []
+    current = None
+    for token_id, first, end in ctc_runs(ids):
+        if token_id == blank_id or token_id in skip_ids:
+            continue
+        token = id_to_token[token_id]
+        if token == word_delimiter:
+            current = None
+            continue
+        char = {"char": token.lower(), "start": round(float(frame_times[first]), 3),
+                "end": round(float(frame_times[end - 1] + frame_sec), 3)}
+        if current is None:
+            current = {"word": "", "start": char["start"], "end": char["end"], "chars": []}
+            words.append(current)
+        current["word"] += char["char"]
+        current["end"] = char["end"]
+        current["chars"].append(char)
+    return words
+
+
+def shift_timestamps(words, to_original):
+    """Map word and character times through to_original (e.g. OffsetMap.to_original)"""
+    for word in words:
+        for item in [word] + word["chars"]:
+            item["start"] = round(float(to_original(item["start"])), 3)
+            item["end"] = round(float(to_original(item["end"])), 3)
+    return words
+
+
+def timing_features(words, min_pause_sec=MIN_PAUSE_SEC):
+    """Speaking rate and pauses from word timestamps"""
+    if not words:
+        return {"speaking_rate": None, "speech_sec": 0.0, "articulation_sec": 0.0, "pauses": [],
+                "mean_pause_sec": None}
+    starts = np.array([w["start"] for w in words])
+    ends = np.array([w["end"] for w in words])
+    span = ends[-1] - starts[0]
+    gaps = starts[1:] - ends[:-1]
+    pause_idx = np.flatnonzero(gaps >= min_pause_sec)
+    pauses = [{"after_word": words[i]["word"], "start": round(float(ends[i]), 3),
+               "duration": round(float(gaps[i]), 3)} for i in pause_idx]
+    return {
+        "speaking_rate": round(float(len(words) / span), 2) if span > 0 else None,
+        "speech_sec": round(float(span), 3),
+        "articulation_sec": round(float((ends - starts).sum()), 3),
+        "pauses": pauses,
+        "mean_pause_sec": round(float(gaps[pause_idx].mean()), 3) if len(pause_idx) else None,
+    }
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+End-to-End Load Test
+Replays practice sessions (/transcribe -> /analyze -> /feedback, plus an Ollama
+/api/generate call when --ollama-url is given) against python_api.py from a
+directory of clips. Sessions arrive as an open-loop Poisson process at each
+configured rate: every arrival starts on schedule whether or not earlier
+sessions have finished, and session latency counts from the scheduled arrival,
+so client-side queueing (with an optional --concurrency cap) is not hidden.
+The report gives throughput, p50/p95/p99 latency per endpoint, error and 429
+rates, and the servers' RSS over time.
+
+Pair it with ollama_stub.py to load the Ollama step without a real model:
+    python ollama_stub.py --latency-ms 300 &
+    python load_test.py audio_files --sessions 50 --rate 0.5,1,2 --ollama-url http://localhost:11435 \\
+        --pgrep python_api.py -o load_report.json
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from batch_wav2vec2 import list_audio_files
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+DEFAULT_API_URL = os.environ.get("PYTHON_API_URL", "http://localhost:5000")
+DEFAULT_SESSIONS = 20
+DEFAULT_CONCURRENCY = 0  # Max sessions in flight on the client; 0: no cap (open loop)
+DEFAULT_RATES = "1"  # Session arrivals per second; comma-separated runs one stage per rate
+DEFAULT_OLLAMA_MODEL = "llama3.2"
+REQUEST_TIMEOUT_SEC = 120
+RSS_INTERVAL_SEC = 1.0
+PERCENTILES = (50, 95, 99)
+DEFAULT_OUTPUT = "load_report.json"
+# =============================================================================
+
+
+class Recorder:
+    """Thread-safe log of (endpoint, status, latency) for every request"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = []
+        self.sessions = []
+
+    def request(self, endpoint, status, latency, error=None):
+        with self._lock:
+            self.requests.append({"endpoint": endpoint, "status": status, "latency": latency, "error": error})
+
+    def session(self, latency, completed, queue_wait=0.0, error=None):
+        with self._lock:
+            self.sessions.append({"latency": latency, "completed": completed, "queue_wait": queue_wait,
+                                  "error": error})
+
+
+def timed_request(recorder, endpoint, method, url, **kwargs):
+    """Send one request and record it; returns the response, or None on a network error"""
+    started = time.time()
+    try:
+        response = requests.request(method, url, timeout=REQUEST_TIMEOUT_SEC, **kwargs)
+    except requests.exceptions.RequestException as e:
+        recorder.request(endpoint, None, time.time() - started, type(e).__name__)
+        return None
+    recorder.request(endpoint, response.status_code, time.time() - started)
+    return response
+
+
+def run_session(clip_path, api_url, recorder, ollama_url=None, ollama_model=DEFAULT_OLLAMA_MODEL, arrived_at=None):
+    """One user: transcribe, analyze, ask for feedback (and a chat reply). Stops at the first failure.
+    Latency counts from arrived_at (the scheduled arrival), including any wait for a client slot."""
+    arrived_at = arrived_at or time.time()
+    queue_wait = time.time() - arrived_at
+    session_id = str(uuid.uuid4())
+    with open(clip_path, "rb") as f:
+        audio = f.read()
+    name = os.path.basename(clip_path)
+
+    def done(completed):
+        recorder.session(time.time() - arrived_at, completed, queue_wait)
+
+    response = timed_request(recorder, "/transcribe", "POST", f"{api_url}/transcribe",
+                             files={"audio": (name, audio)})
+    if response is None or response.status_code != 200:
+        return done(False)
+    try:
+        transcription = response.json().get("transcription", "")
+    except ValueError:
+        transcription = ""
+
+    response = timed_request(recorder, "/analyze", "POST", f"{api_url}/analyze", files={"audio": (name, audio)},
+                             data={"transcription": transcription, "session_id": session_id})
+    if response is None or response.status_code != 200:
+        return done(False)
+
+    chat_history = [{"sender": "User", "text": transcription}]
+    response = timed_request(recorder, "/feedback", "POST", f"{api_url}/feedback",
+                             json={"session_id": session_id, "chat_history": chat_history})
+    if response is None or response.status_code != 200:
+        return done(False)
+
+    if ollama_url:
+        response = timed_request(recorder, "ollama /api/generate", "POST", f"{ollama_url}/api/generate",
+                                 json={"model": ollama_model, "stream": False,
+                                       "prompt": f'The user just said: "{transcription}". Reply as a speech coach.'})
+        if response is None or response.status_code != 200:
+            return done(False)
+    done(True)
+
+
+def rss_mb(pid):
+    """Resident set size of a process in MB (None once it is gone)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        out = subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True).stdout.strip()
+        return int(out) / 1024 if out else None
+    except (OSError, ValueError):
+        return None
+
+
+class RSSSampler:
+    """Samples the RSS of the given server processes every interval_sec in the background"""
+
+    def __init__(self, pids, interval_sec=RSS_INTERVAL_SEC):
+        self.pids = list(pids)
+        self.interval_sec = interval_sec
+        self.samples = {pid: [] for pid in self.pids}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._started = time.time()
+
+    def _run(self):
+        while not self._stop.is_set():
+            t = round(time.time() - self._started, 2)
+            for pid in self.pids:
+                mb = rss_mb(pid)
+                if mb is not None:
+                    self.samples[pid].append((t, round(mb, 1)))
+            self._stop.wait(self.interval_sec)
+
+    def __enter__(self):
+        if self.pids:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def report(self):
+        return {str(pid): {"start_mb": s[0][1], "end_mb": s[-1][1], "peak_mb": max(mb for _, mb in s), "samples": s}
+                for pid, s in self.samples.items() if s}
+
+
+def latency_stats(latencies):
+    if not latencies:
+        return {}
+    values = np.asarray(latencies)
+    stats = {f"p{p}": round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+    stats["mean"] = round(float(values.mean()), 3)
+    stats["max"] = round(float(values.max()), 3)
+    return stats
+
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    for endpoint in dict.fromkeys(r["endpoint"] for r in recorder.requests):
+        rows = [r for r in recorder.requests if r["endpoint"] == endpoint]
+        errors = sum(r["status"] is None or r["status"] >= 400 for r in rows)
+        endpoints[endpoint] = dict(
+            count=len(rows),
+            error_rate=round(errors / len(rows), 3),
+            rate_429=round(sum(r["status"] == 429 for r in rows) / len(rows), 3),
+            statuses={str(s): sum(r["status"] == s for r in rows) for s in sorted({r["status"] for r in rows}, key=str)},
+            **latency_stats([r["latency"] for r in rows if r["status"] is not None and r["status"] < 400]))
+    completed = [s for s in recorder.sessions if s["completed"]]
+    errors = [s["error"] for s in recorder.sessions if s["error"]]
+    return {
+        "elapsed_sec": round(elapsed, 2),
+        "sessions": len(recorder.sessions),
+        "sessions_completed": len(completed),
+        "session_errors": len(errors),
+        "session_error_types": {e: errors.count(e) for e in sorted(set(errors))},
+        "client_queue_wait": latency_stats([s["queue_wait"] for s in recorder.sessions]),
+        "throughput_sessions_per_sec": round(len(completed) / elapsed, 3) if elapsed else None,
+        "throughput_requests_per_sec": round(len(recorder.requests) / elapsed, 3) if elapsed else None,
+        "session_latency": latency_stats([s["latency"] for s in completed]),
+        "endpoints": endpoints,
+    }
+
+
+def run_stage(clips, api_url, sessions, concurrency, rate, ollama_url=None, ollama_model=DEFAULT_OLLAMA_MODEL, seed=0):
+    """Sessions arriving at `rate` per second (0: all at once). concurrency > 0 caps sessions in
+    flight on the client; arrivals past the cap wait, and that wait counts toward their latency."""
+    recorder = Recorder()
+    rng = random.Random(seed)
+    started = time.time()
+    futures = []
+    arrival = started
+    with ThreadPoolExecutor(max_workers=concurrency if concurrency > 0 else max(1, sessions)) as pool:
+        for i in range(sessions):
+            if rate > 0 and i:
+                # Absolute schedule: a slow submit does not push later arrivals back
+                arrival += rng.expovariate(rate)
+                time.sleep(max(0.0, arrival - time.time()))
+            futures.append(pool.submit(run_session, rng.choice(clips), api_url, recorder,
+                                       ollama_url, ollama_model, arrival))
+    for future in futures:
+        error = future.exception()
+        if error is not None:
+            # The session died before recording itself (e.g. an unreadable clip)
+            recorder.session(None, False, error=f"{type(error).__name__}: {error}")
+    return summarize(recorder, time.time() - started)
+
+
+def print_stage(rate, stats):
+    print(f"\n=== {rate:g} sessions/s: {stats['sessions_completed']}/{stats['sessions']} sessions completed "
+          f"in {stats['elapsed_sec']:.1f}s ({stats['throughput_sessions_per_sec']:.2f} sessions/s, "
+          f"{stats['throughput_requests_per_sec']:.2f} req/s)")
+    if stats["session_errors"]:
+        print(f"Session errors: {stats['session_error_types']}")
+    if stats["client_queue_wait"].get("max", 0) > 0.1:
+        print(f"Client queue wait p95 {stats['client_queue_wait']['p95']:.2f}s (raise --concurrency or use 0)")
+    print(f"{'endpoint':24s} {'count':>6s} {'p50':>7s} {'p95':>7s} {'p99':>7s} {'errors':>7s} {'429':>6s}")
+    for endpoint, e in stats["endpoints"].items():
+        print(f"{endpoint:24s} {e['count']:6d} {e.get('p50', float('nan')):7.2f} {e.get('p95', float('nan')):7.2f} "
+              f"{e.get('p99', float('nan')):7.2f} {e['error_rate']:7.1%} {e['rate_429']:6.1%}")
+
+
+def find_pids(patterns):
+    pids = []
+    for pattern in patterns:
+        out = subprocess.run(["pgrep", "-f", pattern], capture_output=True, text=True).stdout.split()
+        pids.extend(int(p) for p in out if int(p) != os.getpid())
+    return pids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay concurrent practice sessions against the Python API")
+    parser.add_argument("clip_dir", help="Directory (or manifest) of audio clips")
+    parser.add_argument("--api-url", default=DEFAULT_API_URL)
+    parser.add_argument("--ollama-url", default=None, help="Also call /api/generate here (e.g. ollama_stub.py)")
+    parser.add_argument("--ollama-model", default=DEFAULT_OLLAMA_MODEL)
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS, help="Sessions per arrival rate")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Max sessions in flight on the client (0: no cap)")
+    parser.add_argument("--rate", default=DEFAULT_RATES, help="Arrival rates in sessions/s, e.g. 0.5,1,2 (0: burst)")
+    parser.add_argument("--pid", type=int, action="append", default=[], help="Server PID to sample RSS from")
+    parser.add_argument("--pgrep", action="append", default=[], help="Sample RSS of processes matching this command line")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.clip_dir):
+        print(f"Error: {args.clip_dir} not found!")
+        sys.exit(1)
+    clips = list_audio_files(args.clip_dir)
+    if not clips:
+        print(f"No audio clips found in {args.clip_dir}")
+        sys.exit(1)
+    pids = args.pid + find_pids(args.pgrep)
+    rates = [float(r) for r in args.rate.split(",") if r.strip()]
+    print(f"{len(clips)} clips, {args.sessions} sessions per rate {rates}, concurrency {args.concurrency or 'open'}, "
+          f"RSS of {pids or 'no processes'}")
+
+    report = {"config": {"api_url": args.api_url, "ollama_url": args.ollama_url, "clips": len(clips),
+                         "sessions": args.sessions, "concurrency": args.concurrency, "rates": rates},
+              "stages": []}
+    with RSSSampler(pids) as sampler:
+        for rate in rates:
+            stats = run_stage(clips, args.api_url, args.sessions, args.concurrency, rate,
+                              args.ollama_url, args.ollama_model)
+            print_stage(rate, stats)
+            report["stages"].append(dict(rate=rate, **stats))
+    report["rss"] = sampler.report()
+    for pid, rss in report["rss"].items():
+        print(f"RSS pid {pid}: {rss['start_mb']:.0f} MB -> {rss['end_mb']:.0f} MB (peak {rss['peak_mb']:.0f} MB)")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
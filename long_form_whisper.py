@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Parallel Long-Form Whisper Transcription
+Splits a long recording at the quietest point near every 30-second window
+boundary and transcribes the pieces in a process pool. The decoded audio is
+placed in shared memory once, each worker loads Whisper once and reads only its
+own slice, and the segments and word timestamps are merged back in order, so
+wall-clock time drops with the number of cores instead of decoding windows one
+after another on one core. The API sends long uploads here through a pool that
+stays alive between requests (get_pool), so workers load Whisper only once.
+
+Usage:
+    python long_form_whisper.py <audio> [-o whisper_words.json] [--model base] [-j WORKERS]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from silence_trim import FRAME_SEC, frame_energy_db
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+SAMPLE_RATE = 16000
+WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "base")
+PIECE_SEC = 30.0  # Longest piece: one Whisper window
+SEARCH_SEC = 5.0  # Each cut is placed at the quietest point in the last SEARCH_SEC of a piece
+SMOOTH_SEC = 0.2  # Energy is averaged over this span so cuts land in pauses, not between phones
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+DEFAULT_OUTPUT = "whisper_words.json"
+CANCEL_POLL_SEC = 0.5  # How often a running transcription checks its cancel token
+# =============================================================================
+
+
+def split_points(audio, piece_sec=PIECE_SEC, search_sec=SEARCH_SEC, sr=SAMPLE_RATE):
+    """Sample offsets [0, ..., len(audio)] cutting audio into pieces of at most piece_sec,
+    each cut at the quietest smoothed frame within search_sec before the piece limit"""
+    frame = int(FRAME_SEC * sr)
+    energy = frame_energy_db(audio, FRAME_SEC, sr)
+    smooth = max(1, int(round(SMOOTH_SEC / FRAME_SEC)))
+    if len(energy) >= smooth:
+        energy = np.convolve(energy, np.ones(smooth) / smooth, mode="same")
+
+    bounds = [0]
+    piece = int(piece_sec * sr)
+    search = int(search_sec * sr)
+    while len(audio) - bounds[-1] > piece:
+        lo = (bounds[-1] + piece - search) // frame
+        hi = (bounds[-1] + piece) // frame
+        cut = (lo + int(np.argmin(energy[lo:hi]))) * frame + frame // 2 if hi > lo else bounds[-1] + piece
+        bounds.append(min(max(cut, bounds[-1] + frame), bounds[-1] + piece))
+    bounds.append(len(audio))
+    return bounds
+
+
+# ---- Worker process: one Whisper model per process, audio read from shared memory ----
+_worker_model = None
+
+
+def _init_worker(model_name, num_threads):
+    global _worker_model
+    import torch
+    import whisper
+    torch.set_num_threads(num_threads)
+    _worker_model = whisper.load_model(model_name)
+
+
+def _transcribe_piece(shm_name, n_samples, start, end, options):
+    """Transcribe audio[start:end] of the shared buffer; times are shifted to the full recording"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        audio = np.ndarray((n_samples,), dtype=np.float32, buffer=shm.buf)
+        piece = audio[start:end].copy()
+        del audio  # The buffer cannot be closed while a view is alive
+    finally:
+        shm.close()
+
+    result = _worker_model.transcribe(piece, **options)
+    offset = start / SAMPLE_RATE
+    segments = []
+    for segment in result["segments"]:
+        merged = {"start": round(segment["start"] + offset, 3), "end": round(segment["end"] + offset, 3),
+                  "text": segment["text"].strip()}
+        if "words" in segment:
+            merged["words"] = [{"word": w["word"].strip(), "start": round(w["start"] + offset, 3),
+                                "end": round(w["end"] + offset, 3)} for w in segment["words"]]
+        segments.append(merged)
+    return {"text": result["text"].strip(), "segments": segments, "language": result.get("language")}
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _new_pool(model_name, workers):
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # Spawned workers do not inherit this process's torch state
+    ctx = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                               initargs=(model_name, threads))
+
+
+def get_pool(model_name=WHISPER_MODEL, workers=DEFAULT_WORKERS):
+    """A process pool kept between calls whose workers hold model_name loaded"""
+    with _pools_lock:
+        key = (model_name, workers)
+        if key not in _pools:
+            _pools[key] = _new_pool(model_name, workers)
+        return _pools[key]
+
+
+def _run_pieces(pool, shm_name, n_samples, bounds, options, cancel_token=None):
+    """Per-piece results in order; queued pieces are dropped once cancel_token is cancelled"""
+    futures = [pool.submit(_transcribe_piece, shm_name, n_samples, start, end, options)
+               for start, end in zip(bounds[:-1], bounds[1:])]
+    pending = set(futures)
+    try:
+        while pending:
+            if cancel_token is not None:
+                cancel_token.check()
+            _, pending = wait(pending, timeout=CANCEL_POLL_SEC, return_when=FIRST_COMPLETED)
+    finally:
+        for future in pending:
+            future.cancel()
+    return [future.result() for future in futures]
+
+
+def merge_pieces(results, bounds, sr=SAMPLE_RATE):
+    """One transcribe()-style result from the per-piece results (already in order)"""
+    segments = [segment for result in results for segment in result["segments"]]
+    return {
+        "text": " ".join(r["text"] for r in results if r["text"]),
+        "segments": segments,
+        "words": [word for segment in segments for word in segment.get("words", [])],
+        "language": next((r["language"] for r in results if r["language"]), None),
+        "pieces": [{"start": round(s / sr, 3), "end": round(e / sr, 3)} for s, e in zip(bounds[:-1], bounds[1:])],
+    }
+
+
+def transcribe_long(audio, model_name=WHISPER_MODEL, workers=DEFAULT_WORKERS, language=None,
+                    word_timestamps=True, cancel_token=None, pool=None):
+    """Transcribe a 16 kHz mono float32 array piece by piece in a process pool.
+    pool is a get_pool() pool to reuse (a temporary one is started otherwise); raises
+    Cancelled between pieces once cancel_token is cancelled."""
+    audio = np.ascontiguousarray(audio, dtype=np.float32)
+    bounds = split_points(audio)
+    n = len(bounds) - 1
+    workers = max(1, min(workers, n))
+    # Pieces are at most one window, so there is no earlier text within a piece to condition on
+    options = {"word_timestamps": word_timestamps, "language": language, "condition_on_previous_text": False}
+    print(f"Transcribing {len(audio) / SAMPLE_RATE:.1f}s in {n} pieces with {workers} workers")
+
+    shm = shared_memory.SharedMemory(create=True, size=max(audio.nbytes, 1))
+    try:
+        shared = np.ndarray(audio.shape, dtype=np.float32, buffer=shm.buf)
+        shared[:] = audio
+        del shared
+        if pool is not None:
+            results = _run_pieces(pool, shm.name, len(audio), bounds, options, cancel_token)
+        else:
+            with _new_pool(model_name, workers) as own_pool:
+                results = _run_pieces(own_pool, shm.name, len(audio), bounds, options, cancel_token)
+    finally:
+        shm.close()
+        shm.unlink()
+    return merge_pieces(results, bounds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe a long recording with Whisper across processes")
+    parser.add_argument("audio", help="Audio file")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help="Word timestamps JSON (whisper_words.json format)")
+    parser.add_argument("--model", default=WHISPER_MODEL)
+    parser.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--language", default=None)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.audio):
+        print(f"Error: {args.audio} not found!")
+        sys.exit(1)
+
+    from audio_cache import load_audio
+    audio, _ = load_audio(args.audio, sr=SAMPLE_RATE)
+    start = time.time()
+    result = transcribe_long(audio, args.model, args.workers, args.language)
+    elapsed = time.time() - start
+
+    with open(args.output, "w") as f:
+        json.dump(result["words"], f, indent=2)
+    print(f"Transcription complete! Found {len(result['words'])} words in {len(result['pieces'])} pieces")
+    print(f"✓ {len(audio) / SAMPLE_RATE:.1f}s of audio in {elapsed:.1f}s")
+    print(f"Saved word timestamps to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Memory-Budgeted Model Pool
+Loads checkpoints on demand, keyed by (family, name, precision), and keeps the
+resident set within a RAM budget by evicting the least recently used model.
+Concurrent requests for the same cold model share a single load.
+
+Families register a loader: loader(name, precision) -> model object (anything
+holding torch modules; tuples such as (processor, model) are fine).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+DEFAULT_BUDGET_MB = 4096
+PRECISIONS = ("fp32", "fp16", "int8")
+# =============================================================================
+
+
+def _state_tensors(value):
+    """Tensors in one state_dict() value (packed quantized weights come as a (weight, bias) tuple)"""
+    import torch
+    if isinstance(value, torch.Tensor):
+        yield value
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            yield from _state_tensors(item)
+
+
+def estimate_model_bytes(obj):
+    """Bytes held by the tensors of every torch module in obj. Counted from state_dict() so the
+    packed int8 weights of dynamically quantized layers, which are neither parameters nor
+    buffers, are included; tensors shared between entries are counted once."""
+    import torch
+    modules = obj if isinstance(obj, (tuple, list)) else [obj]
+    seen = set()
+    total = 0
+    for module in modules:
+        if isinstance(module, torch.nn.Module):
+            for value in module.state_dict(keep_vars=True).values():
+                for tensor in _state_tensors(value):
+                    key = (tensor.data_ptr(), tensor.numel())
+                    if key not in seen:
+                        seen.add(key)
+                        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def apply_precision(module, precision):
+    """Convert a loaded torch module to the requested precision"""
+    import torch
+    if precision == "fp32":
+        return module
+    if precision == "fp16":
+        return module.half()
+    if precision == "int8":
+        # Dynamic quantization of the Linear layers, the usual CPU int8 path
+        return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+    raise ValueError(f"Unknown precision: {precision} (expected one of {PRECISIONS})")
+
+
+class ModelPool:
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_MB * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self._loaders = {}
+        self._entries = OrderedDict()  # key -> (model, size_bytes), least recently used first
+        self._loading = {}  # key -> Future shared by every caller waiting on that load
+        self._lock = threading.Lock()
+        self.bytes_used = 0
+        self.stats = {"hits": 0, "loads": 0, "shared_loads": 0, "evictions": 0,
+                      "load_failures": 0, "load_sec_total": 0.0}
+
+    def register_loader(self, family, loader):
+        self._loaders[family] = loader
+
+    def get(self, family, name, precision="fp32"):
+        """Return the model for (family, name, precision), loading it if needed"""
+        key = (family, name, precision)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+            future = self._loading.get(key)
+            owner = future is None
+            if owner:
+                if family not in self._loaders:
+                    raise KeyError(f"No loader registered for model family '{family}'")
+                future = Future()
+                self._loading[key] = future
+            else:
+                self.stats["shared_loads"] += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            print(f"Loading {family} model {name} ({precision})...")
+            started = time.time()
+            model = self._loaders[family](name, precision)
+            size = estimate_model_bytes(model)
+            elapsed = time.time() - started
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+                self.stats["load_failures"] += 1
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._entries[key] = (model, size)
+            self.bytes_used += size
+            self.stats["loads"] += 1
+            self.stats["load_sec_total"] += elapsed
+            self._evict_over_budget(keep=key)
+            del self._loading[key]
+        print(f"Loaded {family} model {name} ({precision}): {size / 1e6:.0f} MB in {elapsed:.1f}s")
+        future.set_result(model)
+        return model
+
+    def _evict_over_budget(self, keep):
+        # Caller holds self._lock. Requests already holding an evicted model keep
+        # their reference until they finish; the pool just stops handing it out.
+        for key in list(self._entries):
+            if self.bytes_used <= self.budget_bytes:
+                break
+            if key == keep:
+                continue
+            _, size = self._entries.pop(key)
+            self.bytes_used -= size
+            self.stats["evictions"] += 1
+            print(f"Evicted {key[0]} model {key[1]} ({key[2]}) to stay within the memory budget")
+
+    def is_loaded(self, family, name, precision="fp32"):
+        with self._lock:
+            return (family, name, precision) in self._entries
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats,
+                        load_sec_total=round(self.stats["load_sec_total"], 3),
+                        bytes_used=self.bytes_used,
+                        budget_bytes=self.budget_bytes,
+                        resident=[{"family": f, "name": n, "precision": p, "bytes": size}
+                                  for (f, n, p), (_, size) in self._entries.items()])
@@ -1,14 +1,22 @@
 import json
 import requests
-import subprocess
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import time
+from prompt_builder import PromptBuilder, DEFAULT_TOKEN_BUDGET, analysis_from_result
+from tts_synthesizer import synthesize_speech, get_worker
+
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")  # ollama_stub.py for load tests
 
 class OllamaSpeechAnalyzer:
-    def __init__(self, ollama_url="http://localhost:11434"):
+    def __init__(self, ollama_url=OLLAMA_URL, token_budget=None):
         self.ollama_url = ollama_url
         self.model_name = "llama3.2"  # or any other model you have
+        if token_budget is None:
+            token_budget = int(os.environ.get("PROMPT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+        self.prompt_builder = PromptBuilder(token_budget=token_budget)
+        self.last_prompt_tokens = 0
+        self.speech_job = None  # Background TTS of the last response
         
     def load_speech_data(self) -> Dict[str, Any]:
         """Load all speech analysis data"""
@@ -48,29 +56,16 @@ class OllamaSpeechAnalyzer:
         
         return data
     
-    def create_analysis_prompt(self, speech_data: Dict[str, Any]) -> str:
-        # Use the full output of wav2vec2_transcription.txt as the prompt
-        with open("wav2vec2_transcription.txt", "r") as f:
-            wav2vec2_output = f.read()
-
-        prompt = f"""
-You are an expert dialect and accent coach specializing in American spoken English. 
-Your goal is to help improve the speaker's accent, clarity, and naturalness. Make sure to point
-out grammer errors and suggest corrections first before pronunciation feedback.
-The Whisper reference text represents the intended utterance, while the 
-Wav2Vec2 recognized text reflects what the speaker actually said. 
- You are provided with phonemes for both the reference 
-(corrected) and hypothesis (spoken) texts. Use these to identify mispronunciations,
- but base your evaluation on the inferred intended sentence, not the raw Whisper text. 
- Provide your feedback in a clear, conversational tone suitable for accent coaching, 
- including: Overall Impression (intonation, rhythm, naturalness) Ranking of words mostly 
- misspoken Specific Feedback on pronunciation errors phonetic pronunciation
- spelling suggestions. 
-Here is the analysis output:
-{wav2vec2_output}
-
-
-"""
+    def create_analysis_prompt(self, speech_data: Dict[str, Any], analysis: Optional[Dict[str, Any]] = None) -> str:
+        """Build a compact, token-budgeted prompt from the wav2vec2 analysis and the loaded data"""
+        if analysis is not None:
+            prompt, tokens = self.prompt_builder.build(analysis_from_result(analysis), speech_data)
+        else:
+            with open("wav2vec2_transcription.txt", "r") as f:
+                wav2vec2_output = f.read()
+            prompt, tokens = self.prompt_builder.build_from_text(wav2vec2_output, speech_data)
+        self.last_prompt_tokens = tokens
+        print(f"Prompt tokens (estimated): {tokens} / budget {self.prompt_builder.token_budget}")
         return prompt
     
     def wait_for_ollama_ready(self, max_retries=5, delay=1):
@@ -87,51 +82,85 @@ Here is the analysis output:
         print("Ollama did not become ready in time.")
         return False
 
-    def query_ollama(self, prompt: str, max_retries=3, delay=2) -> str:
-        """Send prompt to Ollama and get response, with retry logic"""
+    def query_ollama(self, prompt: str, max_retries=3, delay=2, on_text=None) -> str:
+        """Send prompt to Ollama and stream the response, with retry logic.
+        on_text(chunk) is called with each piece of text as it is generated."""
         for attempt in range(1, max_retries + 1):
+            parts = []
             try:
-                response = requests.post(
+                with requests.post(
                     f"{self.ollama_url}/api/generate",
                     json={
                         "model": self.model_name,
                         "prompt": prompt,
-                        "stream": False
+                        "stream": True
                     },
+                    stream=True,
                     timeout=60
-                )
-                response.raise_for_status()
-                return response.json()["response"]
-            except requests.exceptions.RequestException as e:
+                ) as response:
+                    response.raise_for_status()
+                    # NDJSON: one object per generated piece, the last one (done) with the stats
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("error"):
+                            raise requests.exceptions.RequestException(chunk["error"])
+                        if chunk.get("response"):
+                            parts.append(chunk["response"])
+                            if on_text is not None:
+                                on_text(chunk["response"])
+                        if chunk.get("done"):
+                            # Ollama reports the real prompt token count it had to prefill
+                            if "prompt_eval_count" in chunk:
+                                print(f"Prompt tokens (Ollama): {chunk['prompt_eval_count']}, "
+                                      f"prefill {chunk.get('prompt_eval_duration', 0) / 1e9:.2f}s")
+                            break
+                return "".join(parts)
+            except (requests.exceptions.RequestException, ValueError) as e:
                 print(f"Error querying Ollama (attempt {attempt}): {e}")
+                if parts:
+                    # Already handed to on_text (and maybe spoken): a retry would repeat it
+                    return "".join(parts)
                 if attempt < max_retries:
                     print(f"Retrying in {delay} seconds...")
                     time.sleep(delay)
         return "Error: Could not connect to Ollama. Make sure it's running."
     
     def text_to_speech(self, text: str, output_file: str = "ollama_response.wav"):
-        """Convert text to speech using system TTS"""
+        """Convert text to speech using the configured TTS backend (espeak-ng or say)"""
+        return synthesize_speech(text, output_path=output_file)
+
+    def speak(self, text: str):
+        """Speak text in the background, sentence by sentence; returns immediately"""
         try:
-            # Use macOS say command (you can replace with other TTS engines)
-            subprocess.run([
-                "say", 
-                "-o", output_file,
-                "-v", "Alex",  # Voice name
-                text
-            ], check=True)
-            print(f"TTS output saved to: {output_file}")
-            return output_file
-        except subprocess.CalledProcessError as e:
-            print(f"TTS error: {e}")
-            return None
+            self.speech_job = get_worker().speak(text)
+        except Exception as e:
+            print(f"TTS not available: {e}")
+            self.speech_job = None
+        return self.speech_job
+
+    def start_speech(self):
+        """Open a background speech job to feed a streamed response into (None without TTS)"""
+        try:
+            self.speech_job = get_worker().start()
+        except Exception as e:
+            print(f"TTS not available: {e}")
+            self.speech_job = None
+        return self.speech_job
+
+    def wait_for_speech(self, timeout=None):
+        """Block until the last response has finished playing"""
+        if self.speech_job is not None:
+            self.speech_job.wait(timeout)
     
-    def run_analysis(self) -> str:
-        """Run the complete analysis pipeline"""
+    def run_analysis(self, analysis: Optional[Dict[str, Any]] = None) -> str:
+        """Run the complete analysis pipeline, optionally on an in-memory wav2vec2 result"""
         print("Loading speech data...")
         speech_data = self.load_speech_data()
         
         print("Creating analysis prompt...")
-        prompt = self.create_analysis_prompt(speech_data)
+        prompt = self.create_analysis_prompt(speech_data, analysis)
         
         print("Checking Ollama health...")
         if not self.wait_for_ollama_ready():
@@ -139,42 +168,45 @@ Here is the analysis output:
             return "Error: Ollama is not ready."
         
         print("Querying Ollama for analysis...")
-        analysis = self.query_ollama(prompt)
+        # Each sentence is spoken as soon as Ollama has generated it
+        job = self.start_speech()
+        streamed = []
+        label = "Response:"
+        tail = [""]  # End of the text so far: enough to catch a label split across chunks
+
+        def on_text(chunk):
+            before = tail[0]
+            tail[0] = (before + chunk)[-len(label):]
+            streamed.append(chunk)
+            if job is None:
+                return
+            if label in before + chunk and label not in before:
+                # Speak only what follows the label; sentences before it have already gone out
+                job.discard_pending()
+                job.feed((before + chunk).split(label, 1)[1])
+            else:
+                job.feed(chunk)
+
+        try:
+            analysis = self.query_ollama(prompt, on_text=on_text)
+        finally:
+            if job is not None:
+                job.close()
         
         print("Analysis complete!")
         print("\n" + "="*50)
         print("OLLAMA ANALYSIS:")
         print("="*50)
         print(analysis)
-        
-        # Extract response section for TTS
-        if "Response:" in analysis:
-            response_text = analysis.split("Response:")[-1].strip()
-        else:
-            response_text = analysis.strip()
-
-        # Use macOS 'say' to speak the response out loud at a fast rate
-        try:
-            subprocess.run([
-                "say",
-                "-v", "Alex",
-                "-r", "300",
-                response_text
-            ], check=True)
-        except Exception as e:
-            print(f"Error using 'say' command: {e}")
-
-        # (Optional) Still generate TTS file as before
-        # tts_file = self.text_to_speech(response_text)
-        # if tts_file:
-        #     print(f"Speech response generated: {tts_file}")
+        if not streamed:
+            self.speak(analysis)  # Nothing was streamed (e.g. the connection error message)
         
         return analysis
 
 def main():
     # Check if Ollama is running
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
+        response = requests.get(f"{OLLAMA_URL}/api/tags", timeout=5)
         if response.status_code != 200:
             print("Error: Ollama is not running or not accessible")
             print("Please start Ollama first: ollama serve")
@@ -192,6 +224,7 @@ def main():
     with open("ollama_analysis.txt", "w") as f:
         f.write(analysis)
     print("\nAnalysis saved to: ollama_analysis.txt")
+    analyzer.wait_for_speech()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Local Ollama Stand-In
+Answers Ollama's /api/tags and /api/generate with canned coaching text after a
+configurable delay (fixed latency plus jitter, plus generation time at a given
+tokens/second), so load tests exercise the full request path without a GPU or
+a real model. Point callers at it with OLLAMA_URL=http://localhost:11435.
+
+Usage:
+    python ollama_stub.py [--port 11435] [--latency-ms 300] [--jitter-ms 100] [--tokens-per-sec 40]
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+DEFAULT_PORT = 11435  # Next to a real Ollama on 11434
+DEFAULT_MODELS = ("llama3.2",)
+DEFAULT_LATENCY_MS = 300.0  # Prompt prefill / time to first token
+DEFAULT_JITTER_MS = 100.0
+DEFAULT_TOKENS_PER_SEC = 40.0
+RESPONSES = (
+    "Nice work! Your vowels were clear. Try to slow down a little on longer words.",
+    "Good effort. Pay attention to the 'th' sound and keep practicing the ending consonants.",
+    "Great job! Your rhythm is natural. Next, focus on stressing the key syllables.",
+)
+# =============================================================================
+
+
+def estimate_tokens(text):
+    return max(1, int(len(text.split()) * 1.3))
+
+
+class StubConfig:
+    def __init__(self, models=DEFAULT_MODELS, latency_ms=DEFAULT_LATENCY_MS, jitter_ms=DEFAULT_JITTER_MS,
+                 tokens_per_sec=DEFAULT_TOKENS_PER_SEC):
+        self.models = list(models)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+
+class OllamaStubHandler(BaseHTTPRequestHandler):
+    config = StubConfig()
+
+    def log_message(self, format, *args):
+        pass  # Load tests send thousands of requests
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/api/tags":
+            now = datetime.now(timezone.utc).isoformat()
+            self._send_json(200, {"models": [{"name": f"{m}:latest", "model": f"{m}:latest", "modified_at": now,
+                                              "size": 0, "digest": "stub"} for m in self.config.models]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+        model = request.get("model", "")
+        if model.split(":")[0] not in self.config.models:
+            self._send_json(404, {"error": f"model '{model}' not found, try pulling it first"})
+            return
+
+        n = self.config.count()
+        started = time.time()
+        response = RESPONSES[n % len(RESPONSES)]
+        prompt_tokens = estimate_tokens(request.get("prompt", ""))
+        eval_tokens = estimate_tokens(response)
+        prefill_sec = max(0.0, random.gauss(self.config.latency_ms, self.config.jitter_ms)) / 1000
+        eval_sec = eval_tokens / self.config.tokens_per_sec if self.config.tokens_per_sec > 0 else 0.0
+        time.sleep(prefill_sec)
+        stats = {"model": model, "created_at": datetime.now(timezone.utc).isoformat(),
+                 "prompt_eval_count": prompt_tokens, "prompt_eval_duration": int(prefill_sec * 1e9),
+                 "eval_count": eval_tokens, "eval_duration": int(eval_sec * 1e9)}
+
+        if request.get("stream", True):
+            # NDJSON chunks, one per word, like Ollama's default streaming mode
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            words = response.split(" ")
+            for i, word in enumerate(words):
+                time.sleep(eval_sec / len(words))
+                chunk = {"model": model, "response": word + (" " if i < len(words) - 1 else ""), "done": False}
+                self.wfile.write((json.dumps(chunk) + "\n").encode("utf-8"))
+                self.wfile.flush()
+            final = dict(stats, response="", done=True, total_duration=int((time.time() - started) * 1e9))
+            self.wfile.write((json.dumps(final) + "\n").encode("utf-8"))
+        else:
+            time.sleep(eval_sec)
+            self._send_json(200, dict(stats, response=response, done=True,
+                                      total_duration=int((time.time() - started) * 1e9)))
+
+
+def serve(port=DEFAULT_PORT, config=None):
+    OllamaStubHandler.config = config or StubConfig()
+    server = ThreadingHTTPServer(("127.0.0.1", port), OllamaStubHandler)
+    server.daemon_threads = True
+    print(f"Ollama stub listening on http://127.0.0.1:{port} "
+          f"(models {OllamaStubHandler.config.models}, latency {OllamaStubHandler.config.latency_ms:g}ms)")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in for Ollama's /api/tags and /api/generate")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--model", action="append", dest="models", help="Model name to advertise (repeatable)")
+    parser.add_argument("--latency-ms", type=float, default=DEFAULT_LATENCY_MS, help="Mean time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=DEFAULT_JITTER_MS, help="Standard deviation of the latency")
+    parser.add_argument("--tokens-per-sec", type=float, default=DEFAULT_TOKENS_PER_SEC, help="Generation speed (0: instant)")
+    args = parser.parse_args()
+    config = StubConfig(args.models or DEFAULT_MODELS, args.latency_ms, args.jitter_ms, args.tokens_per_sec)
+    server = serve(args.port, config)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Prompt Builder for Ollama accent coaching
+Turns the wav2vec2 analysis into a compact structured summary (top mispronounced
+words, grouped phoneme substitutions with counts) and keeps the prompt within a
+token budget, since prompt length drives Ollama prefill latency.
+"""
+
+import difflib
+import re
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+DEFAULT_TOKEN_BUDGET = 600  # Max prompt tokens sent to Ollama
+DEFAULT_TOP_N = 5  # Entries kept per ranked list
+TIKTOKEN_ENCODING = "cl100k_base"  # Close enough to llama3's BPE for budgeting
+CHARS_PER_TOKEN = 4  # Fallback estimate when tiktoken is unavailable
+# =============================================================================
+
+INSTRUCTIONS = """You are an expert dialect and accent coach for American spoken English.
+The reference text is what the speaker intended; the recognized text is what they actually said.
+Point out grammar errors and corrections first, then pronunciation feedback.
+Reply conversationally with: Overall Impression (intonation, rhythm, naturalness),
+Ranking of most misspoken words, Specific pronunciation feedback with phonetic spelling suggestions."""
+
+_encoder = None
+
+
+def count_tokens(text: str) -> int:
+    """Estimate the number of tokens in text using tiktoken, falling back to a char heuristic"""
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+        except Exception:
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def format_wav2vec2_output(result: Dict[str, Any]) -> str:
+    """Render a wav2vec2 analysis result in the wav2vec2_transcription.txt format"""
+    return (
+        "Wav2Vec2 Speech Analysis Output\n"
+        "==============================\n"
+        f"Whisper reference text: {result['reference_text']}\n"
+        f"Wav2Vec2 recognized text: {result['recognized_text']}\n"
+        f"Reference phonemes: {result['reference_phonemes']}\n"
+        f"Hypothesis phonemes: {result['hypothesis_phonemes']}\n"
+        "\nAlignment and Feedback:\n"
+        f"{result['feedback']}"
+    )
+
+
+def parse_wav2vec2_output(text: str) -> Dict[str, Any]:
+    """Parse wav2vec2_transcription.txt (or wav2vec2.py stdout) into structured fields"""
+    fields = {
+        "reference_text": "",
+        "recognized_text": "",
+        "reference_phonemes": "",
+        "hypothesis_phonemes": "",
+        "ops": [],
+    }
+    prefixes = {
+        "Whisper reference text:": "reference_text",
+        "Wav2Vec2 recognized text:": "recognized_text",
+        "Reference phonemes:": "reference_phonemes",
+        "Hypothesis phonemes:": "hypothesis_phonemes",
+    }
+    phoneme_keys = ("reference_phonemes", "hypothesis_phonemes")
+    last_key = None
+    for line in text.splitlines():
+        line = line.strip()
+        for prefix, key in prefixes.items():
+            if line.startswith(prefix):
+                fields[key] = line[len(prefix):].strip()
+                last_key = key
+                break
+        else:
+            # espeak emits one line per clause, so phoneme strings can wrap
+            if last_key in phoneme_keys and line and not any(c.isspace() for c in line):
+                fields[last_key] += line
+                continue
+            last_key = None
+            match = re.match(r"^Substitute '(.*)' with '(.*)'$", line)
+            if match:
+                fields["ops"].append(("replace", match.group(1), match.group(2)))
+                continue
+            match = re.match(r"^Missing '(.*)'$", line)
+            if match:
+                fields["ops"].append(("delete", match.group(1), ""))
+                continue
+            match = re.match(r"^Extra '(.*)'$", line)
+            if match:
+                fields["ops"].append(("insert", "", match.group(1)))
+    return fields
+
+
+def analysis_from_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a wav2vec2.analyze_audio() result (index-based edit ops) into prompt fields"""
+    ref = result.get("reference_phonemes", "")
+    hyp = result.get("hypothesis_phonemes", "")
+    ops = []
+    for kind, i, j in result.get("edit_ops", []):
+        ops.append((kind,
+                    ref[i] if kind in ("replace", "delete") and i < len(ref) else "",
+                    hyp[j] if kind in ("replace", "insert") and j < len(hyp) else ""))
+    return {
+        "reference_text": result.get("reference_text", ""),
+        "recognized_text": result.get("recognized_text", ""),
+        "reference_phonemes": ref,
+        "hypothesis_phonemes": hyp,
+        "ops": ops,
+    }
+
+
+def word_errors(reference_text: str, recognized_text: str) -> List[Tuple[str, str]]:
+    """Align reference and recognized words and return (intended, spoken) pairs that differ"""
+    ref_words = re.findall(r"[\w']+", reference_text.lower())
+    hyp_words = re.findall(r"[\w']+", recognized_text.lower())
+    errors = []
+    matcher = difflib.SequenceMatcher(a=ref_words, b=hyp_words, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        spoken = " ".join(hyp_words[j1:j2])
+        if i1 == i2:
+            errors.append(("", spoken))
+        for word in ref_words[i1:i2]:
+            errors.append((word, spoken))
+    return errors
+
+
+def summarize_analysis(analysis: Dict[str, Any], speech_data: Optional[Dict[str, Any]] = None,
+                       top_n: int = DEFAULT_TOP_N) -> Dict[str, Any]:
+    """Group the raw edit ops and word errors into ranked, counted lists"""
+    speech_data = speech_data or {}
+    substitutions = Counter()
+    missing = Counter()
+    extra = Counter()
+    for kind, ref, hyp in analysis.get("ops", []):
+        if kind == "replace":
+            substitutions[f"{ref}->{hyp}"] += 1
+        elif kind == "delete":
+            missing[ref] += 1
+        elif kind == "insert":
+            extra[hyp] += 1
+
+    # Rank words by how often they were misspoken, weighting in MFA/CMUdict detections
+    word_counts = Counter()
+    heard_as = {}
+    for intended, spoken in word_errors(analysis.get("reference_text", ""),
+                                        analysis.get("recognized_text", "")):
+        if intended:
+            word_counts[intended] += 1
+            heard_as.setdefault(intended, spoken)
+    for entry in speech_data.get("mispronunciations") or []:
+        word = entry.get("word")
+        if word:
+            word_counts[word] += max(int(entry.get("edit_distance", 1)), 1)
+
+    ref_len = max(len(analysis.get("reference_phonemes", "")), 1)
+    summary = {
+        "reference_text": analysis.get("reference_text", ""),
+        "recognized_text": analysis.get("recognized_text", ""),
+        "phoneme_accuracy": round(max(0.0, 1 - len(analysis.get("ops", [])) / ref_len), 2),
+        "top_words": [(w, c, heard_as.get(w, "")) for w, c in word_counts.most_common(top_n)],
+        "substitutions": substitutions.most_common(top_n),
+        "missing": missing.most_common(top_n),
+        "extra": extra.most_common(top_n),
+    }
+
+    temporal = speech_data.get("temporal_features") or {}
+    if temporal.get("speaking_rate"):
+        summary["speaking_rate"] = round(float(temporal["speaking_rate"]), 2)
+    pauses = speech_data.get("pauses")
+    if isinstance(pauses, list) and pauses:
+        summary["pause_count"] = len(pauses)
+    return summary
+
+
+def _format_counts(items) -> str:
+    return ", ".join(f"{key} x{count}" for key, count in items)
+
+
+def format_summary(summary: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Render the summary as (section, text) pairs, most important first"""
+    sections = [
+        ("reference", f"Reference: {summary['reference_text']}"),
+        ("recognized", f"Recognized: {summary['recognized_text']}"),
+        ("accuracy", f"Phoneme accuracy: {summary['phoneme_accuracy']:.0%}"),
+    ]
+    if summary["top_words"]:
+        words = ", ".join(
+            f"{word} x{count}" + (f" (heard '{heard}')" if heard else "")
+            for word, count, heard in summary["top_words"]
+        )
+        sections.append(("top_words", f"Top mispronounced words: {words}"))
+    if summary["substitutions"]:
+        sections.append(("substitutions", f"Substitutions (intended->spoken): {_format_counts(summary['substitutions'])}"))
+    if summary["missing"]:
+        sections.append(("missing", f"Missing sounds: {_format_counts(summary['missing'])}"))
+    if summary["extra"]:
+        sections.append(("extra", f"Extra sounds: {_format_counts(summary['extra'])}"))
+    if "speaking_rate" in summary:
+        sections.append(("speaking_rate", f"Speaking rate: {summary['speaking_rate']} words/sec"))
+    if "pause_count" in summary:
+        sections.append(("pauses", f"Pauses: {summary['pause_count']}"))
+    return sections
+
+
+class PromptBuilder:
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET, top_n: int = DEFAULT_TOP_N,
+                 instructions: str = INSTRUCTIONS):
+        self.token_budget = token_budget
+        self.top_n = top_n
+        self.instructions = instructions
+        self.over_budget = False  # Whether the last build() could not fit the budget
+
+    def _render(self, sections: List[Tuple[str, str]]) -> str:
+        body = "\n".join(text for _, text in sections)
+        return f"{self.instructions}\n\nAnalysis summary:\n{body}\n"
+
+    def build(self, analysis: Dict[str, Any], speech_data: Optional[Dict[str, Any]] = None) -> Tuple[str, int]:
+        """Build a prompt within the token budget. Returns (prompt, prompt_tokens)"""
+        top_n = self.top_n
+        while True:
+            summary = summarize_analysis(analysis, speech_data, top_n=top_n)
+            sections = format_summary(summary)
+            prompt = self._render(sections)
+            tokens = count_tokens(prompt)
+            if tokens <= self.token_budget or top_n <= 1:
+                break
+            top_n -= 1
+
+        # Still over budget: drop the least important sections from the end
+        while tokens > self.token_budget and len(sections) > 3:
+            sections = sections[:-1]
+            prompt = self._render(sections)
+            tokens = count_tokens(prompt)
+
+        # Last resort: trim the utterance texts, keeping the instructions intact
+        while tokens > self.token_budget:
+            name, text = max(sections[:2], key=lambda section: len(section[1]))
+            excess = (tokens - self.token_budget) * CHARS_PER_TOKEN
+            keep = max(len(text) - excess, len(name) + 8)
+            if keep >= len(text) - 3:
+                break  # Both texts are at their floor; "..." would not make them shorter
+            sections = [(n, text[:keep] + "..." if n == name else t) for n, t in sections]
+            prompt = self._render(sections)
+            tokens = count_tokens(prompt)
+
+        self.over_budget = tokens > self.token_budget
+        if self.over_budget:
+            print(f"Warning: prompt is {tokens} tokens, over the budget of {self.token_budget} "
+                  f"even with the summary cut to a minimum (instructions: {count_tokens(self.instructions)} tokens)")
+        return prompt, tokens
+
+    def build_from_text(self, wav2vec2_output: str, speech_data: Optional[Dict[str, Any]] = None) -> Tuple[str, int]:
+        """Build a prompt from raw wav2vec2.py output text"""
+        return self.build(parse_wav2vec2_output(wav2vec2_output), speech_data)
+
+
+if __name__ == "__main__":
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else "wav2vec2_transcription.txt"
+    with open(path, "r") as f:
+        prompt, tokens = PromptBuilder().build_from_text(f.read())
+    print(prompt)
+    print(f"Prompt tokens: {tokens}")
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Practice-Prompt Catalogue
+Learners mostly read a fixed set of sentences, so the reference side of the
+analysis (reference phonemes, per-word expected pronunciations and the CTC target
+ids for the wav2vec2 vocabulary) is computed once per prompt and stored here.
+/analyze requests that name a prompt_id skip Whisper and espeak for the reference.
+
+Build or extend the catalogue from a prompt list:
+    python prompt_catalogue.py <prompts.txt | prompts.jsonl> [-o practice_prompts.json] [--language en]
+
+A .txt list holds one prompt per line, optionally "id<TAB>text"; a .jsonl list
+holds {"id", "text", "language"} objects.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+DEFAULT_CATALOGUE = "practice_prompts.json"
+DEFAULT_LANGUAGE = "en"
+ESPEAK_PATH = "espeak"
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive")  # cmu_lexicon.py
+# wav2vec2 checkpoint whose vocabulary the CTC targets are written in, per language
+WAV2VEC2_MODELS = {
+    "en": "facebook/wav2vec2-base-960h",
+    "fr": "jonatasgrosman/wav2vec2-large-xlsr-53-french",
+    "es": "jonatasgrosman/wav2vec2-large-xlsr-53-spanish",
+    "de": "jonatasgrosman/wav2vec2-large-xlsr-53-german",
+}
+# =============================================================================
+
+
+def prompt_id_for(text):
+    """Stable id for a prompt listed without one"""
+    return hashlib.sha1(text.strip().lower().encode("utf-8")).hexdigest()[:12]
+
+
+def split_words(text):
+    return re.findall(r"[\w']+", text.lower())
+
+
+def espeak_ipa_batch(texts, voice=DEFAULT_LANGUAGE):
+    """IPA for each text (spaces removed, as in wav2vec2.py), running the espeak processes side by side"""
+    procs = [subprocess.Popen([ESPEAK_PATH, "-q", "--ipa=3", f"-v{voice}", text],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+             for text in texts]
+    return [proc.communicate()[0].strip().replace(" ", "") for proc in procs]
+
+
+def load_cmu():
+    """The memory-mapped CMU lexicon (archive/cmu_lexicon.py), or None when it cannot be built"""
+    if ARCHIVE_DIR not in sys.path:
+        sys.path.append(ARCHIVE_DIR)
+    try:
+        from cmu_lexicon import open_lexicon
+        return open_lexicon()
+    except ImportError as e:
+        print(f"{e}; building without CMUdict pronunciations")
+        return None
+
+
+def ctc_target_ids(tokenizer, text):
+    """Token ids of text in the CTC vocabulary, trying the casing the vocabulary uses"""
+    best = None
+    for candidate in (text.upper(), text.lower()):
+        ids = tokenizer(candidate).input_ids
+        unknown = sum(i == tokenizer.unk_token_id for i in ids)
+        if best is None or unknown < best[0]:
+            best = (unknown, ids)
+    return best[1]
+
+
+def build_entry(prompt_id, text, language, cmu=None, tokenizer=None, model_name=None):
+    """Precompute every reference-side artifact for one prompt"""
+    words = split_words(text)
+    ipa = espeak_ipa_batch([text] + words, voice=language)
+    entry = {
+        "id": prompt_id,
+        "text": text,
+        "language": language,
+        "reference_phonemes": ipa[0],
+        "words": [{
+            "word": word,
+            "ipa": word_ipa,
+            # First CMUdict variant in lower-case ARPAbet, as in detect_mispronunciations.py
+            "cmu": [p.lower() for p in cmu[word][0]] if cmu is not None and word in cmu else None,
+        } for word, word_ipa in zip(words, ipa[1:])],
+        "ctc_targets": {},
+    }
+    if tokenizer is not None:
+        entry["ctc_targets"][model_name] = ctc_target_ids(tokenizer, " ".join(words))
+    return entry
+
+
+def read_prompt_list(source, default_language=DEFAULT_LANGUAGE):
+    """(id, text, language) for each prompt in a .txt or .jsonl list"""
+    prompts = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                text = item["text"]
+                prompts.append((item.get("id") or prompt_id_for(text), text,
+                                item.get("language", default_language)))
+            elif "\t" in line:
+                prompt_id, text = line.split("\t", 1)
+                prompts.append((prompt_id, text, default_language))
+            else:
+                prompts.append((prompt_id_for(line), line, default_language))
+    return prompts
+
+
+def build_catalogue(source, output_path=DEFAULT_CATALOGUE, language=DEFAULT_LANGUAGE, with_ctc=True):
+    """Add every prompt in source to the catalogue at output_path (existing entries are rebuilt)"""
+    catalogue = {}
+    if os.path.exists(output_path):
+        with open(output_path, "r", encoding="utf-8") as f:
+            catalogue = json.load(f)
+
+    prompts = read_prompt_list(source, language)
+    cmu = load_cmu()
+    tokenizers = {}
+    for i, (prompt_id, text, prompt_language) in enumerate(prompts, 1):
+        model_name = WAV2VEC2_MODELS.get(prompt_language) if with_ctc else None
+        if model_name and model_name not in tokenizers:
+            from transformers import Wav2Vec2CTCTokenizer
+            tokenizers[model_name] = Wav2Vec2CTCTokenizer.from_pretrained(model_name)
+        catalogue[prompt_id] = build_entry(prompt_id, text, prompt_language,
+                                           cmu=cmu if prompt_language == "en" else None,
+                                           tokenizer=tokenizers.get(model_name), model_name=model_name)
+        print(f"[{i}/{len(prompts)}] {prompt_id}: {catalogue[prompt_id]['reference_phonemes']}")
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(catalogue, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output_path)
+    print(f"Wrote {len(catalogue)} prompts to {output_path}")
+    return catalogue
+
+
+class PromptCatalogue:
+    """Read-only view of a built catalogue, loaded once"""
+
+    def __init__(self, path=DEFAULT_CATALOGUE):
+        self.path = path
+        self.prompts = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.prompts = json.load(f)
+            print(f"Loaded {len(self.prompts)} practice prompts from {path}")
+
+    def get(self, prompt_id):
+        return self.prompts.get(prompt_id)
+
+    def __len__(self):
+        return len(self.prompts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the practice-prompt catalogue")
+    parser.add_argument("source", help="Prompt list (.txt, one prompt or 'id<TAB>text' per line, or .jsonl)")
+    parser.add_argument("-o", "--output", default=DEFAULT_CATALOGUE)
+    parser.add_argument("--language", default=DEFAULT_LANGUAGE, help="Language of prompts that don't name one")
+    parser.add_argument("--no-ctc", action="store_true", help="Skip CTC targets (no transformers download)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"Error: {args.source} not found!")
+        sys.exit(1)
+    build_catalogue(args.source, args.output, language=args.language, with_ctc=not args.no_ctc)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g
 from flask_cors import CORS
 import os
+import io
 import json
 import subprocess
 import tempfile
@@ -11,172 +12,743 @@ import torch
 from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
 import librosa
 import numpy as np
+import math
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from functools import partial
+from whisper_cascade import WhisperCascade
+from model_pool import ModelPool, apply_precision
+from silence_trim import trim_silence
+from long_form_whisper import split_points, transcribe_long, get_pool as get_long_form_pool, DEFAULT_WORKERS
+from audio_cache import load_audio as load_cached_audio
+import request_trace
+from wav2vec2_buckets import BucketedWav2Vec2, parse_buckets
+from ctc_timestamps import FRAME_SEC as CTC_FRAME_SEC, ctc_word_timestamps, shift_timestamps, timing_features
+from prompt_catalogue import PromptCatalogue
+from session_store import SessionStore
+from streaming_asr import StreamingSession, StreamRegistry
+from cancellation import (Cancelled, DeadlineExceeded, CancellationRegistry,
+                          DEADLINE_HEADER, REQUEST_ID_HEADER)
 
 app = Flask(__name__)
 CORS(app)
 
-# Global variables for models
-whisper_model = None
-wav2vec2_processor = None
-wav2vec2_model = None
+# Global variables for models (checkpoints themselves live in model_pool)
+whisper_cascade = None
+
+# ---- Cascaded ASR: Whisper tiny first, escalate to the tier's Whisper model on low confidence ----
+WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "base")
+WHISPER_CASCADE = os.environ.get("WHISPER_CASCADE", "0") == "1"
+CASCADE_SMALL_MODEL = os.environ.get("CASCADE_SMALL_MODEL", "tiny")
+
+# ---- Model pool: checkpoints loaded on demand per language and tier, LRU-evicted past the budget ----
+MODEL_POOL_BUDGET_MB = int(os.environ.get("MODEL_POOL_BUDGET_MB", 4096))
+MODEL_PRECISION = os.environ.get("MODEL_PRECISION", "fp32")  # fp32, fp16 (GPU only) or int8
+DEFAULT_LANGUAGE = os.environ.get("DEFAULT_LANGUAGE", "en")
+DEFAULT_TIER = "standard"
+# Whisper is multilingual; wav2vec2 needs a CTC checkpoint per language, espeak a voice
+LANGUAGES = {
+    "en": {"wav2vec2": "facebook/wav2vec2-base-960h", "espeak": "en"},
+    "fr": {"wav2vec2": "jonatasgrosman/wav2vec2-large-xlsr-53-french", "espeak": "fr"},
+    "es": {"wav2vec2": "jonatasgrosman/wav2vec2-large-xlsr-53-spanish", "espeak": "es"},
+    "de": {"wav2vec2": "jonatasgrosman/wav2vec2-large-xlsr-53-german", "espeak": "de"},
+}
+# Whisper size per customer tier
+WHISPER_TIERS = {
+    "standard": WHISPER_MODEL,
+    "premium": os.environ.get("WHISPER_PREMIUM_MODEL", "small"),
+}
+
+# ---- Inference governor config (overridable via environment) ----
+MAX_CONCURRENT_INFERENCES = int(os.environ.get("MAX_CONCURRENT_INFERENCES", 2))
+MAX_QUEUE_DEPTH = int(os.environ.get("MAX_QUEUE_DEPTH", 8))  # Waiting requests before 429
+MAX_QUEUE_WAIT_SEC = float(os.environ.get("MAX_QUEUE_WAIT_SEC", 30))  # Estimated wait before 503
+THREADS_PER_INFERENCE = int(os.environ.get(
+    "THREADS_PER_INFERENCE", max(1, (os.cpu_count() or 1) // MAX_CONCURRENT_INFERENCES)))
+
+# ---- Intra-request parallelism: Whisper and wav2vec2 run side by side ----
+PARALLEL_RECOGNIZERS = os.environ.get("PARALLEL_RECOGNIZERS", "1") == "1"
+WHISPER_THREAD_SHARE = float(os.environ.get("WHISPER_THREAD_SHARE", 0.6))  # Whisper decodes autoregressively, so it gets more
+
+# ---- Practice prompts with precomputed reference artifacts (built by prompt_catalogue.py) ----
+PROMPT_CATALOGUE = os.environ.get("PROMPT_CATALOGUE", "practice_prompts.json")
+
+# ---- Silence trimming before inference ----
+TRIM_SILENCE = os.environ.get("TRIM_SILENCE", "1") == "1"
+DROP_INTERNAL_SILENCE = os.environ.get("DROP_INTERNAL_SILENCE", "1") == "1"  # Shorten long pauses too
+
+# ---- Long-audio windows (cancellation is checked between windows) ----
+# Windows end at the quietest point near each limit, so cuts land in pauses rather than words
+WAV2VEC2_WINDOW_SEC = float(os.environ.get("WAV2VEC2_WINDOW_SEC", 30))
+WHISPER_WINDOW_SEC = float(os.environ.get("WHISPER_WINDOW_SEC", 30))
+WAV2VEC2_CONTEXT_SEC = float(os.environ.get("WAV2VEC2_CONTEXT_SEC", 1.0))  # Overlap decoded on each side of a cut
+# Whisper on arrays longer than this runs piecewise in long_form_whisper's process pool (0 disables)
+LONG_FORM_WHISPER_SEC = float(os.environ.get("LONG_FORM_WHISPER_SEC", 120))
+LONG_FORM_WORKERS = int(os.environ.get("LONG_FORM_WORKERS", DEFAULT_WORKERS))
+
+# ---- Shape-bucketed wav2vec2: off, trace (TorchScript) or compile (torch.compile) ----
+WAV2VEC2_COMPILE = os.environ.get("WAV2VEC2_COMPILE", "off")
+WAV2VEC2_BUCKETS_SEC = parse_buckets(os.environ.get("WAV2VEC2_BUCKETS_SEC", "2,4,8,12,20,30"))
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted; carries the HTTP status and Retry-After"""
+    def __init__(self, status, retry_after, reason):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+class InferenceGovernor:
+    """Caps concurrent inferences, gives each a fixed torch thread budget, and sheds load
+    once the wait queue is too deep or the estimated wait is too long."""
+
+    def __init__(self, max_concurrent, max_queue, max_wait_sec, threads_per_inference):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait_sec = max_wait_sec
+        self.threads_per_inference = threads_per_inference
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.avg_service_sec = 2.0  # EWMA of inference time, seeded with a rough guess
+        self.stats = {"admitted": 0, "completed": 0, "rejected_queue_full": 0,
+                      "rejected_wait": 0, "queue_wait_sec_total": 0.0}
+
+    def estimated_wait(self, position):
+        """Seconds until the request at this queue position would start"""
+        return math.ceil(position / self.max_concurrent) * self.avg_service_sec
+
+    def acquire(self, cancel_token=None):
+        """Wait for an inference slot (or raise Overloaded/Cancelled). Returns the start time for release()"""
+        queued_at = time.time()
+        max_wait = self.max_wait_sec
+        if cancel_token is not None and cancel_token.remaining() is not None:
+            max_wait = max(0.0, min(max_wait, cancel_token.remaining()))
+        with self._cond:
+            if self.active >= self.max_concurrent or self.waiting:
+                if self.waiting >= self.max_queue:
+                    self.stats["rejected_queue_full"] += 1
+                    raise Overloaded(429, math.ceil(self.estimated_wait(self.waiting + 1)),
+                                     "Too many queued requests")
+                estimate = self.estimated_wait(self.waiting + 1)
+                if estimate > self.max_wait_sec:
+                    self.stats["rejected_wait"] += 1
+                    raise Overloaded(503, math.ceil(estimate), "Estimated wait too long")
+                self.waiting += 1
+                if cancel_token is not None:
+                    cancel_token.add_callback(self.wake)  # /cancel or a disconnect ends the wait at once
+                try:
+                    admitted = self._cond.wait_for(
+                        lambda: self.active < self.max_concurrent
+                        or (cancel_token is not None and cancel_token.cancelled),
+                        timeout=max_wait)
+                finally:
+                    self.waiting -= 1
+                    if cancel_token is not None:
+                        cancel_token.remove_callback(self.wake)
+                if cancel_token is not None:
+                    cancel_token.check()  # Gave up or ran out of time while queued
+                if not admitted:
+                    self.stats["rejected_wait"] += 1
+                    raise Overloaded(503, math.ceil(self.avg_service_sec), "Timed out waiting for a worker")
+            self.active += 1
+            self.stats["admitted"] += 1
+            self.stats["queue_wait_sec_total"] += time.time() - queued_at
+        request_trace.add_span("queue_wait", time.time() - queued_at)
+
+        # Per-thread intra-op budget so concurrent requests don't oversubscribe the cores
+        torch.set_num_threads(self.threads_per_inference)
+        return time.time()
+
+    def release(self, started):
+        elapsed = time.time() - started
+        with self._cond:
+            self.avg_service_sec = 0.8 * self.avg_service_sec + 0.2 * elapsed
+            self.active -= 1
+            self.stats["completed"] += 1
+            # All waiters re-check: one woken alone could be cancelled and drop the wakeup
+            self._cond.notify_all()
+
+    def wake(self):
+        """Make queued requests re-check their cancel tokens"""
+        with self._cond:
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, cancel_token=None):
+        started = self.acquire(cancel_token)
+        try:
+            yield
+        finally:
+            self.release(started)
+
+    def snapshot(self):
+        with self._cond:
+            return dict(self.stats, active=self.active, waiting=self.waiting,
+                        avg_service_sec=round(self.avg_service_sec, 3),
+                        max_concurrent=self.max_concurrent, max_queue=self.max_queue,
+                        threads_per_inference=self.threads_per_inference)
+
+governor = InferenceGovernor(MAX_CONCURRENT_INFERENCES, MAX_QUEUE_DEPTH,
+                             MAX_QUEUE_WAIT_SEC, THREADS_PER_INFERENCE)
+recognizer_pool = ThreadPoolExecutor(max_workers=2 * MAX_CONCURRENT_INFERENCES, thread_name_prefix="recognizer")
+
+def overloaded_response(e):
+    """JSON 429/503 response with a Retry-After header"""
+    response = jsonify({"error": e.reason, "retry_after": e.retry_after})
+    response.status_code = e.status
+    response.headers["Retry-After"] = str(max(int(e.retry_after), 1))
+    return response
+
+cancellations = CancellationRegistry()
+
+def request_deadline_sec():
+    """Seconds from X-Request-Deadline-Ms (or deadline_ms), None without one; ValueError if malformed"""
+    deadline_ms = request.headers.get(DEADLINE_HEADER) or request.args.get('deadline_ms')
+    if not deadline_ms:
+        return None
+    try:
+        return float(deadline_ms) / 1000
+    except ValueError:
+        raise ValueError(f"Invalid {DEADLINE_HEADER} '{deadline_ms}' (expected milliseconds)")
+
+def start_request_token(timeout_sec=None):
+    """CancelToken for this request from X-Request-Id and its deadline (see request_deadline_sec)"""
+    return cancellations.start(request.headers.get(REQUEST_ID_HEADER), timeout_sec)
+
+def cancelled_response(e):
+    """504 when the deadline passed, 499 (client closed request) when cancelled"""
+    status = 504 if isinstance(e, DeadlineExceeded) else 499
+    return jsonify({"error": str(e), "reason": e.reason}), status
+
+# ---- Per-request tracing: send X-Trace: 1 (or ?trace=1) to get a timing breakdown ----
+# JSON responses gain a "trace" object (spans per stage, cache/model-pool hits), every traced
+# response a Server-Timing header; /analyze/stream sends the trace as a final "trace" event.
+# TRACE_LOG=<path> also appends each trace to a JSONL file.
+TRACE_HEADER = "X-Trace"
+
+def trace_requested():
+    return (request.headers.get(TRACE_HEADER) or request.args.get('trace') or "0").lower() in ("1", "true", "yes")
+
+@app.before_request
+def begin_trace():
+    if trace_requested():
+        g.trace, g.trace_token = request_trace.begin(request.headers.get(REQUEST_ID_HEADER), request.path)
+
+@app.after_request
+def attach_trace(response):
+    trace = g.get("trace")
+    if trace is None:
+        return response
+    response.headers["Server-Timing"] = trace.server_timing()
+    response.headers["Timing-Allow-Origin"] = "*"
+    if response.is_streamed:
+        return response  # The stream reports (and logs) its own trace when it ends
+    body = response.get_json(silent=True) if response.is_json else None
+    if isinstance(body, dict):
+        body["trace"] = trace.to_dict()
+        response.set_data(json.dumps(body, ensure_ascii=False))
+    trace.write_log()
+    return response
+
+@app.teardown_request
+def end_trace(exc=None):
+    token = g.pop("trace_token", None)
+    if token is not None:
+        request_trace.end(token)
+
+ModelProfile = namedtuple("ModelProfile", "language whisper wav2vec2 espeak precision")
+
+def resolve_profile(params=None):
+    """Models for a request from its optional 'language' and 'tier' parameters"""
+    params = params or {}
+    language = params.get('language') or DEFAULT_LANGUAGE
+    tier = params.get('tier') or DEFAULT_TIER
+    if language not in LANGUAGES:
+        raise ValueError(f"Unsupported language '{language}' (supported: {', '.join(LANGUAGES)})")
+    if tier not in WHISPER_TIERS:
+        raise ValueError(f"Unknown tier '{tier}' (expected one of: {', '.join(WHISPER_TIERS)})")
+    return ModelProfile(language, WHISPER_TIERS[tier], LANGUAGES[language]["wav2vec2"],
+                        LANGUAGES[language]["espeak"], MODEL_PRECISION)
+
+prompt_catalogue = PromptCatalogue(PROMPT_CATALOGUE)
+
+def resolve_request(params):
+    """(profile, prompt) for a request's language/tier and optional prompt_id"""
+    prompt = None
+    prompt_id = params.get('prompt_id')
+    if prompt_id:
+        prompt = prompt_catalogue.get(prompt_id)
+        if prompt is None:
+            raise ValueError(f"Unknown prompt_id '{prompt_id}'")
+    profile = resolve_profile(params)
+    if prompt is not None and prompt["language"] != profile.language:
+        raise ValueError(f"Prompt '{prompt_id}' is in '{prompt['language']}', not '{profile.language}'")
+    return profile, prompt
+
+def load_whisper_checkpoint(name, precision):
+    if precision == "fp16" and not torch.cuda.is_available():
+        raise ValueError("fp16 Whisper needs a GPU; use fp32 or int8 on CPU")
+    return apply_precision(whisper.load_model(name), precision)
+
+bucketed_wav2vec2 = weakref.WeakValueDictionary()  # "name/precision" -> BucketedWav2Vec2 still in the pool
+
+def load_wav2vec2_checkpoint(name, precision):
+    if precision == "fp16" and not torch.cuda.is_available():
+        raise ValueError("fp16 Wav2Vec2 needs a GPU; use fp32 or int8 on CPU")
+    processor = Wav2Vec2Processor.from_pretrained(name)
+    model = apply_precision(Wav2Vec2ForCTC.from_pretrained(name).eval(), precision)
+    if WAV2VEC2_COMPILE != "off":
+        # Traced/compiled once per length bucket here, so requests never pay for it
+        model = BucketedWav2Vec2(model, WAV2VEC2_BUCKETS_SEC, WAV2VEC2_COMPILE).warmup()
+        bucketed_wav2vec2[f"{name}/{precision}"] = model
+    return processor, model
+
+model_pool = ModelPool(MODEL_POOL_BUDGET_MB * 1024 * 1024)
+model_pool.register_loader("whisper", load_whisper_checkpoint)
+model_pool.register_loader("wav2vec2", load_wav2vec2_checkpoint)
+
+def get_pooled(family, name, precision):
+    """model_pool.get, noting in the request trace whether the model was already resident"""
+    if model_pool.is_loaded(family, name, precision):
+        request_trace.event("model_pool", family=family, model=name, hit=True)
+        return model_pool.get(family, name, precision)
+    request_trace.event("model_pool", family=family, model=name, hit=False)
+    with request_trace.span("model_load", model=name):
+        return model_pool.get(family, name, precision)
+
+def get_whisper(profile=None):
+    profile = profile or resolve_profile()
+    return get_pooled("whisper", profile.whisper, profile.precision)
+
+def get_wav2vec2(profile=None):
+    """(processor, model) for the profile's language"""
+    profile = profile or resolve_profile()
+    return get_pooled("wav2vec2", profile.wav2vec2, profile.precision)
 
 def load_models():
-    """Load speech recognition models"""
-    global whisper_model, wav2vec2_processor, wav2vec2_model
-    
-    print("Loading Whisper model...")
-    whisper_model = whisper.load_model("base")
+    """Warm the pool with the default language's models (others load on first use)"""
+    global whisper_cascade
     
-    print("Loading Wav2Vec2 model...")
-    wav2vec2_processor = Wav2Vec2Processor.from_pretrained("facebook/wav2vec2-base-960h")
-    wav2vec2_model = Wav2Vec2ForCTC.from_pretrained("facebook/wav2vec2-base-960h")
+    torch.set_num_threads(THREADS_PER_INFERENCE)
+    profile = resolve_profile()
+    get_whisper(profile)
+    if WHISPER_CASCADE:
+        whisper_cascade = WhisperCascade(
+            lambda: model_pool.get("whisper", CASCADE_SMALL_MODEL, MODEL_PRECISION), get_whisper)
+        whisper_cascade.small_model()
+    get_wav2vec2(profile)
     
     print("All models loaded successfully!")
 
-def transcribe_audio(audio_path):
-    """Transcribe audio using Whisper"""
+def whisper_decode(audio, profile=None, **kwargs):
+    """Whisper transcribe() through the cascade when enabled, else the tier's model"""
+    profile = profile or resolve_profile()
+    kwargs.setdefault("language", profile.language)
+    if whisper_cascade is not None:
+        # Resolved only on escalation, so clear clips never load or touch the large model
+        return whisper_cascade.transcribe(audio, large_model=lambda: get_whisper(profile), **kwargs)
+    return get_whisper(profile).transcribe(audio, **kwargs)
+
+def window_bounds(audio, window_sec):
+    """(start, end) samples of windows of at most window_sec, each cut at the quietest point
+    near its limit (short clips come back whole)"""
+    if len(audio) <= int(window_sec * 16000):
+        return [(0, len(audio))]
+    bounds = split_points(audio, piece_sec=window_sec, search_sec=min(5.0, window_sec / 4))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def whisper_transcribe(audio, cancel_token=None, profile=None):
+    """Whisper transcription; long arrays go window by window so cancellation can stop between them,
+    and very long ones go to the long-form process pool"""
+    if not isinstance(audio, str) and LONG_FORM_WHISPER_SEC and len(audio) > LONG_FORM_WHISPER_SEC * 16000:
+        profile = profile or resolve_profile()
+        with request_trace.span("whisper_long_form", audio_sec=round(len(audio) / 16000, 2)):
+            return transcribe_long(audio, profile.whisper, LONG_FORM_WORKERS, profile.language,
+                                   word_timestamps=False, cancel_token=cancel_token,
+                                   pool=get_long_form_pool(profile.whisper, LONG_FORM_WORKERS))["text"]
+    if isinstance(audio, str) or cancel_token is None:
+        with request_trace.span("whisper"):
+            return whisper_decode(audio, profile)["text"]
+    texts = []
+    for start, end in window_bounds(audio, WHISPER_WINDOW_SEC):
+        window = audio[start:end]
+        cancel_token.check()
+        prompt = " ".join(texts)[-200:] or None
+        with request_trace.span("whisper", audio_sec=round(len(window) / 16000, 2)):
+            texts.append(whisper_decode(window, profile, initial_prompt=prompt)["text"].strip())
+    return " ".join(texts)
+
+def transcribe_audio(audio, cancel_token=None, profile=None):
+    """Transcribe audio (a path or a 16 kHz mono float32 array) using Whisper"""
     try:
-        result = whisper_model.transcribe(audio_path)
-        return result["text"]
+        return whisper_transcribe(audio, cancel_token, profile)
+    except Cancelled:
+        raise
     except Exception as e:
         print(f"Whisper transcription error: {e}")
         return ""
 
-def analyze_speech_with_wav2vec2(audio_path, reference_text):
-    """Analyze speech using Wav2Vec2 and provide feedback"""
+def wav2vec2_recognize(audio, cancel_token=None, profile=None, with_log_probs=False):
+    """Greedy CTC transcription of a 16 kHz mono array with Wav2Vec2, plus word and
+    character start/end times read off the same argmax frames (no extra model pass).
+    with_log_probs also returns the per-frame log-probabilities for scoring known targets."""
+    wav2vec2_processor, wav2vec2_model = get_wav2vec2(profile)
+    predicted = []
+    frame_times = []
+    log_probs = []
+    context = int(WAV2VEC2_CONTEXT_SEC * 16000)
+    for start, end in window_bounds(audio, WAV2VEC2_WINDOW_SEC):
+        if cancel_token is not None:
+            cancel_token.check()
+        # Decode with some audio either side of the cut, then keep only the frames inside it,
+        # so a phone at a window edge is still recognized with its neighbours
+        context_start = max(0, start - context)
+        window = audio[context_start:min(len(audio), end + context)]
+        with request_trace.span("wav2vec2", audio_sec=round(len(window) / 16000, 2)):
+            input_values = wav2vec2_processor(window, return_tensors="pt", sampling_rate=16000).input_values
+            with torch.no_grad():
+                logits = wav2vec2_model(input_values.to(wav2vec2_model.dtype)).logits
+            ids = torch.argmax(logits, dim=-1)[0]
+        times = context_start / 16000 + np.arange(len(ids)) * CTC_FRAME_SEC
+        keep = (times >= start / 16000) & (times < end / 16000)
+        predicted.append(ids[torch.from_numpy(keep)])
+        frame_times.append(times[keep])
+        if with_log_probs:
+            log_probs.append(torch.log_softmax(logits[0].float(), dim=-1)[torch.from_numpy(keep)])
+    with request_trace.span("ctc_decode"):
+        ids = torch.cat(predicted)
+        tokenizer = wav2vec2_processor.tokenizer
+        words = ctc_word_timestamps(ids.numpy(), tokenizer.convert_ids_to_tokens(list(range(len(tokenizer)))),
+                                    tokenizer.pad_token_id, tokenizer.word_delimiter_token,
+                                    skip_ids=set(tokenizer.all_special_ids), frame_times=np.concatenate(frame_times))
+        text = wav2vec2_processor.decode(ids).lower()
+    if with_log_probs:
+        return {"text": text, "words": words, "log_probs": torch.cat(log_probs), "blank_id": tokenizer.pad_token_id}
+    return {"text": text, "words": words}
+
+def ctc_prompt_fit(log_probs, targets, blank_id):
+    """How well the audio fits a prompt's CTC target ids: exp(-CTC loss per target token),
+    so 1.0 is a perfect fit and 0.0 means the prompt cannot be read off the frames"""
+    if not targets or len(log_probs) == 0:
+        return None
+    loss = torch.nn.functional.ctc_loss(log_probs.unsqueeze(1), torch.tensor([targets]),
+                                        torch.tensor([len(log_probs)]), torch.tensor([len(targets)]),
+                                        blank=blank_id, reduction="sum")
+    return round(math.exp(-loss.item() / len(targets)), 3)
+
+def wav2vec2_transcribe(audio, cancel_token=None, profile=None):
+    """Greedy CTC transcription of a 16 kHz mono array with Wav2Vec2"""
+    return wav2vec2_recognize(audio, cancel_token, profile)["text"]
+
+def whisper_transcribe_segment(audio, prompt="", profile=None):
+    """Whisper on one committed streaming segment, conditioned on the text so far"""
+    result = whisper_decode(audio, profile, initial_prompt=prompt or None)
+    return result["text"]
+
+def to_mono_16k(audio, sr):
+    """Convert decoded audio to the mono 16 kHz float32 array both models expect"""
+    audio = np.asarray(audio, dtype=np.float32)
+    if len(audio.shape) > 1:
+        audio = np.mean(audio, axis=1)  # Convert stereo to mono
+    if sr != 16000:
+        with request_trace.span("resample", orig_sr=int(sr)):
+            audio = librosa.resample(audio, orig_sr=sr, target_sr=16000)
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+def load_audio_file(audio_path):
+    """Load an audio file from disk, trying several decoders"""
+    print(f"Loading audio file: {audio_path}")
     try:
-        # Load and preprocess audio with better error handling
-        print(f"Loading audio file: {audio_path}")
-        
-        # Try multiple approaches to load audio
-        audio = None
-        sr = 16000
-        
+        # Decoded once per file contents, then memory-mapped (copied: torch wants writable arrays)
+        with request_trace.span("decode", source="audio_cache"):
+            audio, _, hit = load_cached_audio(audio_path, with_hit=True)
+        request_trace.event("audio_cache", hit=hit)
+        print("Loaded from decoded-audio cache")
+        return np.array(audio)
+    except Exception as e0:
+        print(f"Audio cache failed: {e0}")
+    try:
+        # Then try with soundfile
+        import soundfile as sf
+        audio, sr = sf.read(audio_path)
+        print(f"Successfully loaded with soundfile: {sr}Hz")
+    except Exception as e1:
+        print(f"Soundfile failed: {e1}")
         try:
-            # First try with soundfile
-            import soundfile as sf
-            audio, sr = sf.read(audio_path)
-            print(f"Successfully loaded with soundfile: {sr}Hz")
-        except Exception as e1:
-            print(f"Soundfile failed: {e1}")
-            try:
-                # Fallback to librosa
-                audio, sr = librosa.load(audio_path, sr=16000)
-                print(f"Successfully loaded with librosa: {sr}Hz")
-            except Exception as e2:
-                print(f"Librosa failed: {e2}")
-                try:
-                    # Last resort: try with scipy
-                    from scipy.io import wavfile
-                    sr, audio = wavfile.read(audio_path)
-                    if audio.dtype != np.float32:
-                        audio = audio.astype(np.float32) / np.iinfo(audio.dtype).max
-                    print(f"Successfully loaded with scipy: {sr}Hz")
-                except Exception as e3:
-                    print(f"All audio loading methods failed: {e3}")
-                    return {
-                        "transcription": "",
-                        "reference": reference_text,
-                        "analysis": "Error: Could not load audio file. Please ensure it's a valid audio format (WAV, MP3, etc.)"
-                    }
-        
-        # Ensure audio is mono and correct sample rate
-        if len(audio.shape) > 1:
-            audio = np.mean(audio, axis=1)  # Convert stereo to mono
-        
-        if sr != 16000:
-            # Resample if necessary
-            audio = librosa.resample(audio, orig_sr=sr, target_sr=16000)
-            sr = 16000
-        
-        print(f"Audio loaded successfully: shape={audio.shape}, sr={sr}Hz")
-        
-        # Use the proper Wav2Vec2 analysis from wav2vec2.py
-        print("Getting reference text using Whisper...")
-        reference_text_whisper = whisper_model.transcribe(audio_path)["text"].strip().lower()
-        print(f"Whisper reference text: {reference_text_whisper}")
+            # Fallback to librosa
+            audio, sr = librosa.load(audio_path, sr=16000)
+            print(f"Successfully loaded with librosa: {sr}Hz")
+        except Exception as e2:
+            print(f"Librosa failed: {e2}")
+            # Last resort: try with scipy
+            from scipy.io import wavfile
+            sr, audio = wavfile.read(audio_path)
+            if audio.dtype != np.float32:
+                audio = audio.astype(np.float32) / np.iinfo(audio.dtype).max
+            print(f"Successfully loaded with scipy: {sr}Hz")
+    return to_mono_16k(audio, sr)
 
-        print("Transcribing audio with Wav2Vec2...")
-        input_values = wav2vec2_processor(audio, return_tensors="pt", sampling_rate=16000).input_values
-        with torch.no_grad():
-            logits = wav2vec2_model(input_values).logits
-        predicted_ids = torch.argmax(logits, dim=-1)
-        transcription = wav2vec2_processor.decode(predicted_ids[0]).lower()
-        with open("wav2vec2_words.txt", "w") as f:f.write(transcription)
-        print(f"Wav2Vec2 recognized text: {transcription}")
+def decode_audio_bytes(data):
+    """Decode an uploaded audio buffer in memory, without writing it to disk"""
+    try:
+        import soundfile as sf
+        with request_trace.span("decode", source="soundfile"):
+            audio, sr = sf.read(io.BytesIO(data))
+        print(f"Decoded upload with soundfile: {sr}Hz, {len(data)} bytes")
+        return to_mono_16k(audio, sr)
+    except Exception as e:
+        # Compressed formats soundfile can't read (e.g. WebM/Opus from the browser): pipe through ffmpeg
+        print(f"Soundfile could not decode upload ({e}), piping through ffmpeg")
+    with request_trace.span("decode", source="ffmpeg"):
+        result = subprocess.run(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+             "-f", "f32le", "-ac", "1", "-ar", "16000", "pipe:1"],
+            input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    if result.returncode != 0 or not result.stdout:
+        raise ValueError(f"Could not decode audio upload: {result.stderr.decode(errors='ignore').strip()}")
+    return np.frombuffer(result.stdout, dtype=np.float32).copy()
+
+RAW_AUDIO_TYPES = ("audio/", "application/octet-stream")
+UPLOAD_READ_CHUNK = 64 * 1024
+
+def get_request_audio():
+    """Return (audio, params) from a multipart upload, a raw audio body, or a JSON audio_file path.
+    audio is a decoded 16 kHz array for uploads and a path for legacy path-based calls."""
+    content_type = request.content_type or ""
+    if content_type.startswith("multipart/form-data"):
+        upload = request.files.get("audio")
+        if upload is None:
+            raise ValueError("Missing 'audio' file field")
+        return decode_audio_bytes(upload.read()), request.form
+    if content_type.startswith(RAW_AUDIO_TYPES):
+        # Stream the raw body into memory instead of buffering it through a temp file
+        buffer = io.BytesIO()
+        while True:
+            chunk = request.stream.read(UPLOAD_READ_CHUNK)
+            if not chunk:
+                break
+            buffer.write(chunk)
+        if not buffer.tell():
+            raise ValueError("Empty audio body")
+        return decode_audio_bytes(buffer.getvalue()), request.args
+
+    data = request.get_json(silent=True) or {}
+    audio_file = data.get('audio_file')
+    if not audio_file or not os.path.exists(audio_file):
+        raise FileNotFoundError("Audio file not found")
+    return audio_file, data
+
+trim_lock = threading.Lock()
+trim_totals = {"requests": 0, "original_sec_total": 0.0, "skipped_sec_total": 0.0}
+
+def trim_for_inference(audio):
+    """Trim silence from a decoded array before the models see it.
+    Returns (audio, stats, offset_map); the map translates trimmed times back to the original."""
+    if isinstance(audio, str) or not TRIM_SILENCE:
+        return audio, None, None
+    with request_trace.span("trim"):
+        trimmed, offsets, stats = trim_silence(audio, drop_internal=DROP_INTERNAL_SILENCE)
+    with trim_lock:
+        trim_totals["requests"] += 1
+        trim_totals["original_sec_total"] += stats["original_sec"]
+        trim_totals["skipped_sec_total"] += stats["skipped_sec"]
+    print(f"Silence trimming skipped {stats['skipped_sec']:.2f}s of {stats['original_sec']:.2f}s")
+    return trimmed, dict(stats, offsets=offsets.spans()), offsets
 
-        # Text to phonemes conversion (simplified version of wav2vec2.py)
-        def text_to_phonemes(text):
+def text_to_phonemes_batch(texts, voice="en"):
+    """Convert texts to IPA phonemes with espeak (as in wav2vec2.py), running all espeak processes side by side"""
+    with request_trace.span("phonemize", texts=len(texts)):
+        procs = []
+        for text in texts:
             try:
-                import subprocess
-                cmd = ["espeak", "-q", "--ipa=3", "-ven", text]
-                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                phonemes = result.stdout.strip().replace(" ", "")
-                return phonemes
+                procs.append(subprocess.Popen(["espeak", "-q", "--ipa=3", f"-v{voice}", text],
+                                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True))
             except Exception as e:
                 print(f"Phoneme conversion failed: {e}")
-                return ""
+                procs.append(None)
+        return [proc.communicate()[0].strip().replace(" ", "") if proc else "" for proc in procs]
 
-        print("Converting reference text to phonemes...")
-        ref_phonemes = text_to_phonemes(reference_text_whisper)
-        print(f"Reference phonemes: {ref_phonemes}")
+def run_with_threads(fn, num_threads, *args):
+    """Run fn with its own torch intra-op thread budget (set per worker thread)"""
+    torch.set_num_threads(num_threads)
+    return fn(*args)
 
-        print("Converting recognized text to phonemes...")
-        hyp_phonemes = text_to_phonemes(transcription)
-        print(f"Hypothesis phonemes: {hyp_phonemes}")
+def start_recognizers(audio, cancel_token=None, profile=None):
+    """Start wav2vec2 and Whisper side by side, splitting this request's thread budget.
+    Both spend their time in torch kernels that release the GIL. Returns (wav2vec2_future, whisper_future)."""
+    budget = governor.threads_per_inference
+    whisper_threads = max(1, round(budget * WHISPER_THREAD_SHARE))
+    wav2vec2_threads = max(1, budget - whisper_threads)
+    wav2vec2_future = request_trace.submit_in_context(recognizer_pool, run_with_threads, wav2vec2_recognize,
+                                                      wav2vec2_threads, audio, cancel_token, profile)
+    whisper_future = request_trace.submit_in_context(recognizer_pool, run_with_threads, whisper_transcribe,
+                                                     whisper_threads, audio, cancel_token, profile)
+    return wav2vec2_future, whisper_future
 
-        # Phoneme alignment and feedback (from wav2vec2.py)
-        print("Aligning phonemes and generating feedback...")
+def stop_recognizers(futures, cancel_token=None):
+    """Cancel recognizer futures that are still pending and wait for the running ones to stop"""
+    pending = [future for future in futures if future is not None and not future.done()]
+    if not pending:
+        return
+    if cancel_token is not None:
+        cancel_token.cancel()  # Running recognizers stop at their next window check
+    for future in pending:
+        future.cancel()
+    wait_futures(pending)
+
+def format_analysis(feedback_items, similarity):
+    """Render the feedback items and overall score as the chat-ready analysis text"""
+    feedback_parts = []
+    feedback_parts.append("🎯 Pronunciation Analysis")
+    feedback_parts.append("=" * 30)
+    
+    if not feedback_items:
+        feedback_parts.append("✅ Great job! No mispronunciations detected.")
+    else:
+        feedback_parts.append("⚠️ Mispronunciations detected:")
+        for item in feedback_items:
+            feedback_parts.append(f"• {item['message']}")
+    
+    # Overall assessment
+    if similarity > 0.9:
+        feedback_parts.append("\n🌟 Excellent pronunciation! Keep up the great work.")
+    elif similarity > 0.7:
+        feedback_parts.append("\n👍 Good effort! With practice, you'll improve further.")
+    else:
+        feedback_parts.append("\n💡 Try speaking more slowly and clearly.")
+    
+    return "\n".join(feedback_parts)
+
+def iter_analysis_stages(audio, reference_text, cancel_token=None, profile=None, prompt=None):
+    """Run the analysis step by step, yielding (stage, payload) as soon as each result exists.
+    Stages: transcription, reference, phonemes, feedback (one per error), summary.
+    With a catalogue prompt the reference side comes precomputed and Whisper is skipped.
+    Raises Cancelled between steps once cancel_token is cancelled or past its deadline."""
+    check = cancel_token.check if cancel_token is not None else (lambda: None)
+    profile = profile or resolve_profile()
+    if isinstance(audio, str):
         try:
-            import Levenshtein
-            ops = Levenshtein.editops(ref_phonemes, hyp_phonemes)
-            
-            feedback_parts = []
-            feedback_parts.append("🎯 Pronunciation Analysis")
-            feedback_parts.append("=" * 30)
-            
-            if not ops:
-                feedback_parts.append("✅ Great job! No mispronunciations detected.")
-            else:
-                feedback_parts.append("⚠️ Mispronunciations detected:")
-                for op in ops:
-                    if op[0] == 'replace':
-                        feedback_parts.append(f"• Substitute '{ref_phonemes[op[1]]}' with '{hyp_phonemes[op[2]]}'")
-                    elif op[0] == 'delete':
-                        feedback_parts.append(f"• Missing '{ref_phonemes[op[1]]}'")
-                    elif op[0] == 'insert':
-                        feedback_parts.append(f"• Extra '{hyp_phonemes[op[2]]}'")
-            
-            # Overall assessment
-            similarity = 1 - (len(ops) / max(len(ref_phonemes), 1))
-            if similarity > 0.9:
-                feedback_parts.append("\n🌟 Excellent pronunciation! Keep up the great work.")
-            elif similarity > 0.7:
-                feedback_parts.append("\n👍 Good effort! With practice, you'll improve further.")
+            audio = load_audio_file(audio)
+        except Exception as e:
+            print(f"All audio loading methods failed: {e}")
+            yield "error", {"message": "Error: Could not load audio file. Please ensure it's a valid audio format (WAV, MP3, etc.)"}
+            return
+    print(f"Audio loaded successfully: shape={audio.shape}, sr=16000Hz")
+    audio, trim_stats, offset_map = trim_for_inference(audio)
+
+    wav2vec2_future = whisper_future = None
+    try:
+        check()
+        if prompt is not None:
+            print(f"Using precomputed reference for prompt {prompt['id']}")
+            request_trace.event("prompt_catalogue", prompt_id=prompt["id"], hit=True)
+        elif PARALLEL_RECOGNIZERS:
+            print("Running Wav2Vec2 and Whisper in parallel...")
+            wav2vec2_future, whisper_future = start_recognizers(audio, cancel_token, profile)
+
+        # Wav2Vec2 is the fastest recognizer, so its transcript goes out first
+        print("Transcribing audio with Wav2Vec2...")
+        if wav2vec2_future is not None:
+            recognized = wav2vec2_future.result()
+        else:
+            # With a prompt the frames are also scored against its precomputed CTC targets
+            recognized = wav2vec2_recognize(audio, cancel_token, profile, with_log_probs=prompt is not None)
+        transcription = recognized["text"]
+        words = recognized["words"]
+        if offset_map is not None:
+            words = shift_timestamps(words, offset_map.to_original)
+        timing = timing_features(words)
+        with open("wav2vec2_words.txt", "w") as f:f.write(transcription)
+        print(f"Wav2Vec2 recognized text: {transcription}")
+        yield "transcription", {"transcription": transcription, "words": words, "timing": timing}
+
+        check()
+        if prompt is not None:
+            reference_text_whisper = prompt["text"].strip().lower()
+            # Targets are only comparable in the vocabulary they were built for
+            targets = prompt["ctc_targets"].get(profile.wav2vec2)
+            with request_trace.span("prompt_fit"):
+                prompt_fit = ctc_prompt_fit(recognized["log_probs"], targets, recognized["blank_id"])
+            yield "reference", {"reference": reference_text_whisper, "prompt_id": prompt["id"],
+                                "reference_phonemes": prompt["reference_phonemes"], "prompt_fit": prompt_fit}
+        else:
+            print("Getting reference text using Whisper...")
+            if whisper_future is not None:
+                reference_text_whisper = whisper_future.result().strip().lower()
             else:
-                feedback_parts.append("\n💡 Try speaking more slowly and clearly.")
-            
-            analysis = "\n".join(feedback_parts)
-            
+                reference_text_whisper = whisper_transcribe(audio, cancel_token, profile).strip().lower()
+            print(f"Whisper reference text: {reference_text_whisper}")
+            yield "reference", {"reference": reference_text_whisper}
+
+        check()
+        # Two-level alignment: words first, then phonemes only inside the mismatched word spans
+        try:
+            from word_alignment import align_two_level
         except ImportError:
             # Fallback if Levenshtein is not available
-            analysis = f"Transcription: {transcription}\nReference: {reference_text_whisper}\nKeep practicing!"
-        
-        return {
-            "transcription": transcription,
-            "reference": reference_text_whisper,
-            "analysis": analysis
-        }
+            yield "summary", {"score": None, "error_count": None,
+                              "analysis": f"Transcription: {transcription}\nReference: {reference_text_whisper}\nKeep practicing!"}
+            return
+
+        print("Aligning words, then phonemes of the mismatched words...")
+        ref_word_phonemes = [word["ipa"] for word in prompt["words"]] if prompt is not None else None
+        with request_trace.span("align"):
+            alignment = align_two_level(reference_text_whisper, transcription,
+                                        lambda texts: text_to_phonemes_batch(texts, profile.espeak),
+                                        ref_word_phonemes)
+        print(f"Phonemized {alignment['phonemized_words']} words in {len(alignment['spans'])} mismatched spans")
+        yield "phonemes", {"spans": alignment["spans"], "phonemized_words": alignment["phonemized_words"]}
+
+        check()
+        for item in alignment["errors"]:
+            yield "feedback", item
+
+        similarity = alignment["score"]
+        with request_trace.span("format_feedback"):
+            analysis = format_analysis(alignment["errors"], similarity)
+        yield "summary", {"score": round(similarity, 3), "error_count": len(alignment["errors"]),
+                          "analysis": analysis, "audio": trim_stats,
+                          "duration_sec": round(len(audio) / 16000, 3)}
+    finally:
+        # Leaving early (a failure, Cancelled, or the client going away) must not leave a
+        # recognizer running after the caller gives its inference slot back
+        stop_recognizers((wav2vec2_future, whisper_future), cancel_token)
+
+def merge_stage(result, stage, payload):
+    """Fold one analysis stage into the /analyze result dict"""
+    if stage == "error":
+        result["analysis"] = payload["message"]
+    elif stage in ("transcription", "reference", "phonemes"):
+        result.update(payload)
+    elif stage == "feedback":
+        result["errors"].append(payload)
+    elif stage == "summary":
+        result["analysis"] = payload["analysis"]
+        result["score"] = payload["score"]
+        result["audio"] = payload.get("audio")
+        result["duration_sec"] = payload.get("duration_sec")
+
+def analyze_speech_with_wav2vec2(audio, reference_text, cancel_token=None, profile=None, prompt=None):
+    """Analyze speech (a path or a 16 kHz mono array) using Wav2Vec2 and provide feedback"""
+    result = {"transcription": "", "reference": reference_text, "analysis": "", "errors": []}
+    try:
+        for stage, payload in iter_analysis_stages(audio, reference_text, cancel_token, profile, prompt):
+            merge_stage(result, stage, payload)
+        return result
         
+    except Cancelled:
+        raise
     except Exception as e:
         print(f"Wav2Vec2 analysis error: {e}")
         import traceback
         traceback.print_exc()
-        return {
-            "transcription": "",
-            "reference": reference_text,
-            "analysis": f"Error analyzing speech: {str(e)}"
-        }
+        # Every key /analyze reads, with whatever stages completed before the failure
+        return dict(result, analysis=f"Error analyzing speech: {str(e)}")
 
 def generate_speech_feedback(transcription, reference_text):
     """Generate feedback based on transcription vs reference"""
@@ -212,74 +784,324 @@ def generate_speech_feedback(transcription, reference_text):
     
     return "\n".join(feedback_parts) if feedback_parts else "Thank you for your speech. Keep practicing!"
 
+# ---- Per-session results: /analyze with a session_id records each utterance, /feedback reads them ----
+sessions = SessionStore()
+
+def record_utterance(session_id, result, prompt=None):
+    """Keep a finished analysis in its session (skipped when it never reached a score)"""
+    if not session_id or result.get("score") is None:
+        return
+    sessions.record(session_id, {
+        "reference": result.get("reference", ""),
+        "transcription": result.get("transcription", ""),
+        "score": result["score"],
+        "errors": result.get("errors", []),
+        # Word-timed speech span when available, so pauses around the words don't lower the rate
+        "duration_sec": (result.get("timing") or {}).get("speech_sec") or result.get("duration_sec"),
+        "prompt_id": prompt["id"] if prompt is not None else None,
+    })
+
 @app.route('/transcribe', methods=['POST'])
 def transcribe():
-    """Transcribe audio file"""
+    """Transcribe audio sent as multipart 'audio', a raw audio body, or a JSON audio_file path"""
     try:
-        data = request.get_json()
-        audio_file = data.get('audio_file')
-        
-        if not audio_file or not os.path.exists(audio_file):
-            return jsonify({"error": "Audio file not found"}), 400
+        try:
+            deadline_sec = request_deadline_sec()
+            audio, params = get_request_audio()
+            profile = resolve_profile(params)
+        except (FileNotFoundError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
         
-        transcription = transcribe_audio(audio_file)
+        token = start_request_token(deadline_sec)
+        try:
+            with governor.slot(token):
+                audio, trim_stats, _ = trim_for_inference(audio)
+                transcription = transcribe_audio(audio, token, profile)
+        except Cancelled as e:
+            cancellations.finish(token, e)
+            return cancelled_response(e)
+        finally:
+            cancellations.finish(token)
         
         return jsonify({
             "transcription": transcription,
+            "audio": trim_stats,
             "success": True
         })
     
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         print(f"Transcription error: {e}")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
-    """Analyze speech and provide feedback"""
+    """Analyze speech and provide feedback (same audio inputs as /transcribe)"""
     try:
-        data = request.get_json()
-        audio_file = data.get('audio_file')
-        transcription = data.get('transcription', '')
-        
-        if not audio_file or not os.path.exists(audio_file):
-            return jsonify({"error": "Audio file not found"}), 400
+        try:
+            deadline_sec = request_deadline_sec()
+            audio, params = get_request_audio()
+            profile, prompt = resolve_request(params)
+        except (FileNotFoundError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        transcription = params.get('transcription', '')
         
         # Use transcription as reference text for analysis
         reference_text = transcription if transcription else "Speech recorded"
         
-        analysis_result = analyze_speech_with_wav2vec2(audio_file, reference_text)
+        token = start_request_token(deadline_sec)
+        try:
+            with governor.slot(token):
+                analysis_result = analyze_speech_with_wav2vec2(audio, reference_text, token, profile, prompt)
+        except Cancelled as e:
+            cancellations.finish(token, e)
+            return cancelled_response(e)
+        finally:
+            cancellations.finish(token)
+        record_utterance(params.get('session_id'), analysis_result, prompt)
         
         return jsonify({
             "analysis": analysis_result["analysis"],
             "transcription": analysis_result["transcription"],
+            "reference": analysis_result["reference"],
+            "score": analysis_result.get("score"),
+            "errors": analysis_result["errors"],
+            "words": analysis_result.get("words", []),
+            "timing": analysis_result.get("timing"),
+            "audio": analysis_result.get("audio"),
             "success": True
         })
     
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         print(f"Analysis error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_stream():
+    """Server-sent events variant of /analyze: each stage is sent as soon as it is ready
+    (transcription, reference, phonemes, feedback per error, summary), then done."""
+    try:
+        deadline_sec = request_deadline_sec()
+        audio, params = get_request_audio()
+        profile, prompt = resolve_request(params)
+    except (FileNotFoundError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    transcription = params.get('transcription', '')
+    reference_text = transcription if transcription else "Speech recorded"
+
+    # Admit before streaming starts so overload still gets a proper 429/503
+    token = start_request_token(deadline_sec)
+    try:
+        started = governor.acquire(token)
+    except Overloaded as e:
+        cancellations.finish(token)
+        return overloaded_response(e)
+    except Cancelled as e:
+        cancellations.finish(token, e)
+        return cancelled_response(e)
+    closed = []
+
+    def close_request(error=None):
+        if not closed:
+            closed.append(True)
+            governor.release(started)
+            cancellations.finish(token, error)
+
+    session_id = params.get('session_id')
+    trace = request_trace.current()  # The generator runs after this request context is gone
+
+    def generate():
+        error = None
+        result = {"reference": reference_text, "errors": []}
+        try:
+            with request_trace.activate(trace):
+                for stage, payload in iter_analysis_stages(audio, reference_text, token, profile, prompt):
+                    merge_stage(result, stage, payload)
+                    yield f"event: {stage}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+            record_utterance(session_id, result, prompt)
+        except GeneratorExit:
+            # Client disconnected mid-stream; the remaining stages never run and
+            # a recognizer still running in parallel stops at its next check
+            error = Cancelled("Client disconnected")
+            token.cancel()
+            raise
+        except Cancelled as e:
+            error = e
+            yield f"event: error\ndata: {json.dumps({'message': str(e), 'reason': e.reason})}\n\n"
+        except Exception as e:
+            print(f"Streaming analysis error: {e}")
+            yield f"event: error\ndata: {json.dumps({'message': f'Error analyzing speech: {e}'})}\n\n"
+        finally:
+            close_request(error)
+        if trace is not None:
+            trace.write_log()
+            yield f"event: trace\ndata: {json.dumps(trace.to_dict(), ensure_ascii=False)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Client went away before the generator ran (no-op once the stages have finished)
+    response.call_on_close(lambda: close_request(Cancelled("Client disconnected")))
+    return response
+
+# ---- Streaming transcription (chunked HTTP) ----
+# POST /stream                    -> {"stream_id"}   (JSON or query: sample_rate, format=f32le|s16le)
+# POST /stream/<id>/audio         raw PCM frames, may be sent as a chunked body while recording
+# GET  /stream/<id>               latest committed + partial transcript
+# GET  /stream/<id>/events        server-sent events: partial, segment, final
+# POST /stream/<id>/finish        end of recording -> final transcript
+streams = StreamRegistry()
+
+STREAM_OVERLOAD_GIVE_UP_SEC = 120  # Fail the stream after waiting out overload this long
+
+def run_with_governor(fn, cancel_token):
+    """Run fn in an inference slot, waiting out overload instead of failing the stream.
+    Stops (Cancelled) when the stream is cancelled or expires, and re-raises Overloaded
+    once it has waited STREAM_OVERLOAD_GIVE_UP_SEC."""
+    give_up_at = time.time() + STREAM_OVERLOAD_GIVE_UP_SEC
+    while True:
+        cancel_token.check()
+        try:
+            with governor.slot(cancel_token):
+                return fn()
+        except Overloaded as e:
+            if time.time() + e.retry_after > give_up_at:
+                raise
+            cancel_token.wait(min(max(e.retry_after, 1), 5))
+
+@app.route('/stream', methods=['POST'])
+def stream_start():
+    """Open a streaming transcription session"""
+    try:
+        params = request.get_json(silent=True) or request.args
+        profile = resolve_profile(params)
+        session = StreamingSession(
+            recognize_partial=partial(wav2vec2_transcribe, profile=profile),
+            recognize_segment=partial(whisper_transcribe_segment, profile=profile),
+            run_guarded=run_with_governor,
+            sample_rate=int(params.get('sample_rate', 16000)),
+            sample_format=params.get('format', 'f32le'),
+        )
+        streams.add(session)
+        return jsonify({"stream_id": session.stream_id, "success": True})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/stream/<stream_id>/audio', methods=['POST'])
+def stream_audio(stream_id):
+    """Append audio frames; a chunked body is consumed as it arrives"""
+    session = streams.get(stream_id)
+    if session is None:
+        return jsonify({"error": "Unknown stream"}), 404
+    try:
+        while True:
+            chunk = request.stream.read(UPLOAD_READ_CHUNK)
+            if not chunk:
+                break
+            session.append(chunk)
+        return jsonify(dict(session.snapshot(), success=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/stream/<stream_id>', methods=['GET'])
+def stream_status(stream_id):
+    """Latest partial and committed transcript"""
+    session = streams.get(stream_id)
+    if session is None:
+        return jsonify({"error": "Unknown stream"}), 404
+    return jsonify(session.snapshot())
+
+@app.route('/stream/<stream_id>/events', methods=['GET'])
+def stream_events(stream_id):
+    """Push partial and final transcripts as server-sent events"""
+    session = streams.get(stream_id)
+    if session is None:
+        return jsonify({"error": "Unknown stream"}), 404
+
+    def generate():
+        sent = 0
+        while True:
+            events = session.wait_events(sent)
+            if not events:
+                if streams.get(stream_id) is None:
+                    # Removed without a final or error event reaching us: end the stream
+                    yield f"event: error\ndata: {json.dumps({'type': 'error', 'error': 'Stream closed'})}\n\n"
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            sent += len(events)
+            if events[-1]["type"] in ("final", "error"):
+                return
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/stream/<stream_id>/finish', methods=['POST'])
+def stream_finish(stream_id):
+    """End the recording and return the final transcript"""
+    session = streams.get(stream_id)
+    if session is None:
+        return jsonify({"error": "Unknown stream"}), 404
+    final = session.finish(timeout=120)
+    if final is None:
+        # Do not leave the worker (and its inference slot) running for nobody
+        session.cancel("Timed out finishing stream")
+        streams.remove(stream_id)
+        return jsonify({"error": session.snapshot()["error"]}), 500
+    snapshot = session.snapshot()
+    streams.remove(stream_id)
+    return jsonify({
+        "transcription": final,
+        "seconds": snapshot["seconds_received"],
+        "compute_sec": snapshot["compute_sec"],
+        "success": True
+    })
+
+@app.route('/cancel/<request_id>', methods=['POST'])
+def cancel(request_id):
+    """Cancel an in-flight request by its X-Request-Id"""
+    return jsonify({"cancelled": cancellations.cancel(request_id)})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Governor and cancellation counters"""
+    return jsonify({
+        "governor": governor.snapshot(),
+        "requests": cancellations.snapshot(),
+        "whisper_cascade": whisper_cascade.snapshot() if whisper_cascade is not None else None,
+        "model_pool": model_pool.snapshot(),
+        "wav2vec2_buckets": {key: model.snapshot() for key, model in list(bucketed_wav2vec2.items())},
+        "silence_trim": dict(trim_totals, original_sec_total=round(trim_totals["original_sec_total"], 3),
+                             skipped_sec_total=round(trim_totals["skipped_sec_total"], 3))
+    })
+
 @app.route('/feedback', methods=['POST'])
 def feedback():
-    """Generate detailed feedback based on chat history"""
+    """Detailed feedback from the session's stored analyses (no model runs), else from chat history"""
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         chat_history = data.get('chat_history', [])
-        
-        if not chat_history:
-            return jsonify({"error": "No chat history provided"}), 400
+        session = sessions.summary(data['session_id']) if data.get('session_id') else None
         
         # Extract user messages for analysis
-        user_messages = [msg["text"] for msg in chat_history if msg["sender"] == "User"]
+        user_messages = [msg["text"] for msg in chat_history if msg.get("sender") == "User"]
         
-        if not user_messages:
+        if session is None and not chat_history:
+            return jsonify({"error": "No chat history provided"}), 400
+        if session is None and not user_messages:
             return jsonify({"error": "No user messages found"}), 400
         
         # Generate comprehensive feedback
-        feedback = generate_comprehensive_feedback(user_messages)
+        feedback = generate_comprehensive_feedback(user_messages, session)
         
         return jsonify({
             "feedback": feedback,
+            "session": session,
             "success": True
         })
     
@@ -287,33 +1109,59 @@ def feedback():
         print(f"Feedback error: {e}")
         return jsonify({"error": str(e)}), 500
 
-def generate_comprehensive_feedback(user_messages):
-    """Generate comprehensive feedback based on user messages"""
+@app.route('/session/<session_id>', methods=['GET'])
+def session_summary(session_id):
+    """Rolling aggregates for a practice session"""
+    session = sessions.summary(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown session"}), 404
+    return jsonify(session)
+
+def generate_comprehensive_feedback(user_messages, session=None):
+    """Generate comprehensive feedback from the session aggregates (and the user messages)"""
     feedback_parts = []
     
     feedback_parts.append("📊 Detailed Speech Analysis")
     feedback_parts.append("=" * 40)
     
     # Analyze message patterns
-    total_messages = len(user_messages)
+    total_messages = session["utterances"] if session else len(user_messages)
     total_words = sum(len(msg.split()) for msg in user_messages)
-    avg_words = total_words / max(total_messages, 1)
+    avg_words = total_words / max(len(user_messages), 1)
     
     feedback_parts.append(f"\n📈 Session Statistics:")
     feedback_parts.append(f"• Total speech samples: {total_messages}")
-    feedback_parts.append(f"• Average words per sample: {avg_words:.1f}")
+    if user_messages:
+        feedback_parts.append(f"• Average words per sample: {avg_words:.1f}")
+    if session and session["average_score"] is not None:
+        feedback_parts.append(f"• Average pronunciation score: {session['average_score']:.0%}")
+    if session and session["speaking_rate"] is not None:
+        feedback_parts.append(f"• Speaking rate: {session['speaking_rate']} words/sec")
     
-    # Pronunciation tips
-    feedback_parts.append(f"\n🎯 Pronunciation Tips:")
-    feedback_parts.append("• Practice speaking at a moderate pace")
-    feedback_parts.append("• Focus on clear articulation of each word")
-    feedback_parts.append("• Pay attention to word endings and stress patterns")
-    
-    # Common improvement areas
-    feedback_parts.append(f"\n💡 Areas for Improvement:")
-    feedback_parts.append("• Vowel sounds: Practice long and short vowel distinctions")
-    feedback_parts.append("• Consonant clusters: Work on difficult sound combinations")
-    feedback_parts.append("• Intonation: Vary your pitch to sound more natural")
+    if session and (session["top_phoneme_errors"] or session["top_word_errors"]):
+        feedback_parts.append(f"\n🎯 Sounds To Work On:")
+        for error in session["top_phoneme_errors"][:5]:
+            if not error["spoken"]:
+                feedback_parts.append(f"• '{error['expected']}' dropped ({error['count']}x)")
+            elif not error["expected"]:
+                feedback_parts.append(f"• Extra '{error['spoken']}' added ({error['count']}x)")
+            else:
+                feedback_parts.append(f"• '{error['expected']}' said as '{error['spoken']}' ({error['count']}x)")
+        if session["top_word_errors"]:
+            words = ", ".join(f"'{w['word']}'" for w in session["top_word_errors"][:5])
+            feedback_parts.append(f"• Words with the most errors: {words}")
+    else:
+        # Pronunciation tips
+        feedback_parts.append(f"\n🎯 Pronunciation Tips:")
+        feedback_parts.append("• Practice speaking at a moderate pace")
+        feedback_parts.append("• Focus on clear articulation of each word")
+        feedback_parts.append("• Pay attention to word endings and stress patterns")
+        
+        # Common improvement areas
+        feedback_parts.append(f"\n💡 Areas for Improvement:")
+        feedback_parts.append("• Vowel sounds: Practice long and short vowel distinctions")
+        feedback_parts.append("• Consonant clusters: Work on difficult sound combinations")
+        feedback_parts.append("• Intonation: Vary your pitch to sound more natural")
     
     # Encouragement
     feedback_parts.append(f"\n🌟 Keep Going!")
@@ -327,10 +1175,12 @@ def health():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
-        "models_loaded": whisper_model is not None and wav2vec2_model is not None
+        "models_loaded": (model_pool.is_loaded("whisper", WHISPER_MODEL, MODEL_PRECISION)
+                          and model_pool.is_loaded("wav2vec2", LANGUAGES[DEFAULT_LANGUAGE]["wav2vec2"], MODEL_PRECISION)),
+        "governor": governor.snapshot()
     })
 
 if __name__ == '__main__':
     print("Starting Python Speech Analysis API...")
     load_models()
-    app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000, debug=True, threaded=True) 
\ No newline at end of file
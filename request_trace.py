@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Per-Request Tracing
+Opt-in span timeline for one API request: where its time went (decode, resample,
+queue wait, Whisper, wav2vec2, CTC decode, phonemize, align, feedback
+formatting) plus cache hits along the way. The active trace lives in a context
+variable, so instrumented code calls span()/event() without passing it around;
+both are no-ops when the request is not traced. Worker threads join a trace by
+running in a copy of the request's context (see submit_in_context).
+"""
+
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+TRACE_LOG = os.environ.get("TRACE_LOG")  # JSONL file for every traced request (unset: responses only)
+# =============================================================================
+
+_current = contextvars.ContextVar("request_trace", default=None)
+_log_lock = threading.Lock()
+
+
+class Trace:
+    def __init__(self, request_id=None, endpoint=None):
+        self.request_id = request_id
+        self.endpoint = endpoint
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans = []
+        self.events = []
+
+    def _ms(self, t):
+        return round((t - self._t0) * 1000, 2)
+
+    def add_span(self, name, start, end, **attrs):
+        """Record a span from perf_counter() start/end times"""
+        with self._lock:
+            self.spans.append(dict(name=name, start_ms=self._ms(start), duration_ms=round((end - start) * 1000, 2),
+                                   thread=threading.current_thread().name, **attrs))
+
+    @contextmanager
+    def span(self, name, **attrs):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.perf_counter(), **attrs)
+
+    def event(self, name, **attrs):
+        with self._lock:
+            self.events.append(dict(name=name, at_ms=self._ms(time.perf_counter()), **attrs))
+
+    def totals(self):
+        """Total milliseconds per span name (a stage may run once per window)"""
+        totals = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration_ms"]
+        return totals
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+            events = list(self.events)
+        return {"request_id": self.request_id, "endpoint": self.endpoint,
+                "total_ms": self._ms(time.perf_counter()), "spans": spans, "events": events}
+
+    def server_timing(self):
+        """Server-Timing header value: one metric per stage plus the total so far"""
+        metrics = [f"{re.sub(r'[^A-Za-z0-9_-]', '_', name)};dur={ms:.1f}" for name, ms in self.totals().items()]
+        metrics.append(f"total;dur={self._ms(time.perf_counter()):.1f}")
+        return ", ".join(metrics)
+
+    def write_log(self, path=TRACE_LOG):
+        if not path:
+            return
+        line = json.dumps(dict(self.to_dict(), started_at=self.started_at), ensure_ascii=False)
+        with _log_lock, open(path, "a") as f:
+            f.write(line + "\n")
+
+
+def current():
+    return _current.get()
+
+
+def begin(request_id=None, endpoint=None):
+    """Start tracing the current request; returns (trace, token for end())"""
+    trace = Trace(request_id, endpoint)
+    return trace, _current.set(trace)
+
+
+def end(token):
+    _current.reset(token)
+
+
+@contextmanager
+def activate(trace):
+    """Make trace current (e.g. inside a streaming generator that runs after the view returned)"""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name, **attrs):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(name, **attrs):
+        yield
+
+
+def add_span(name, duration_sec, **attrs):
+    """Record a span that ends now and lasted duration_sec (measured by the caller)"""
+    trace = _current.get()
+    if trace is not None:
+        end_time = time.perf_counter()
+        trace.add_span(name, end_time - duration_sec, end_time, **attrs)
+
+
+def event(name, **attrs):
+    trace = _current.get()
+    if trace is not None:
+        trace.event(name, **attrs)
+
+
+def submit_in_context(executor, fn, *args):
+    """executor.submit that carries the caller's trace into the worker thread"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
@@ -1,14 +1,17 @@
 #!/usr/bin/env python3
 """
 BeyondWords Speech Analysis Pipeline (Wav2Vec2 version)
-Runs wav2vec2.py for all analysis, tracks all subprocesses, and feeds output to Ollama
+Runs the wav2vec2 analysis (via the resident daemon when available) and feeds the result to Ollama
 """
 
-import subprocess
 import sys
 import os
 import time
 from pathlib import Path
+from audio_cache import load_audio, write_wav
+from analysis_daemon import SOCKET_PATH, request_analysis, analyze_in_process
+from ollama_speech_analyzer import OllamaSpeechAnalyzer
+from prompt_builder import format_wav2vec2_output
 
 # =============================================================================
 # CONFIGURATION - Change these settings as needed
@@ -19,12 +22,15 @@ MP3_FILENAME = "text_audio.mp3"
 WAV2VEC2_LOG = "wav2vec2_log.txt"
 WAV2VEC2_OUTPUT = "wav2vec2_transcription.txt"
 OLLAMA_INPUT = "wav2vec2_transcription.txt"
+OLLAMA_OUTPUT = "ollama_analysis.txt"
+ANALYSIS_SOCKET = SOCKET_PATH  # Resident daemon started with: python analysis_daemon.py
 # =============================================================================
 
 class SpeechAnalysisPipeline:
     def __init__(self):
         self.audio_wav_path = os.path.join(AUDIO_DIR, AUDIO_FILENAME)
         self.audio_mp3_path = os.path.join(AUDIO_DIR, MP3_FILENAME)
+        self.analysis = None  # Structured wav2vec2 result handed to the Ollama step
 
     def print_step(self, step_name: str):
         print(f"\n{'='*60}")
@@ -32,77 +38,65 @@ class SpeechAnalysisPipeline:
         print(f"{'='*60}")
 
     def ensure_wav_audio(self):
-        """If only mp3 exists, convert it to wav using ffmpeg."""
-        if os.path.exists(self.audio_wav_path):
-            print(f"Found WAV audio: {self.audio_wav_path}")
-            return True
-        elif os.path.exists(self.audio_mp3_path):
-            print(f"Converting {self.audio_mp3_path} to {self.audio_wav_path}...")
-            try:
-                result = subprocess.run([
-                    "ffmpeg", "-y", "-i", self.audio_mp3_path, self.audio_wav_path
-                ], capture_output=True, text=True, check=True)
+        """Decode the recording once into the audio cache; if only mp3 exists, write the wav from it."""
+        try:
+            if os.path.exists(self.audio_wav_path):
+                print(f"Found WAV audio: {self.audio_wav_path}")
+            elif os.path.exists(self.audio_mp3_path):
+                print(f"Converting {self.audio_mp3_path} to {self.audio_wav_path}...")
+                write_wav(self.audio_mp3_path, self.audio_wav_path)
                 print("✓ Conversion complete.")
-                return True
-            except subprocess.CalledProcessError as e:
-                print(f"✗ Error converting mp3 to wav: {e}")
-                print(e.stdout)
-                print(e.stderr)
+            else:
+                print(f"❌ No audio file found: {self.audio_wav_path} or {self.audio_mp3_path}")
                 return False
-        else:
-            print(f"❌ No audio file found: {self.audio_wav_path} or {self.audio_mp3_path}")
+            # Later stages (and the analysis daemon) memory-map this instead of decoding again
+            audio, sr = load_audio(self.audio_wav_path)
+            print(f"✓ Decoded audio cached ({len(audio) / sr:.2f}s at {sr} Hz)")
+            return True
+        except Exception as e:
+            print(f"✗ Error decoding audio: {e}")
             return False
 
     def run_wav2vec2(self) -> bool:
-        """Run wav2vec2.py, capture all output, and save transcription/feedback"""
+        """Analyze the audio via the resident daemon (or in-process if it isn't running) and save results"""
         if not os.path.exists(self.audio_wav_path):
             print(f"{self.audio_wav_path} not found. Please ensure audio file exists.")
             return False
-        print(f"Running: python wav2vec2.py {self.audio_wav_path}")
-        with open(WAV2VEC2_LOG, "w") as logf:
+        try:
             try:
-                result = subprocess.run([
-                    sys.executable, "wav2vec2.py", self.audio_wav_path
-                ], capture_output=True, text=True, check=True)
-                logf.write(result.stdout)
-                logf.write("\n--- STDERR ---\n")
-                logf.write(result.stderr)
-                print("✓ Wav2Vec2 step completed")
-                # Save the full output to wav2vec2_transcription.txt
-                if result.stdout.strip():
-                    with open(WAV2VEC2_OUTPUT, "w") as outf:
-                        outf.write(result.stdout.strip())
-                return True
-            except subprocess.CalledProcessError as e:
-                logf.write(e.stdout or "")
-                logf.write("\n--- STDERR ---\n")
-                logf.write(e.stderr or "")
-                print(f"✗ Error running wav2vec2.py: {e}")
-                return False
+                print(f"Submitting {self.audio_wav_path} to analysis daemon at {ANALYSIS_SOCKET}")
+                result = request_analysis(self.audio_wav_path, socket_path=ANALYSIS_SOCKET)
+                print("✓ Analysis served by resident daemon")
+            except ConnectionError as e:
+                print(f"{e}; running wav2vec2 in-process instead")
+                result = analyze_in_process(self.audio_wav_path)
+        except Exception as e:
+            with open(WAV2VEC2_LOG, "w") as logf:
+                logf.write(f"Error: {e}\n")
+            print(f"✗ Error running wav2vec2 analysis: {e}")
+            return False
+
+        with open(WAV2VEC2_LOG, "w") as logf:
+            logf.write(result.pop("log", ""))
+        with open(WAV2VEC2_OUTPUT, "w") as outf:
+            outf.write(format_wav2vec2_output(result))
+        self.analysis = result
+        print("✓ Wav2Vec2 step completed")
+        return True
 
     def run_ollama_analysis(self) -> bool:
-        """Run Ollama analysis, feeding in wav2vec2 output as prompt"""
-        if not os.path.exists(OLLAMA_INPUT):
+        """Run Ollama analysis on the structured wav2vec2 result"""
+        if self.analysis is None and not os.path.exists(OLLAMA_INPUT):
             print(f"Missing required file: {OLLAMA_INPUT}")
             return False
-        # Read the transcription/feedback
-        with open(OLLAMA_INPUT, "r") as f:
-            prompt = f.read()
-        print(f"Feeding this to Ollama:\n{prompt}\n{'-'*40}")
-        # Call ollama_speech_analyzer.py with the prompt as an argument
-        try:
-            result = subprocess.run([
-                sys.executable, "ollama_speech_analyzer.py", prompt
-            ], capture_output=True, text=True, check=True)
-            print(result.stdout)
-            if result.stderr.strip():
-                print("--- STDERR ---\n" + result.stderr)
-            return True
-        except subprocess.CalledProcessError as e:
-            print(f"✗ Error running Ollama analysis: {e}")
-            print(e.stdout)
-            print(e.stderr)
-            return False
+        analyzer = OllamaSpeechAnalyzer()
+        analysis = analyzer.run_analysis(analysis=self.analysis)
+        with open(OLLAMA_OUTPUT, "w") as f:
+            f.write(analysis)
+        print(f"Analysis saved to: {OLLAMA_OUTPUT}")
+        # Speech plays in the background while the file is written; let it finish before exiting
+        analyzer.wait_for_speech()
+        return not analysis.startswith("Error:")
 
     def run_pipeline(self):
         print("\U0001F3A4 BEYONDWORDS SPEECH ANALYSIS PIPELINE (Wav2Vec2)")
@@ -132,7 +126,7 @@ class SpeechAnalysisPipeline:
         print(f"\n{'='*60}")
         print("\U0001F389 PIPELINE COMPLETE!")
         print(f"{'='*60}")
-        print(f"Check {WAV2VEC2_LOG} and ollama_analysis.txt for results.")
+        print(f"Check {WAV2VEC2_LOG} and {OLLAMA_OUTPUT} for results.")
 
 def main():
     pipeline = SpeechAnalysisPipeline()
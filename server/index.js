@@ -11,21 +11,16 @@ const multer = require('multer');
 const path = require('path');
 const fs = require('fs').promises;
 const { exec } = require('child_process');
+const crypto = require('crypto');
 
 const app = express();
 app.use(express.json());
 app.use(cors({ origin: 'http://localhost:3000', credentials: true }));
 
 // Multer configuration for file uploads
-const storage = multer.diskStorage({
-  destination: function (req, file, cb) {
-    cb(null, 'uploads/');
-  },
-  filename: function (req, file, cb) {
-    const uniqueSuffix = Date.now() + '-' + Math.round(Math.random() * 1E9);
-    cb(null, file.fieldname + '-' + uniqueSuffix + '.wav');
-  }
-});
+// Uploads stay in memory and are forwarded to the Python API as raw bytes,
+// so the two services don't need a shared filesystem.
+const storage = multer.memoryStorage();
 
 const upload = multer({ 
   storage: storage,
@@ -41,6 +36,36 @@ const upload = multer({
   }
 });
 
+// Call the Python API with a deadline matching our timeout. If the browser goes away
+// (or we give up waiting) the in-flight analysis is cancelled so it stops using CPU.
+async function callPythonApi(res, endpoint, body, options) {
+  const pythonApiUrl = process.env.PYTHON_API_URL || 'http://localhost:5000';
+  const requestId = crypto.randomUUID();
+  const cancel = () => axios.post(`${pythonApiUrl}/cancel/${requestId}`, null, { timeout: 2000 }).catch(() => {});
+  const onClose = () => {
+    if (!res.writableEnded) {
+      console.log(`Client disconnected, cancelling Python request ${requestId}`);
+      cancel();
+    }
+  };
+  res.on('close', onClose);
+  try {
+    return await axios.post(`${pythonApiUrl}${endpoint}`, body, {
+      ...options,
+      headers: {
+        ...(options.headers || {}),
+        'X-Request-Id': requestId,
+        'X-Request-Deadline-Ms': String(options.timeout)
+      }
+    });
+  } catch (error) {
+    if (error.code === 'ECONNABORTED') cancel();
+    throw error;
+  } finally {
+    res.off('close', onClose);
+  }
+}
+
 // Ensure uploads directory exists
 const uploadsDir = path.join(__dirname, 'uploads');
 fs.mkdir(uploadsDir, { recursive: true }).catch(console.error);
@@ -166,25 +191,27 @@ app.post('/api/analyze', upload.single('audio'), async (req, res) => {
       return res.status(400).json({ error: 'No audio file provided' });
     }
 
-    // Use absolute path for audio file
-    const audioFilePath = path.resolve(req.file.path);
-    console.log('Received audio file:', audioFilePath);
+    const audioBuffer = req.file.buffer;
+    const audioContentType = req.file.mimetype || 'application/octet-stream';
+    console.log(`Received audio upload: ${audioBuffer.length} bytes (${audioContentType})`);
 
-    // Call Python API for transcription only
+    // Analyze once per utterance; the Python API keeps the results under the session id,
+    // so detailed feedback later never re-runs the models on this audio
     const pythonApiUrl = process.env.PYTHON_API_URL || 'http://localhost:5000';
+    const sessionId = req.body.sessionId || crypto.randomUUID();
     
-    // Get transcription from Python API
-    console.log('Sending transcription request to Python API:', `${pythonApiUrl}/transcribe`);
+    // Get transcription (Whisper) and analysis from Python API
+    console.log('Sending analysis request to Python API:', `${pythonApiUrl}/analyze`);
     let transcription = 'Speech recorded';
     try {
-      const transcriptionResponse = await axios.post(`${pythonApiUrl}/transcribe`, {
-        audio_file: audioFilePath
-      }, {
-        headers: { 'Content-Type': 'application/json' },
-        timeout: 30000
+      const analysisResponse = await callPythonApi(res, '/analyze', audioBuffer, {
+        params: { session_id: sessionId },
+        headers: { 'Content-Type': audioContentType },
+        maxBodyLength: Infinity,
+        timeout: 45000
       });
-      console.log('Transcription response:', transcriptionResponse.data);
-      transcription = transcriptionResponse.data.transcription || 'Speech recorded';
+      console.log('Analysis response:', analysisResponse.data);
+      transcription = analysisResponse.data.reference || analysisResponse.data.transcription || 'Speech recorded';
     } catch (transcriptionError) {
       console.error('Transcription error:', transcriptionError.message);
       // Continue with default transcription
@@ -202,7 +229,7 @@ app.post('/api/analyze', upload.single('audio'), async (req, res) => {
     global.lastChatHistory = chatHistory; // Optionally store for session continuity
 
     // Ollama health check before generating response
-    const ollamaUrl = 'http://localhost:11434';
+    const ollamaUrl = process.env.OLLAMA_URL || 'http://localhost:11434';
     let ollamaReady = false;
     for (let attempt = 1; attempt <= 5; attempt++) {
       try {
@@ -223,7 +250,7 @@ app.post('/api/analyze', upload.single('audio'), async (req, res) => {
         transcription: transcription,
         aiResponse: 'Thank you for your speech! Keep practicing and you\'ll improve.',
         ttsUrl: null,
-        sessionId: null
+        sessionId: sessionId
       });
     }
 
@@ -279,8 +306,7 @@ app.post('/api/analyze', upload.single('audio'), async (req, res) => {
       ttsUrl = null;
     }
 
-    // Store the audio file path and chat history globally for detailed feedback later
-    global.lastAudioFile = audioFilePath;
+    // Store the chat history globally for session continuity
     global.lastTranscription = transcription;
     global.lastChatHistory = chatHistory;
 
@@ -288,7 +314,7 @@ app.post('/api/analyze', upload.single('audio'), async (req, res) => {
       transcription: transcription,
       aiResponse: aiResponse,
       ttsUrl: ttsUrl,
-      sessionId: null
+      sessionId: sessionId
     });
 
   } catch (error) {
@@ -310,7 +336,7 @@ app.post('/api/analyze', upload.single('audio'), async (req, res) => {
 app.post('/api/feedback', async (req, res) => {
   try {
     console.log('POST /api/feedback called');
-    const { chatHistory } = req.body;
+    const { chatHistory, sessionId } = req.body;
     
     if (!chatHistory || chatHistory.length === 0) {
       console.error('No chat history provided');
@@ -328,35 +354,25 @@ app.post('/api/feedback', async (req, res) => {
     // Get the most recent transcription
     const lastTranscription = lastUserMessage.text;
     
-    // Call Python API for detailed analysis of the most recent recording
+    // Session analysis from the Python API's result store (answered without re-running the models)
     let pythonAnalysis = '';
     try {
-      const pythonApiUrl = process.env.PYTHON_API_URL || 'http://localhost:5000';
-      console.log('Requesting detailed analysis from Python API for most recent recording...');
-      
-      // Get the last audio file path from global variable
-      const lastAudioFile = global.lastAudioFile;
-      if (!lastAudioFile) {
-        console.log('No audio file found for detailed analysis');
-      } else {
-        console.log('Using audio file for detailed analysis:', lastAudioFile);
-        const analysisResponse = await axios.post(`${pythonApiUrl}/analyze`, {
-          audio_file: lastAudioFile,
-          transcription: lastTranscription
-        }, {
-          headers: { 'Content-Type': 'application/json' },
-          timeout: 60000
-        });
-        pythonAnalysis = analysisResponse.data.analysis || '';
-        console.log('Python analysis received:', pythonAnalysis);
-      }
+      console.log(`Requesting session analysis from Python API (session ${sessionId || 'none'})...`);
+      const analysisResponse = await callPythonApi(res, '/feedback', {
+        session_id: sessionId,
+        chat_history: chatHistory
+      }, {
+        timeout: 10000
+      });
+      pythonAnalysis = analysisResponse.data.feedback || '';
+      console.log('Python analysis received:', pythonAnalysis);
     } catch (pythonError) {
       console.log('Python API not available for detailed analysis:', pythonError.message);
     }
 
     // Use Ollama Slow for detailed feedback
     console.log('Generating detailed feedback with Ollama Slow...');
-    const ollamaResponse = await axios.post('http://localhost:11434/api/generate', {
+    const ollamaResponse = await axios.post(`${process.env.OLLAMA_URL || 'http://localhost:11434'}/api/generate`, {
       model: 'llama3.2',
       prompt: `You are an expert speech coach providing detailed analysis and feedback.
 
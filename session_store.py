@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Session Result Store
+Keeps each analyzed utterance's structured results per practice session and
+maintains rolling aggregates (per-phoneme and per-word error counts, average
+score, speaking rate), so detailed feedback is answered from memory instead of
+re-running the models on audio that was already analyzed.
+"""
+
+import threading
+import time
+from collections import Counter, deque
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+MAX_UTTERANCES = 50  # Utterances kept in full per session (aggregates cover all of them)
+MAX_SESSIONS = 1000
+SESSION_IDLE_TIMEOUT_SEC = 2 * 60 * 60
+TOP_N = 10
+PHONE_ERROR_TYPES = ("substitute", "missing", "extra")
+# =============================================================================
+
+
+class SessionResults:
+    """Utterances and rolling aggregates for one session. Callers hold the store lock."""
+
+    def __init__(self, session_id, max_utterances=MAX_UTTERANCES):
+        self.session_id = session_id
+        self.utterances = deque(maxlen=max_utterances)
+        self.utterance_count = 0
+        self.words_total = 0
+        self.speech_sec_total = 0.0
+        self.score_sum = 0.0
+        self.score_count = 0
+        self.phoneme_errors = Counter()  # (expected, spoken) -> count
+        self.word_errors = Counter()
+        self.error_types = Counter()
+        self.last_active = time.time()
+
+    def add(self, utterance):
+        self.utterances.append(utterance)
+        self.utterance_count += 1
+        duration = utterance.get("duration_sec")
+        if duration:
+            # Speaking rate only counts utterances whose speech time is known
+            self.words_total += len(utterance.get("reference", "").split())
+            self.speech_sec_total += duration
+        if utterance.get("score") is not None:
+            self.score_sum += utterance["score"]
+            self.score_count += 1
+        for error in utterance.get("errors", []):
+            self.error_types[error["type"]] += 1
+            if error["type"] in PHONE_ERROR_TYPES:
+                self.phoneme_errors[(error["expected"], error["spoken"])] += 1
+            if error["type"] != "extra_word" and error.get("word"):
+                self.word_errors[error["word"]] += 1
+        self.last_active = time.time()
+
+    def summary(self, top_n=TOP_N):
+        return {
+            "session_id": self.session_id,
+            "utterances": self.utterance_count,
+            "average_score": round(self.score_sum / self.score_count, 3) if self.score_count else None,
+            "speaking_rate": round(self.words_total / self.speech_sec_total, 2) if self.speech_sec_total else None,
+            "error_types": dict(self.error_types),
+            "top_phoneme_errors": [{"expected": e, "spoken": s, "count": n}
+                                   for (e, s), n in self.phoneme_errors.most_common(top_n)],
+            "top_word_errors": [{"word": w, "count": n} for w, n in self.word_errors.most_common(top_n)],
+            "recent": [{"reference": u.get("reference", ""), "transcription": u.get("transcription", ""),
+                        "score": u.get("score")} for u in list(self.utterances)[-5:]],
+        }
+
+
+class SessionStore:
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_timeout=SESSION_IDLE_TIMEOUT_SEC,
+                 max_utterances=MAX_UTTERANCES):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_utterances = max_utterances
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def record(self, session_id, utterance):
+        """Add one analyzed utterance to its session and return the updated summary"""
+        utterance = dict(utterance, recorded_at=time.time())
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                self._expire()
+                session = self._sessions[session_id] = SessionResults(session_id, self.max_utterances)
+            session.add(utterance)
+            return session.summary()
+
+    def summary(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session.summary() if session is not None else None
+
+    def _expire(self):
+        # Caller holds self._lock
+        now = time.time()
+        for session_id in [sid for sid, s in self._sessions.items() if now - s.last_active > self.idle_timeout]:
+            del self._sessions[session_id]
+        while len(self._sessions) >= self.max_sessions:
+            oldest = min(self._sessions.values(), key=lambda s: s.last_active)
+            del self._sessions[oldest.session_id]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
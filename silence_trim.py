@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Silence Trimming Before Inference
+A vectorized frame-energy pass that finds speech, trims lead-in and trailing
+silence and (optionally) shortens long internal pauses, so Whisper and wav2vec2
+only see audio worth decoding. An OffsetMap translates times in the trimmed
+audio back to the original recording.
+"""
+
+import numpy as np
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+SAMPLE_RATE = 16000
+FRAME_SEC = 0.02  # Energy frame size
+RELATIVE_THRESHOLD_DB = 35.0  # Frames this far below the loudest frame count as silence
+ABSOLUTE_FLOOR_DB = -60.0  # Frames below this level (dBFS) are always silence
+PAD_SEC = 0.2  # Speech regions are widened by this much on each side
+MAX_PAUSE_SEC = 1.0  # Internal pauses longer than this are shortened...
+KEEP_PAUSE_SEC = 0.3  # ...to this, so neighbouring words stay separated
+# =============================================================================
+
+
+class OffsetMap:
+    """Kept spans as (trimmed_start, original_start) sample pairs; each span runs
+    until the next one starts in the trimmed audio."""
+
+    def __init__(self, trimmed_starts, original_starts, sr=SAMPLE_RATE):
+        self.trimmed_starts = np.asarray(trimmed_starts, dtype=np.int64)
+        self.original_starts = np.asarray(original_starts, dtype=np.int64)
+        self.sr = sr
+
+    def to_original(self, seconds):
+        """Map a time (or array of times) in the trimmed audio to the original audio"""
+        samples = np.asarray(seconds, dtype=np.float64) * self.sr
+        span = np.clip(np.searchsorted(self.trimmed_starts, samples, side="right") - 1, 0, None)
+        original = self.original_starts[span] + (samples - self.trimmed_starts[span])
+        return original / self.sr if original.ndim else float(original / self.sr)
+
+    def spans(self):
+        return [{"trimmed_sec": round(float(t) / self.sr, 3), "original_sec": round(float(o) / self.sr, 3)}
+                for t, o in zip(self.trimmed_starts, self.original_starts)]
+
+
+def frame_energy_db(audio, frame_sec=FRAME_SEC, sr=SAMPLE_RATE):
+    """RMS level of each frame in dBFS"""
+    frame = int(frame_sec * sr)
+    n_frames = len(audio) // frame
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.square(frames, dtype=np.float64).mean(axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def speech_mask(energy_db, pad_frames, relative_db=RELATIVE_THRESHOLD_DB, floor_db=ABSOLUTE_FLOOR_DB):
+    """Boolean speech flag per frame, widened by pad_frames on each side"""
+    if not len(energy_db):
+        return np.zeros(0, dtype=bool)
+    threshold = max(energy_db.max() - relative_db, floor_db)
+    mask = energy_db > threshold
+    if pad_frames:
+        mask = np.convolve(mask, np.ones(2 * pad_frames + 1), mode="same") > 0
+    return mask
+
+
+def trim_silence(audio, sr=SAMPLE_RATE, drop_internal=True, frame_sec=FRAME_SEC, pad_sec=PAD_SEC,
+                 max_pause_sec=MAX_PAUSE_SEC, keep_pause_sec=KEEP_PAUSE_SEC):
+    """Return (trimmed_audio, offset_map, stats). Audio without any detected speech
+    is returned unchanged so the recognizers still get a chance at it."""
+    audio = np.asarray(audio, dtype=np.float32)
+    frame = int(frame_sec * sr)
+    original_sec = len(audio) / sr
+    mask = speech_mask(frame_energy_db(audio, frame_sec, sr), int(round(pad_sec / frame_sec)))
+
+    if not mask.any():
+        stats = {"original_sec": round(original_sec, 3), "processed_sec": round(original_sec, 3),
+                 "skipped_sec": 0.0}
+        return audio, OffsetMap([0], [0], sr), stats
+
+    # Start/end frame of each speech run
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1) * frame
+    ends = np.minimum(np.flatnonzero(edges == -1) * frame, len(audio))
+    if ends[-1] == len(mask) * frame:
+        ends[-1] = len(audio)  # Keep the partial frame at the end when speech runs into it
+
+    if drop_internal and len(starts) > 1:
+        # Shorten long gaps to keep_pause, split evenly around the cut
+        max_pause, keep_half = int(max_pause_sec * sr), int(keep_pause_sec * sr) // 2
+        gaps = starts[1:] - ends[:-1]
+        long_gap = gaps > max_pause
+        ends[:-1] = np.where(long_gap, ends[:-1] + keep_half, ends[:-1])
+        starts[1:] = np.where(long_gap, starts[1:] - keep_half, starts[1:])
+        # Short gaps stay in: merge their neighbouring spans
+        keep = np.concatenate([[True], long_gap])
+        merged_starts = starts[keep]
+        merged_ends = ends[np.concatenate([long_gap, [True]])]
+        starts, ends = merged_starts, merged_ends
+    else:
+        starts, ends = starts[:1], ends[-1:]
+
+    lengths = ends - starts
+    trimmed_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    trimmed = np.concatenate([audio[s:e] for s, e in zip(starts, ends)])
+    processed_sec = len(trimmed) / sr
+    stats = {"original_sec": round(original_sec, 3), "processed_sec": round(processed_sec, 3),
+             "skipped_sec": round(original_sec - processed_sec, 3)}
+    return trimmed, OffsetMap(trimmed_starts, starts, sr), stats
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Streaming Speech Recognition
+Incremental recognition on a rolling buffer while the user is still speaking.
+Frames are appended as they arrive; a background worker re-decodes the
+uncommitted tail with the fast CTC model for partial transcripts, and commits
+segments at low-energy points to Whisper once the tail gets long. When the
+recording stops only the last segment is left to transcribe.
+"""
+
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from cancellation import CancelToken, Cancelled
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+SAMPLE_RATE = 16000
+PARTIAL_STEP_SEC = 0.5  # New audio needed before the partial transcript is refreshed
+COMMIT_WINDOW_SEC = 8.0  # Tail length that triggers committing a segment to Whisper
+COMMIT_SEARCH_SEC = 2.0  # Look this far back from the window end for a quiet cut point
+FRAME_SEC = 0.02  # Energy frame size used to find the cut point
+SESSION_IDLE_TIMEOUT_SEC = 300  # Streams with no activity are dropped after this
+# =============================================================================
+
+
+def pcm_to_float32(data, sample_format="f32le"):
+    """Convert raw little-endian PCM frames to float32 samples"""
+    if sample_format == "s16le":
+        return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+    if sample_format == "f32le":
+        return np.frombuffer(data, dtype="<f4").astype(np.float32)
+    raise ValueError(f"Unsupported sample format: {sample_format}")
+
+
+def quiet_cut_point(audio, search_sec=COMMIT_SEARCH_SEC, frame_sec=FRAME_SEC, sr=SAMPLE_RATE):
+    """Sample index of the lowest-energy frame within the last search_sec of audio"""
+    frame = int(frame_sec * sr)
+    start = max(0, len(audio) - int(search_sec * sr))
+    region = audio[start:]
+    n_frames = len(region) // frame
+    if n_frames == 0:
+        return len(audio)
+    energy = np.square(region[:n_frames * frame].reshape(n_frames, frame)).mean(axis=1)
+    return start + int(np.argmin(energy)) * frame + frame // 2
+
+
+class StreamingSession:
+    """One live recording. recognize_partial(audio) -> text is the cheap CTC pass;
+    recognize_segment(audio, prompt) -> text is Whisper on a committed segment.
+    run_guarded(fn, cancel_token) runs fn under the caller's admission control and
+    should give up (raise Cancelled) once the token is cancelled."""
+
+    def __init__(self, recognize_partial, recognize_segment, run_guarded=None,
+                 sample_rate=SAMPLE_RATE, sample_format="f32le"):
+        self.stream_id = uuid.uuid4().hex
+        self.sample_rate = sample_rate
+        self.sample_format = sample_format
+        self.recognize_partial = recognize_partial
+        self.recognize_segment = recognize_segment
+        self.run_guarded = run_guarded or (lambda fn, cancel_token: fn())
+        self.cancel_token = CancelToken()  # Cancelled with the session, so waits for a slot end too
+
+        self._cond = threading.Condition()
+        self._chunks = []
+        self._leftover = b""
+        self._audio = np.zeros(0, dtype=np.float32)
+        self._received = 0  # Samples appended so far
+        self._committed = 0  # Samples already transcribed by Whisper
+        self._decoded_upto = 0  # Samples covered by the latest partial
+        self._finished = False
+        self._cancelled = False
+        self.segments = []  # Whisper text per committed segment
+        self.partial = ""
+        self.final = None
+        self.error = None
+        self.events = []
+        self.last_active = time.time()
+        self.compute_sec = 0.0
+
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    # ---- Producer side ----
+    def append(self, data):
+        """Add raw PCM bytes (in the session's sample format) to the buffer"""
+        width = 2 if self.sample_format == "s16le" else 4
+        with self._cond:
+            if self._finished:
+                raise ValueError("Stream already finished")
+            # Chunked bodies can split a sample across reads; keep the odd bytes for next time
+            data = self._leftover + data
+            usable = len(data) - len(data) % width
+            self._leftover = data[usable:]
+            samples = pcm_to_float32(data[:usable], self.sample_format)
+            if self.sample_rate != SAMPLE_RATE and len(samples):
+                import librosa
+                samples = librosa.resample(samples, orig_sr=self.sample_rate, target_sr=SAMPLE_RATE)
+            self._chunks.append(samples)
+            self._received += len(samples)
+            self.last_active = time.time()
+            self._cond.notify_all()
+
+    def finish(self, timeout=None):
+        """Mark the end of the recording and wait for the final transcript"""
+        with self._cond:
+            self._finished = True
+            self.last_active = time.time()
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: self.final is not None or self.error is not None, timeout=timeout)
+        return self.final
+
+    def cancel(self, reason="Stream cancelled"):
+        """Stop the worker without producing a final transcript; event listeners get an error"""
+        with self._cond:
+            self._cancelled = True
+            if self.final is None and self.error is None:
+                self.error = reason
+                self._emit("error", error=reason)
+            self._cond.notify_all()
+        self.cancel_token.cancel()
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "stream_id": self.stream_id,
+                "committed": " ".join(self.segments),
+                "partial": self.partial,
+                "final": self.final,
+                "seconds_received": round(self._received / SAMPLE_RATE, 2),
+                "seconds_committed": round(self._committed / SAMPLE_RATE, 2),
+                "compute_sec": round(self.compute_sec, 3),
+                "error": self.error,
+            }
+
+    def wait_events(self, after, timeout=15.0):
+        """Return events with index >= after, blocking until there is one or timeout"""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.events) > after or self.final is not None
+                                or self.error is not None or self._cancelled, timeout=timeout)
+            return self.events[after:]
+
+    # ---- Worker side ----
+    def _emit(self, kind, **payload):
+        # Caller holds self._cond
+        payload["type"] = kind
+        self.events.append(payload)
+        self._cond.notify_all()
+
+    def _take_audio(self):
+        with self._cond:
+            if self._chunks:
+                self._audio = np.concatenate([self._audio] + self._chunks)
+                self._chunks = []
+            return self._audio, self._committed, self._finished
+
+    def _timed(self, fn):
+        started = time.time()
+        try:
+            return self.run_guarded(fn, self.cancel_token)
+        finally:
+            self.compute_sec += time.time() - started
+
+    def _run(self):
+        step = int(PARTIAL_STEP_SEC * SAMPLE_RATE)
+        window = int(COMMIT_WINDOW_SEC * SAMPLE_RATE)
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._finished or self._cancelled
+                                        or self._received - self._decoded_upto >= step)
+                    if self._cancelled:
+                        return
+                audio, committed, finished = self._take_audio()
+                tail = audio[committed:]
+
+                if finished:
+                    break
+
+                # Commit a segment to Whisper once the uncommitted tail is long enough
+                if len(tail) >= window:
+                    cut = quiet_cut_point(tail[:window])
+                    prompt = " ".join(self.segments)[-200:]
+                    text = self._timed(lambda: self.recognize_segment(tail[:cut], prompt)).strip()
+                    with self._cond:
+                        if text:
+                            self.segments.append(text)
+                        self._committed = committed + cut
+                        self._emit("segment", text=text, committed=" ".join(self.segments),
+                                   end_sec=round(self._committed / SAMPLE_RATE, 2))
+                    tail = audio[committed + cut:]
+
+                partial = self._timed(lambda: self.recognize_partial(tail)) if len(tail) else ""
+                with self._cond:
+                    self._decoded_upto = len(audio)
+                    self.partial = partial
+                    self._emit("partial", committed=" ".join(self.segments), partial=partial,
+                               seconds=round(len(audio) / SAMPLE_RATE, 2))
+
+            # Recording stopped: only the last uncommitted segment is left
+            if len(tail):
+                prompt = " ".join(self.segments)[-200:]
+                text = self._timed(lambda: self.recognize_segment(tail, prompt)).strip()
+                if text:
+                    with self._cond:
+                        self.segments.append(text)
+            with self._cond:
+                self.final = " ".join(self.segments)
+                self.partial = ""
+                self._committed = len(audio)
+                self._emit("final", text=self.final, seconds=round(len(audio) / SAMPLE_RATE, 2),
+                           compute_sec=round(self.compute_sec, 3))
+        except Cancelled:
+            return  # Dropped (idle or closed): cancel() already told any listeners
+        except Exception as e:
+            with self._cond:
+                if self.error is None:
+                    self.error = str(e)
+                    self._emit("error", error=str(e))
+
+
+class StreamRegistry:
+    """Live streaming sessions by id, with idle expiry"""
+
+    def __init__(self, idle_timeout=SESSION_IDLE_TIMEOUT_SEC):
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def add(self, session):
+        with self._lock:
+            self._expire()
+            self._sessions[session.stream_id] = session
+        return session
+
+    def get(self, stream_id):
+        with self._lock:
+            self._expire()
+            return self._sessions.get(stream_id)
+
+    def remove(self, stream_id):
+        with self._lock:
+            return self._sessions.pop(stream_id, None)
+
+    def _expire(self):
+        now = time.time()
+        for stream_id in [sid for sid, s in self._sessions.items() if now - s.last_active > self.idle_timeout]:
+            self._sessions.pop(stream_id).cancel("Stream expired after being idle")
@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from whisper_cascade import WhisperCascade
+
+
+class FakeWhisper:
+    def __init__(self, avg_logprob):
+        self.avg_logprob = avg_logprob
+        self.calls = 0
+
+    def transcribe(self, audio, **kwargs):
+        self.calls += 1
+        return {"text": "hello", "segments": [{"avg_logprob": self.avg_logprob, "no_speech_prob": 0.0}]}
+
+
+class CountingLoader:
+    """Stands in for get_whisper(profile): counts how often the large model is fetched"""
+
+    def __init__(self, model):
+        self.model = model
+        self.loads = 0
+
+    def __call__(self):
+        self.loads += 1
+        return self.model
+
+
+AUDIO = np.zeros(16000, dtype=np.float32)
+
+
+def test_large_model_not_loaded_without_escalation():
+    large = CountingLoader(FakeWhisper(-0.1))
+    cascade = WhisperCascade(FakeWhisper(-0.1), lambda: None)
+    result = cascade.transcribe(AUDIO, large_model=large)
+    assert result["model"] == "small"
+    assert large.loads == 0
+    assert large.model.calls == 0
+
+
+def test_large_model_loaded_once_on_escalation():
+    large = CountingLoader(FakeWhisper(-0.1))
+    cascade = WhisperCascade(FakeWhisper(-2.0), lambda: None)
+    result = cascade.transcribe(AUDIO, large_model=large)
+    assert result["model"] == "large"
+    assert result["escalation_reason"].startswith("avg_logprob")
+    assert large.loads == 1
+    assert large.model.calls == 1
@@ -1,50 +1,271 @@
 #!/usr/bin/env python3
 """
-Text-to-Speech Synthesizer using macOS 'say' command
-Provides basic offline speech synthesis for Ollama responses (macOS only)
+Text-to-Speech Synthesizer
+Pluggable offline speech synthesis for Ollama responses: espeak-ng on Linux,
+macOS 'say' where available. Synthesized audio goes into a content-addressed
+cache (repeated feedback phrases are synthesized once), and a background worker
+synthesizes long responses sentence by sentence so playback of the first
+sentence starts while the rest are still being rendered, or, for a streamed LLM
+reply, still being generated.
 """
 
+import hashlib
 import os
-import subprocess
 import platform
+import queue
+import re
+import shutil
+import subprocess
+import threading
+from concurrent.futures import Future
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+TTS_BACKEND = os.environ.get("TTS_BACKEND")  # espeak-ng or say; default picks what is installed
+TTS_VOICE = os.environ.get("TTS_VOICE")  # Backend default when unset
+# Words per minute; when unset each backend uses its own default (espeak-ng 175, say 300)
+TTS_RATE = int(os.environ["TTS_RATE"]) if os.environ.get("TTS_RATE") else None
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", "tts_output/cache")
+# =============================================================================
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+class EspeakNGBackend:
+    """espeak-ng (or classic espeak) writing 22 kHz WAV"""
+    name = "espeak-ng"
+    extension = ".wav"
+    default_rate = 175  # espeak's own default
+
+    def __init__(self, voice=None, rate=TTS_RATE):
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+        if self.binary is None:
+            raise RuntimeError("espeak-ng is not installed (apt install espeak-ng)")
+        self.voice = voice or "en-us"
+        self.rate = rate or self.default_rate
+
+    def synthesize(self, text, output_path):
+        subprocess.run([self.binary, "-v", self.voice, "-s", str(self.rate), "-w", output_path, text],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+class SayBackend:
+    """macOS 'say' writing AIFF"""
+    name = "say"
+    extension = ".aiff"
+    default_rate = 300  # The fast pace the analyzer has always used with say
+
+    def __init__(self, voice=None, rate=TTS_RATE):
+        if shutil.which("say") is None:
+            raise RuntimeError("'say' is only available on macOS")
+        self.voice = voice or "Alex"
+        self.rate = rate or self.default_rate
+
+    def synthesize(self, text, output_path):
+        subprocess.run(["say", "-v", self.voice, "-r", str(self.rate), "-o", output_path, text], check=True)
+
+
+BACKENDS = {"espeak-ng": EspeakNGBackend, "say": SayBackend}
+
+
+def get_backend(name=TTS_BACKEND, voice=TTS_VOICE, rate=TTS_RATE):
+    """The named backend, or the first one installed (espeak-ng, then say)"""
+    if name:
+        return BACKENDS[name](voice=voice, rate=rate)
+    for backend in (EspeakNGBackend, SayBackend):
+        try:
+            return backend(voice=voice, rate=rate)
+        except RuntimeError:
+            continue
+    raise RuntimeError("No TTS backend available: install espeak-ng")
+
+
+def cache_path(text, backend, cache_dir=TTS_CACHE_DIR):
+    """Content-addressed location for text rendered by this backend/voice/rate"""
+    key = hashlib.sha256(f"{backend.name}\0{backend.voice}\0{backend.rate}\0{text}".encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, key[:2], key + backend.extension)
+
+
+def synthesize_cached(text, backend, cache_dir=TTS_CACHE_DIR):
+    """Path of the cached audio for text, synthesizing it on a miss"""
+    path = cache_path(text, backend, cache_dir)
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp{backend.extension}"
+    backend.synthesize(text, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def split_sentences(text):
+    return [s.strip() for s in SENTENCE_END.split(text.strip()) if s.strip()]
+
 
-def synthesize_speech(text, output_path="tts_output/ollama_response.aiff", audio_prompt_path=None):
+def synthesize_speech(text, output_path=None, audio_prompt_path=None, backend=None):
     """
-    Synthesize speech from text using macOS 'say' command
+    Synthesize speech from text with the configured backend (cached by content)
     Args:
         text: Text to synthesize
-        output_path: Path to save the generated audio file (AIFF format)
+        output_path: Optional path to copy the generated audio to
         audio_prompt_path: Ignored (for compatibility)
+        backend: TTS backend (default: get_backend())
     Returns:
         Path to the generated audio file, or None if failed
     """
     try:
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        print(f"Synthesizing with macOS 'say': '{text}'")
-        subprocess.run(["say", "-o", output_path, text], check=True)
-        print(f"TTS output saved to: {output_path}")
-        return output_path
+        backend = backend or get_backend()
+        print(f"Synthesizing with {backend.name}: '{text}'")
+        path = synthesize_cached(text, backend)
+        if output_path:
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            shutil.copyfile(path, output_path)
+            path = output_path
+        print(f"TTS output saved to: {path}")
+        return path
     except Exception as e:
         print(f"Error during TTS synthesis: {e}")
         import traceback
         traceback.print_exc()
         return None
 
+
 def play_audio(audio_path):
-    """Play audio file using system audio player (afplay on macOS)"""
+    """Play audio file using system audio player (afplay on macOS, aplay/paplay/ffplay on Linux)"""
     try:
         system = platform.system()
         if system == "Darwin":  # macOS
             subprocess.run(["afplay", str(audio_path)], check=True)
-        else:
-            print(f"Audio playback not supported on {system}")
+            return
+        for player in (["aplay", "-q"], ["paplay"], ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet"]):
+            if shutil.which(player[0]):
+                subprocess.run(player + [str(audio_path)], check=True)
+                return
+        print(f"Audio playback not supported on {system}: no aplay, paplay or ffplay found")
     except Exception as e:
         print(f"Error playing audio: {e}")
 
+
+class SpeechJob:
+    """One utterance: a future per sentence, plus playback completion. Text can be fed
+    in pieces as it is generated; each sentence is queued for synthesis once complete."""
+
+    def __init__(self, synth_queue):
+        self.sentences = []
+        self.futures = []
+        self.done = threading.Event()
+        self.closed = threading.Event()
+        self._synth_queue = synth_queue
+        self._ready = queue.Queue()  # Futures in speaking order, then None once closed
+        self._pending = ""
+
+    def _add_sentence(self, sentence):
+        future = Future()
+        self.sentences.append(sentence)
+        self.futures.append(future)
+        self._synth_queue.put((sentence, future))
+        self._ready.put(future)
+
+    def feed(self, text):
+        """Add generated text; every sentence it completes is synthesized right away"""
+        *complete, self._pending = SENTENCE_END.split(self._pending + text)
+        for sentence in complete:
+            if sentence.strip():
+                self._add_sentence(sentence.strip())
+
+    def discard_pending(self):
+        """Drop text fed since the last complete sentence"""
+        self._pending = ""
+
+    def close(self):
+        """No more text: queue the trailing sentence"""
+        if self.closed.is_set():
+            return
+        if self._pending.strip():
+            self._add_sentence(self._pending.strip())
+        self._pending = ""
+        self.closed.set()
+        self._ready.put(None)
+
+    def paths(self, timeout=None):
+        """Audio file per sentence (blocks until the job is closed and all are synthesized)"""
+        self.closed.wait(timeout)
+        return [f.result(timeout=timeout) for f in self.futures]
+
+    def wait(self, timeout=None):
+        """Block until synthesis (and playback, if requested) has finished"""
+        return self.done.wait(timeout)
+
+
+class TTSWorker:
+    """Background synthesis and in-order playback, so callers never block on speech"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or get_backend()
+        self._synth_queue = queue.Queue()
+        self._play_queue = queue.Queue()
+        threading.Thread(target=self._synthesize_loop, daemon=True).start()
+        threading.Thread(target=self._play_loop, daemon=True).start()
+
+    def start(self, play=True):
+        """Open a SpeechJob to feed() text into as it arrives; close() it when the text ends.
+        Later jobs play after this one, so it must be closed."""
+        job = SpeechJob(self._synth_queue)
+        self._play_queue.put((job, play))
+        return job
+
+    def speak(self, text, play=True):
+        """Queue text sentence by sentence; returns a SpeechJob immediately"""
+        job = self.start(play)
+        job.feed(text)
+        job.close()
+        return job
+
+    def _synthesize_loop(self):
+        while True:
+            sentence, future = self._synth_queue.get()
+            try:
+                future.set_result(synthesize_cached(sentence, self.backend))
+            except Exception as e:
+                print(f"Error during TTS synthesis: {e}")
+                future.set_exception(e)
+
+    def _play_loop(self):
+        # Plays each sentence as soon as it is ready, while later ones are still synthesizing
+        # (or, for a job being fed, still being generated)
+        while True:
+            job, play = self._play_queue.get()
+            while True:
+                future = job._ready.get()
+                if future is None:
+                    break
+                try:
+                    path = future.result()
+                except Exception:
+                    continue
+                if play:
+                    play_audio(path)
+            job.done.set()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+    """Process-wide TTS worker, started on first use"""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = TTSWorker()
+        return _worker
+
+
 if __name__ == "__main__":
     # Test the TTS system
-    test_text = "Hello! This is a test of macOS say text-to-speech."
-    out_path = synthesize_speech(test_text, output_path="tts_output/test_say.aiff")
-    if out_path:
-        play_audio(out_path) 
\ No newline at end of file
+    test_text = "Hello! This is a test of offline text-to-speech. Each sentence is synthesized in the background."
+    job = get_worker().speak(test_text)
+    print(f"Queued {len(job.sentences)} sentences")
+    job.wait()
+    print(f"Audio files: {job.paths()}")
@@ -4,33 +4,52 @@ import numpy as np
 from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
 import torch
 import Levenshtein
-import librosa
 import whisper
 import re
 import sys
 import io
 import contextlib
+from prompt_builder import format_wav2vec2_output
+from audio_cache import load_audio
 
 # ---- CONFIG ----
-AUDIO_PATH = sys.argv[1]  # Audio file path passed as argument
 ESPEAK_PATH = "espeak"  # Path to espeak binary (assumes in PATH)
 LANG = "en"  # Language code for espeak
+WAV2VEC2_MODEL_NAME = "facebook/wav2vec2-base-960h"
+WHISPER_MODEL_NAME = "base"
+OUTPUT_PATH = "wav2vec2_transcription.txt"
 
 # ---- 1. Load Models ----
-print("Loading Wav2Vec2 model...")
-processor = Wav2Vec2Processor.from_pretrained("facebook/wav2vec2-base-960h")
-model = Wav2Vec2ForCTC.from_pretrained("facebook/wav2vec2-base-960h")
+# Loaded lazily so that batch and daemon callers can import this module and keep
+# a single copy of the models resident across many files.
+processor = None
+model = None
+whisper_model = None
 
-print("Loading Whisper model...")
-whisper_model = whisper.load_model("base")
+def load_models():
+    """Load Wav2Vec2 and Whisper once per process"""
+    global processor, model, whisper_model
+    if model is None:
+        print("Loading Wav2Vec2 model...")
+        processor = Wav2Vec2Processor.from_pretrained(WAV2VEC2_MODEL_NAME)
+        model = Wav2Vec2ForCTC.from_pretrained(WAV2VEC2_MODEL_NAME)
+    if whisper_model is None:
+        print("Loading Whisper model...")
+        whisper_model = whisper.load_model(WHISPER_MODEL_NAME)
 
 # ---- 2. Audio to Text (ASR) ----
 def load_audio_16k(audio_path):
-    speech, rate = librosa.load(audio_path, sr=16000, mono=True)
-    return speech, 16000
+    # Memory-mapped from the decoded-audio cache; only the first use of a file decodes it
+    return load_audio(audio_path, sr=16000)
 
-def audio_to_text(audio_path):
-    speech, rate = load_audio_16k(audio_path)
+def _as_speech(audio):
+    """Accept either a file path or an already decoded 16 kHz mono array"""
+    if isinstance(audio, str):
+        audio, _ = load_audio_16k(audio)
+    return np.asarray(audio, dtype=np.float32)
+
+def audio_to_text(audio):
+    speech = _as_speech(audio)
     input_values = processor(speech, return_tensors="pt", sampling_rate=16000).input_values
     with torch.no_grad():
         logits = model(input_values).logits
@@ -38,8 +57,11 @@ def audio_to_text(audio_path):
     transcription = processor.decode(predicted_ids[0])
     return transcription.lower()
 
-def get_reference_text_with_whisper(audio_path):
-    result = whisper_model.transcribe(audio_path)
+def get_reference_text_with_whisper(audio):
+    # Whisper accepts a path or a float32 16 kHz array; passing the array skips its own ffmpeg decode
+    if not isinstance(audio, str):
+        audio = np.asarray(audio, dtype=np.float32)
+    result = whisper_model.transcribe(audio)
     return result["text"].strip().lower()
 
 # ---- 3. Text to Phonemes (espeak) ----
@@ -66,15 +88,19 @@ def align_and_feedback(ref_phonemes, hyp_phonemes):
                 print(f"Missing '{ref_phonemes[op[1]]}'")
             elif op[0] == 'insert':
                 print(f"Extra '{hyp_phonemes[op[2]]}'")
+    return ops
+
+def analyze_audio(audio):
+    """Run the full analysis on a path or decoded 16 kHz array and return the results as a dict"""
+    load_models()
+    speech = _as_speech(audio)
 
-# ---- MAIN ----
-if __name__ == "__main__":
     print("Getting reference text using Whisper...")
-    reference_text = get_reference_text_with_whisper(AUDIO_PATH)
+    reference_text = get_reference_text_with_whisper(speech)
     print(f"Whisper reference text: {reference_text}")
 
     print("Transcribing audio with Wav2Vec2...")
-    hyp_text = audio_to_text(AUDIO_PATH)
+    hyp_text = audio_to_text(speech)
     print(f"Wav2Vec2 recognized text: {hyp_text}")
 
     print("Converting reference text to phonemes...")
@@ -89,18 +115,28 @@ if __name__ == "__main__":
     # Capture feedback output
     feedback_buffer = io.StringIO()
     with contextlib.redirect_stdout(feedback_buffer):
-        align_and_feedback(ref_phonemes, hyp_phonemes)
+        ops = align_and_feedback(ref_phonemes, hyp_phonemes)
     feedback = feedback_buffer.getvalue()
 
-    # Save all extracted data to wav2vec2_transcription.txt
-    with open("wav2vec2_transcription.txt", "w") as f:
-        f.write("Wav2Vec2 Speech Analysis Output\n")
-        f.write("==============================\n")
-        f.write(f"Whisper reference text: {reference_text}\n")
-        f.write(f"Wav2Vec2 recognized text: {hyp_text}\n")
-        f.write(f"Reference phonemes: {ref_phonemes}\n")
-        f.write(f"Hypothesis phonemes: {hyp_phonemes}\n")
-        f.write("\nAlignment and Feedback:\n")
-        f.write(feedback)
+    return {
+        "reference_text": reference_text,
+        "recognized_text": hyp_text,
+        "reference_phonemes": ref_phonemes,
+        "hypothesis_phonemes": hyp_phonemes,
+        "edit_ops": [list(op) for op in ops],
+        "feedback": feedback,
+        "duration_sec": round(len(speech) / 16000, 3),
+    }
+
+def write_transcription(result, output_path=OUTPUT_PATH):
+    """Save all extracted data to wav2vec2_transcription.txt"""
+    with open(output_path, "w") as f:
+        f.write(format_wav2vec2_output(result))
+
+# ---- MAIN ----
+if __name__ == "__main__":
+    AUDIO_PATH = sys.argv[1]  # Audio file path passed as argument
+    result = analyze_audio(AUDIO_PATH)
+    write_transcription(result)
     # Also print feedback to console
-    print(feedback) 
\ No newline at end of file
+    print(result["feedback"])
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Shape-Bucketed Wav2Vec2 Inference
+Every clip has a different length, so eager wav2vec2 never sees the same shape
+twice and a compiled model would recompile on each new one. Here inputs are
+zero-padded to the smallest of a few fixed length buckets, the model is traced
+(TorchScript) or compiled (torch.compile) once per bucket at startup, and the
+logits of the padding frames are cut off again. Inputs longer than the largest
+bucket fall back to eager.
+
+Checkpoints with layer-norm feature extractors (e.g. large-lv60) get an attention
+mask over the padding; group-norm ones (base-960h) are not trained with one, so
+the padding only shifts their normalization statistics slightly. The benchmark
+reports how often the transcripts still match eager exactly.
+
+Benchmark against eager mode:
+    python wav2vec2_buckets.py [clip_dir] [--mode trace|compile] [--buckets 2,4,8,12,20,30]
+"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import torch
+from transformers.modeling_outputs import CausalLMOutput
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+SAMPLE_RATE = 16000
+BUCKETS_SEC = (2, 4, 8, 12, 20, 30)  # Largest should cover WAV2VEC2_WINDOW_SEC
+MODES = ("trace", "compile", "eager")
+DEFAULT_MODEL = "facebook/wav2vec2-base-960h"
+# =============================================================================
+
+
+def parse_buckets(text):
+    """'2,4,8' -> (2.0, 4.0, 8.0)"""
+    return tuple(sorted(float(b) for b in text.split(",") if b.strip()))
+
+
+class _Logits(torch.nn.Module):
+    """Tensor-only forward (tracing and compiling want tensors in and out)"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_values, attention_mask=None):
+        return self.model(input_values, attention_mask=attention_mask, return_dict=False)[0]
+
+
+class BucketedWav2Vec2(torch.nn.Module):
+    """Wav2Vec2ForCTC behind fixed input-length buckets, each traced or compiled once.
+    Called like the model itself: returns an output with .logits for the real frames only."""
+
+    def __init__(self, model, buckets_sec=BUCKETS_SEC, mode="trace", sr=SAMPLE_RATE):
+        super().__init__()
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode} (expected one of {MODES})")
+        self.model = model
+        self.mode = mode
+        self.sr = sr
+        self.bucket_samples = sorted(int(round(b * sr)) for b in buckets_sec)
+        self.use_attention_mask = getattr(model.config, "feat_extract_norm", "group") == "layer"
+        self._runners = {}  # Plain dict: the runners share self.model's parameters
+        self._build_lock = threading.Lock()  # Held while a bucket is traced/compiled
+        self._stats_lock = threading.Lock()  # Counters only, so requests never wait on a build
+        self.compile_sec = {}
+        self.hits = {n: 0 for n in self.bucket_samples}
+        self.eager_calls = 0
+        self.audio_sec_total = 0.0
+        self.padding_sec_total = 0.0
+
+    @property
+    def dtype(self):
+        return self.model.dtype
+
+    @property
+    def config(self):
+        return self.model.config
+
+    def bucket_for(self, n_samples):
+        return next((b for b in self.bucket_samples if b >= n_samples), None)
+
+    def _inputs(self, input_values, bucket):
+        n = input_values.shape[-1]
+        padded = input_values.new_zeros((input_values.shape[0], bucket))
+        padded[:, :n] = input_values
+        if not self.use_attention_mask:
+            return (padded,)
+        mask = torch.zeros((input_values.shape[0], bucket), dtype=torch.long, device=input_values.device)
+        mask[:, :n] = 1
+        return padded, mask
+
+    def _build(self, bucket):
+        example = self._inputs(torch.zeros((1, bucket), dtype=self.dtype, device=self.model.device), bucket)
+        started = time.time()
+        with torch.no_grad():
+            if self.mode == "trace":
+                runner = torch.jit.trace(_Logits(self.model), example, check_trace=False)
+            elif self.mode == "compile":
+                runner = torch.compile(_Logits(self.model), dynamic=False)
+            else:
+                runner = _Logits(self.model)
+            runner(*example)  # torch.compile does its work on the first call
+        with self._stats_lock:
+            self.compile_sec[bucket] = time.time() - started
+        return runner
+
+    def _runner(self, bucket):
+        runner = self._runners.get(bucket)
+        if runner is None:
+            with self._build_lock:
+                runner = self._runners.get(bucket)
+                if runner is None:
+                    runner = self._runners[bucket] = self._build(bucket)
+        return runner
+
+    def warmup(self):
+        """Trace/compile every bucket now (otherwise each is built on first use)"""
+        for bucket in self.bucket_samples:
+            self._runner(bucket)
+            print(f"wav2vec2 {self.mode} bucket {bucket / self.sr:g}s ready in {self.compile_sec[bucket]:.2f}s")
+        return self
+
+    def forward(self, input_values, attention_mask=None):
+        n = input_values.shape[-1]
+        bucket = self.bucket_for(n)
+        if bucket is None:
+            with self._stats_lock:
+                self.eager_calls += 1
+            return self.model(input_values, attention_mask=attention_mask)
+
+        logits = self._runner(bucket)(*self._inputs(input_values, bucket))
+        frames = int(self.model._get_feat_extract_output_lengths(n))
+        with self._stats_lock:
+            self.hits[bucket] += 1
+            self.audio_sec_total += n / self.sr
+            self.padding_sec_total += (bucket - n) / self.sr
+        return CausalLMOutput(logits=logits[:, :frames])
+
+    def snapshot(self):
+        """Compile time and hit rate per bucket"""
+        with self._stats_lock:
+            calls = sum(self.hits.values()) + self.eager_calls
+            return {
+                "mode": self.mode,
+                "buckets": [{"sec": round(b / self.sr, 3), "hits": self.hits[b],
+                             "hit_rate": round(self.hits[b] / calls, 3) if calls else 0.0,
+                             "compile_sec": round(self.compile_sec[b], 3) if b in self.compile_sec else None}
+                            for b in self.bucket_samples],
+                "eager_calls": self.eager_calls,
+                "compile_sec_total": round(sum(self.compile_sec.values()), 3),
+                "padding_ratio": round(self.padding_sec_total / self.audio_sec_total, 3) if self.audio_sec_total else None,
+            }
+
+
+def benchmark(clip_dir=None, model_name=DEFAULT_MODEL, mode="trace", buckets_sec=BUCKETS_SEC, n_synthetic=20):
+    """Compare eager and bucketed latency and transcripts on local clips (or synthetic lengths)"""
+    from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
+
+    if clip_dir:
+        import librosa
+        from batch_wav2vec2 import list_audio_files
+        clips = [(os.path.basename(p), librosa.load(p, sr=SAMPLE_RATE, mono=True)[0]) for p in list_audio_files(clip_dir)]
+    else:
+        rng = np.random.default_rng(0)
+        clips = [(f"synthetic_{i}", (0.01 * rng.standard_normal(int(rng.uniform(1, max(buckets_sec)) * SAMPLE_RATE))).astype(np.float32))
+                 for i in range(n_synthetic)]
+    if not clips:
+        print(f"No audio clips found in {clip_dir}")
+        return
+
+    print(f"Loading {model_name}...")
+    processor = Wav2Vec2Processor.from_pretrained(model_name)
+    model = Wav2Vec2ForCTC.from_pretrained(model_name).eval()
+    bucketed = BucketedWav2Vec2(model, buckets_sec, mode).warmup()
+
+    def run(m, audio):
+        input_values = processor(audio, return_tensors="pt", sampling_rate=SAMPLE_RATE).input_values
+        started = time.time()
+        with torch.no_grad():
+            logits = m(input_values).logits
+        elapsed = time.time() - started
+        return elapsed, logits, processor.decode(torch.argmax(logits, dim=-1)[0]).lower()
+
+    eager_times, bucket_times, matches, diffs = [], [], 0, []
+    for name, audio in clips:
+        eager_sec, eager_logits, eager_text = run(model, audio)
+        bucket_sec, bucket_logits, bucket_text = run(bucketed, audio)
+        eager_times.append(eager_sec)
+        bucket_times.append(bucket_sec)
+        matches += eager_text == bucket_text
+        diffs.append(float((eager_logits - bucket_logits).abs().max()))
+        print(f"{name}: {len(audio) / SAMPLE_RATE:5.1f}s  eager {eager_sec:.3f}s -> {mode} {bucket_sec:.3f}s"
+              + ("" if eager_text == bucket_text else "  (transcript differs)"))
+
+    stats = bucketed.snapshot()
+    print("\n" + "=" * 60)
+    print(f"Clips: {len(clips)}, compile time: {stats['compile_sec_total']:.2f}s over {len(stats['buckets'])} buckets")
+    for bucket in stats["buckets"]:
+        print(f"  {bucket['sec']:5g}s bucket: {bucket['hits']} hits ({bucket['hit_rate']:.0%}), built in {bucket['compile_sec']:.2f}s")
+    print(f"Eager fallbacks: {stats['eager_calls']}, padding overhead: {stats['padding_ratio']:.0%}")
+    print(f"Mean latency eager: {np.mean(eager_times):.3f}s (p95 {np.percentile(eager_times, 95):.3f}s), "
+          f"{mode}: {np.mean(bucket_times):.3f}s (p95 {np.percentile(bucket_times, 95):.3f}s)")
+    print(f"Speedup: {np.sum(eager_times) / max(np.sum(bucket_times), 1e-9):.2f}x")
+    print(f"Transcripts identical to eager: {matches}/{len(clips)}, max logit difference: {max(diffs):.4f}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark shape-bucketed wav2vec2 against eager mode")
+    parser.add_argument("clip_dir", nargs="?", help="Directory of local audio clips (default: synthetic lengths)")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--mode", default="trace", choices=MODES)
+    parser.add_argument("--buckets", default=",".join(str(b) for b in BUCKETS_SEC), help="Bucket lengths in seconds")
+    args = parser.parse_args()
+    if args.clip_dir and not os.path.isdir(args.clip_dir):
+        print(f"Error: {args.clip_dir} not found!")
+        sys.exit(1)
+    benchmark(args.clip_dir, args.model, args.mode, parse_buckets(args.buckets))
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Cascaded Whisper Transcription
+Runs a small Whisper model (tiny) first and only escalates to a larger one (base or
+bigger) when any segment looks unreliable: average log-probability below a threshold
+or no-speech probability above one. Clear, short utterances never touch the big model.
+
+Benchmark on a local clip set:
+    python whisper_cascade.py <clip_dir> [--small tiny] [--large base]
+"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+SMALL_MODEL_NAME = "tiny"
+LARGE_MODEL_NAME = "base"
+MIN_AVG_LOGPROB = -0.6  # Escalate if any segment's avg_logprob is below this
+MAX_NO_SPEECH_PROB = 0.5  # Escalate if any segment's no_speech_prob is above this
+SAMPLE_RATE = 16000
+# =============================================================================
+
+
+def needs_escalation(result, min_avg_logprob=MIN_AVG_LOGPROB, max_no_speech_prob=MAX_NO_SPEECH_PROB):
+    """Return the reason the small model's result should be redone by the large one, or None"""
+    segments = result.get("segments") or []
+    if not segments and result.get("text", "").strip():
+        return None
+    if not segments:
+        return "no segments"
+    for segment in segments:
+        if segment.get("avg_logprob", 0.0) < min_avg_logprob:
+            return f"avg_logprob {segment['avg_logprob']:.2f}"
+        if segment.get("no_speech_prob", 0.0) > max_no_speech_prob:
+            return f"no_speech_prob {segment['no_speech_prob']:.2f}"
+    return None
+
+
+def _resolve(model):
+    """Models may be given directly or as zero-arg callables (e.g. a model pool lookup)"""
+    return model if hasattr(model, "transcribe") else model()
+
+
+class WhisperCascade:
+    """Small-model-first Whisper with escalation, tracking escalation rate and latency saved.
+    small_model and large_model are Whisper models or zero-arg callables returning one."""
+
+    def __init__(self, small_model, large_model, min_avg_logprob=MIN_AVG_LOGPROB,
+                 max_no_speech_prob=MAX_NO_SPEECH_PROB):
+        self.small_model = small_model
+        self.large_model = large_model
+        self.min_avg_logprob = min_avg_logprob
+        self.max_no_speech_prob = max_no_speech_prob
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.escalations = 0
+        self.small_sec_total = 0.0
+        self.large_sec_total = 0.0
+        self.audio_sec_escalated = 0.0
+        self.audio_sec_kept = 0.0
+
+    def transcribe(self, audio, large_model=None, **kwargs):
+        """Whisper transcribe() result from the cheapest model that passes the thresholds.
+        large_model overrides the escalation target for this call. Adds 'model' and
+        'escalation_reason' keys."""
+        if isinstance(audio, str):
+            import whisper
+            audio = whisper.load_audio(audio)
+        audio_sec = len(audio) / SAMPLE_RATE
+
+        started = time.time()
+        result = _resolve(self.small_model).transcribe(audio, **kwargs)
+        small_sec = time.time() - started
+        reason = needs_escalation(result, self.min_avg_logprob, self.max_no_speech_prob)
+
+        large_sec = 0.0
+        if reason is not None:
+            started = time.time()
+            result = _resolve(large_model if large_model is not None else self.large_model).transcribe(audio, **kwargs)
+            large_sec = time.time() - started
+
+        with self._lock:
+            self.requests += 1
+            self.small_sec_total += small_sec
+            if reason is not None:
+                self.escalations += 1
+                self.large_sec_total += large_sec
+                self.audio_sec_escalated += audio_sec
+            else:
+                self.audio_sec_kept += audio_sec
+
+        result["model"] = "large" if reason is not None else "small"
+        result["escalation_reason"] = reason
+        return result
+
+    def snapshot(self):
+        """Escalation rate and estimated latency saved versus always using the large model"""
+        with self._lock:
+            # Large-model cost per audio second, measured on the escalated requests
+            large_rate = self.large_sec_total / self.audio_sec_escalated if self.audio_sec_escalated else None
+            saved = None
+            if large_rate is not None:
+                # Kept requests avoided the large model; escalated ones paid for the small pass too
+                saved = large_rate * self.audio_sec_kept - self.small_sec_total
+            return {
+                "requests": self.requests,
+                "escalations": self.escalations,
+                "escalation_rate": round(self.escalations / self.requests, 3) if self.requests else 0.0,
+                "small_sec_total": round(self.small_sec_total, 3),
+                "large_sec_total": round(self.large_sec_total, 3),
+                "latency_saved_sec_estimate": round(saved, 3) if saved is not None else None,
+            }
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance divided by the reference length"""
+    ref = reference.lower().split()
+    hyp = hypothesis.lower().split()
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h))
+        previous = current
+    return previous[-1] / max(len(ref), 1)
+
+
+def benchmark(clip_dir, small_name=SMALL_MODEL_NAME, large_name=LARGE_MODEL_NAME):
+    """Compare the cascade with the large model alone on every clip in clip_dir"""
+    import whisper
+    from batch_wav2vec2 import list_audio_files
+
+    clips = list_audio_files(clip_dir)
+    if not clips:
+        print(f"No audio clips found in {clip_dir}")
+        return
+    print(f"Loading Whisper {small_name} and {large_name}...")
+    small_model = whisper.load_model(small_name)
+    large_model = whisper.load_model(large_name)
+    cascade = WhisperCascade(small_model, large_model)
+
+    large_times, cascade_times, wers = [], [], []
+    for path in clips:
+        audio = whisper.load_audio(path)
+        started = time.time()
+        reference = large_model.transcribe(audio)["text"]
+        large_times.append(time.time() - started)
+
+        started = time.time()
+        result = cascade.transcribe(audio)
+        cascade_times.append(time.time() - started)
+
+        wer = word_error_rate(reference, result["text"])
+        wers.append(wer)
+        print(f"{os.path.basename(path)}: {result['model']:5s} "
+              f"{large_times[-1]:.2f}s -> {cascade_times[-1]:.2f}s  WER vs {large_name}: {wer:.2%}"
+              + (f"  ({result['escalation_reason']})" if result["escalation_reason"] else ""))
+
+    stats = cascade.snapshot()
+    print("\n" + "=" * 60)
+    print(f"Clips: {len(clips)}")
+    print(f"Escalation rate: {stats['escalation_rate']:.1%}")
+    print(f"Mean latency {large_name}: {np.mean(large_times):.2f}s, cascade: {np.mean(cascade_times):.2f}s")
+    print(f"Measured latency saved: {sum(large_times) - sum(cascade_times):.2f}s total")
+    print(f"Transcript agreement with {large_name}: {1 - np.mean(wers):.2%} "
+          f"(exact match on {sum(w == 0 for w in wers)}/{len(wers)} clips)")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark cascaded Whisper against the large model alone")
+    parser.add_argument("clip_dir", help="Directory of local audio clips")
+    parser.add_argument("--small", default=SMALL_MODEL_NAME)
+    parser.add_argument("--large", default=LARGE_MODEL_NAME)
+    args = parser.parse_args()
+    if not os.path.isdir(args.clip_dir):
+        print(f"Error: {args.clip_dir} not found!")
+        sys.exit(1)
+    benchmark(args.clip_dir, args.small, args.large)
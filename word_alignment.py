@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Two-Level Pronunciation Alignment
+Aligns the reference and recognized word sequences first, then phonemizes and
+aligns phones only inside the word spans that differ. Matching words cost nothing,
+an inserted word no longer shifts the whole phone alignment, and every error is
+attributed to the reference word it belongs to.
+"""
+
+import re
+from bisect import bisect_right
+
+import Levenshtein
+
+WORD_RE = re.compile(r"[\w']+")
+
+
+def split_words(text):
+    return WORD_RE.findall(text.lower())
+
+
+def word_opcodes(ref_words, hyp_words):
+    """Minimal-edit (tag, i1, i2, j1, j2) opcodes between two word sequences"""
+    # Levenshtein works on strings, so give every distinct word its own code point
+    vocab = {}
+
+    def encode(words):
+        return "".join(chr(0x10000 + vocab.setdefault(w, len(vocab))) for w in words)
+
+    return Levenshtein.opcodes(encode(ref_words), encode(hyp_words))
+
+
+def describe_phone_op(op, word, word_index, word_start, ref_phonemes, hyp_phonemes):
+    """Turn one phone-level edit op inside a word span into a feedback item"""
+    kind, i, j = op
+    position = i - word_start
+    if kind == 'replace':
+        item = {"type": "substitute", "expected": ref_phonemes[i], "spoken": hyp_phonemes[j],
+                "message": f"In '{word}': substitute '{ref_phonemes[i]}' with '{hyp_phonemes[j]}'"}
+    elif kind == 'delete':
+        item = {"type": "missing", "expected": ref_phonemes[i], "spoken": "",
+                "message": f"In '{word}': missing '{ref_phonemes[i]}'"}
+    else:
+        item = {"type": "extra", "expected": "", "spoken": hyp_phonemes[j],
+                "message": f"In '{word}': extra '{hyp_phonemes[j]}'"}
+    return dict(item, word=word, word_index=word_index, position=position)
+
+
+def align_two_level(reference_text, hypothesis_text, phonemize, ref_word_phonemes=None):
+    """Align reference and recognized text word-first, phone-second.
+
+    phonemize(texts) -> list of phoneme strings (one espeak run per text).
+    ref_word_phonemes optionally gives precomputed phonemes for every reference word.
+    Returns {"errors", "spans", "score", "phonemized_words", "reference_words"}."""
+    ref_words = split_words(reference_text)
+    hyp_words = split_words(hypothesis_text)
+    if ref_word_phonemes is not None and len(ref_word_phonemes) != len(ref_words):
+        ref_word_phonemes = None
+    spans = [op for op in word_opcodes(ref_words, hyp_words) if op[0] != 'equal']
+
+    # One batch of espeak runs for every mismatched word: reference words one by one
+    # (so errors map back to them), each recognized span as a single text
+    texts = []
+    phonemized_words = 0
+    for tag, i1, i2, j1, j2 in spans:
+        if tag == 'replace':
+            if ref_word_phonemes is None:
+                texts.extend(ref_words[i1:i2])
+                phonemized_words += i2 - i1
+            texts.append(" ".join(hyp_words[j1:j2]))
+            phonemized_words += j2 - j1
+    phonemes = iter(phonemize(texts) if texts else [])
+
+    errors = []
+    span_details = []
+    credit = float(len(ref_words))  # Every reference word starts fully correct
+    extra_words = 0
+    for tag, i1, i2, j1, j2 in spans:
+        detail = {"type": tag, "reference_words": ref_words[i1:i2], "spoken_words": hyp_words[j1:j2]}
+        if tag == 'delete':
+            for k in range(i1, i2):
+                errors.append({"type": "missing_word", "word": ref_words[k], "word_index": k,
+                               "expected": ref_words[k], "spoken": "", "position": 0,
+                               "message": f"Missing word '{ref_words[k]}'"})
+            credit -= i2 - i1
+        elif tag == 'insert':
+            for k in range(j1, j2):
+                errors.append({"type": "extra_word", "word": hyp_words[k], "word_index": i1,
+                               "expected": "", "spoken": hyp_words[k], "position": 0,
+                               "message": f"Extra word '{hyp_words[k]}'"})
+            extra_words += j2 - j1
+        else:
+            if ref_word_phonemes is None:
+                word_phones = [next(phonemes) for _ in range(i1, i2)]
+            else:
+                word_phones = ref_word_phonemes[i1:i2]
+            hyp_phonemes = next(phonemes)
+            ref_phonemes = "".join(word_phones)
+            starts = []
+            total = 0
+            for phones in word_phones:
+                starts.append(total)
+                total += len(phones)
+
+            word_errors = [0] * (i2 - i1)
+            for op in Levenshtein.editops(ref_phonemes, hyp_phonemes):
+                # Ops past the last phone (trailing insertions) belong to the last word
+                w = max(0, bisect_right(starts, min(op[1], max(total - 1, 0))) - 1)
+                word_errors[w] += 1
+                errors.append(describe_phone_op(op, ref_words[i1 + w], i1 + w, starts[w],
+                                                ref_phonemes, hyp_phonemes))
+            for w, count in enumerate(word_errors):
+                credit -= min(1.0, count / max(len(word_phones[w]), 1))
+            detail["reference_phonemes"] = ref_phonemes
+            detail["hypothesis_phonemes"] = hyp_phonemes
+        span_details.append(detail)
+
+    errors.sort(key=lambda e: (e["word_index"], e["position"]))
+    return {
+        "errors": errors,
+        "spans": span_details,
+        "score": max(0.0, credit) / max(len(ref_words) + extra_words, 1),
+        "phonemized_words": phonemized_words,
+        "reference_words": len(ref_words),
+    }